@@ -0,0 +1,101 @@
+"""
+Measure the memory used by the File objects of a large project, and the
+time taken to add the files to a Project and to get the synthesis file set.
+
+Usage: python benchmarks/bench_file_model.py [file_count ...]
+
+The default file counts are 10000 and 100000. The files do not need to exist,
+the project cache is created in a temporary directory that is removed when
+the benchmark completes.
+"""
+
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(
+    0,
+    os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir))
+)
+
+from chiptools.core.project import Project
+
+# Number of files in each library of the synthetic project
+LIBRARY_SIZE = 100
+
+
+def add_files(project, file_count):
+    """
+    Add *file_count* files to the *project* split between libraries, every
+    tenth library is excluded from synthesis and every tenth file has
+    optional tool arguments.
+    """
+    for index in range(file_count):
+        library = index // LIBRARY_SIZE
+        attribs = {}
+        if index % 10 == 0:
+            attribs['args_modelsim_compile'] = '-2008'
+        project.add_file(
+            os.path.join(
+                'src',
+                'lib_{0}'.format(library),
+                'file_{0}.vhd'.format(index)
+            ),
+            library='lib_{0}'.format(library),
+            synthesise=library % 10 != 0,
+            **attribs
+        )
+
+
+def main(file_counts):
+    cwd = os.getcwd()
+    root = tempfile.mkdtemp()
+    os.chdir(root)
+    try:
+        run(file_counts)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+    return 0
+
+
+def run(file_counts):
+    print('{0:>8} {1:>12} {2:>10} {3:>14}'.format(
+        'files', 'memory (MiB)', 'add (s)', 'fileset (ms)'
+    ))
+    for file_count in file_counts:
+        # The memory is measured separately as tracing slows down the code
+        project = Project()
+        try:
+            gc.collect()
+            tracemalloc.start()
+            add_files(project, file_count)
+            gc.collect()
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+        finally:
+            project.cache.close()
+        project = Project()
+        try:
+            start_time = time.perf_counter()
+            add_files(project, file_count)
+            add_time = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            for i in range(10):
+                project.get_synthesis_fileset()
+            fileset_time = (time.perf_counter() - start_time) / 10
+        finally:
+            project.cache.close()
+        print('{0:>8} {1:>12.1f} {2:>10.3f} {3:>14.3f}'.format(
+            file_count,
+            memory / 2**20,
+            add_time,
+            fileset_time * 1000
+        ))
+
+if __name__ == '__main__':
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or [10000, 100000]))
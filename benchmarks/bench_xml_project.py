@@ -0,0 +1,105 @@
+"""
+Compare the time and memory used by the XmlProjectParser backends to read
+synthetic project files containing a large number of source files.
+
+Usage: python benchmarks/bench_xml_project.py [file_count ...]
+
+The default file counts are 10000 and 100000. The project files are written
+to a temporary directory that is removed when the benchmark completes.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(
+    0,
+    os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir))
+)
+
+from chiptools.parsers.xml_project import XmlProjectParser
+
+# Number of files in each library of the synthetic project
+LIBRARY_SIZE = 100
+
+
+def write_project(path, file_count):
+    """
+    Write a project file to *path* containing *file_count* file tags split
+    between libraries, some of which are excluded from synthesis.
+    """
+    with open(path, 'w') as f:
+        f.write('<project>\n')
+        f.write('    <config simulator=\'modelsim\'/>\n')
+        for index in range(file_count):
+            if index % LIBRARY_SIZE == 0:
+                if index > 0:
+                    f.write('    </library>\n')
+                library = index // LIBRARY_SIZE
+                f.write(
+                    '    <library name=\'lib_{0}\' '.format(library) +
+                    'synthesise=\'{0}\'>\n'.format(
+                        'false' if library % 10 == 0 else 'true'
+                    )
+                )
+            f.write(
+                '        <file path=\'src/lib_{0}/file_{1}.vhd\' '.format(
+                    index // LIBRARY_SIZE,
+                    index
+                ) +
+                'args_modelsim_compile=\'-2008\'/>\n'
+            )
+        if file_count > 0:
+            f.write('    </library>\n')
+        f.write('    <constraints path=\'top.xdc\'/>\n')
+        f.write('</project>\n')
+
+
+def measure(backend, path):
+    """
+    Return a tuple of (*seconds*, *peak bytes*, *operations*) for reading the
+    project file at *path* using the named *backend*.
+    """
+    XmlProjectParser.backend = backend
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    operations = XmlProjectParser.read_project(path)
+    duration = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak, operations
+
+
+def main(file_counts):
+    root = tempfile.mkdtemp()
+    backend = XmlProjectParser.backend
+    try:
+        print('{0:>8} {1:>10} {2:>10} {3:>12}'.format(
+            'files', 'backend', 'time (s)', 'peak (MiB)'
+        ))
+        for file_count in file_counts:
+            path = os.path.join(root, 'project_{0}.xml'.format(file_count))
+            write_project(path, file_count)
+            results = {}
+            for name in ['minidom', 'iterparse']:
+                duration, peak, operations = measure(name, path)
+                results[name] = operations
+                print('{0:>8} {1:>10} {2:>10.3f} {3:>12.1f}'.format(
+                    file_count,
+                    name,
+                    duration,
+                    peak / 2**20
+                ))
+            if results['minidom'] != results['iterparse']:
+                print('The backends returned different operations.')
+                return 1
+    finally:
+        XmlProjectParser.backend = backend
+        shutil.rmtree(root)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main([int(arg) for arg in sys.argv[1:]] or [10000, 100000]))
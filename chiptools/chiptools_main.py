@@ -1,16 +1,113 @@
+import argparse
 import logging
+import sys
+import time
 
 
-def main():
+class StartupProfile:
     """
-    Launch the Framework application command line interface.
+    Record the wall clock time taken by each phase of a ChipTools command so
+    that the startup cost can be reported with the *--profile-startup*
+    option.
     """
-    main = CommandLine()
-    main.cmdloop()
+    def __init__(self):
+        self.phases = []
+        self.last_time = time.perf_counter()
+
+    def mark(self, name):
+        """Record the time since the previous mark as the phase *name*."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last_time))
+        self.last_time = now
+
+    def report(self, stream=sys.stderr):
+        """Write a table of the recorded phases to the given *stream*."""
+        total = sum(duration for name, duration in self.phases)
+        stream.write('Startup profile:\n')
+        for name, duration in self.phases + [('total', total)]:
+            stream.write('    {0:<24}{1:>10.1f} ms\n'.format(
+                name,
+                duration * 1000
+            ))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='chiptools',
+        description=(
+            'Run the ChipTools command line interface, or run a single ' +
+            'command and exit if a command is given.'
+        )
+    )
+    parser.add_argument(
+        '-p', '--project',
+        help='Load the given project file before running the command.'
+    )
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help='Report the time taken by each phase of the command.'
+    )
+    parser.add_argument(
+        'command',
+        nargs=argparse.REMAINDER,
+        help=(
+            'The command to run followed by its arguments, for example: ' +
+            'chiptools -p project.xml run_tests modelsim'
+        )
+    )
+    return parser
+
+
+def main(argv=None):
+    """
+    Launch the Framework application command line interface. If a command is
+    given the project is loaded, the command is run and the exit status is
+    returned without starting the interactive command line. Modules that are
+    only required by a particular command are imported when it is run.
+    """
+    profile = StartupProfile()
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    from chiptools.core.cli import CommandLine, join_command
+    profile.mark('import cli')
+    if len(args.command) > 0 and not hasattr(
+        CommandLine,
+        'do_' + args.command[0]
+    ):
+        parser.error('unknown command: ' + args.command[0])
+    if len(args.command) == 0:
+        cli = CommandLine()
+        if args.project is not None:
+            cli.do_load_project(args.project)
+        if args.profile_startup:
+            profile.mark('project')
+            profile.report()
+        cli.cmdloop()
+        logging.shutdown()
+        return 0
+
+    from chiptools.core.project import Project
+    project = Project()
+    profile.mark('create project')
+    if args.project is not None:
+        try:
+            project.load_project(args.project)
+        except Exception as e:
+            logging.getLogger(__name__).error(
+                'The project could not be loaded due to an error: ' + str(e)
+            )
+            return 1
+    profile.mark('load project')
+    cli = CommandLine(project=project)
+    # The arguments are quoted so that arguments containing spaces are not
+    # split by the command
+    cli.onecmd(args.command[0] + ' ' + join_command(args.command[1:]))
+    profile.mark(args.command[0])
+    if args.profile_startup:
+        profile.report()
     logging.shutdown()
+    return 1 if cli.failed else 0
 
 if __name__ == '__main__':
-    from core.cli import CommandLine
-    main()
-else:
-    from chiptools.core.cli import CommandLine
+    sys.exit(main())
@@ -21,3 +21,39 @@ class SynthesisException(Exception):
 # Backport FileNotFoundError for Python 2.7
 class FileNotFoundError(OSError):
     pass
+
+
+class SimulationAborted(ExecutionError):
+    """
+    Raised when a simulation is stopped before it completes, either because
+    its output matched an abort pattern or because it ran for longer than its
+    timeout. The *reason* is 'output' or 'timeout', *line* and *severity* are
+    the matching output line and the severity of the pattern it matched and
+    *simulation_time* is the simulation time reported by the simulator when
+    the simulation was stopped, if it is known.
+    """
+    def __init__(
+        self,
+        reason,
+        line=None,
+        severity=None,
+        simulation_time=None,
+        timeout=None
+    ):
+        self.reason = reason
+        self.line = line
+        self.severity = severity
+        self.simulation_time = simulation_time
+        self.timeout = timeout
+        if reason == 'timeout':
+            message = 'The simulation did not finish within {0}s'.format(
+                timeout
+            )
+        else:
+            message = 'The simulation was stopped by {0} output: {1}'.format(
+                severity,
+                line
+            )
+        if simulation_time is not None:
+            message += ' (simulation time: {0})'.format(simulation_time)
+        super(SimulationAborted, self).__init__(message)
@@ -66,12 +66,15 @@ class ProjectAttributes:
     XML_NODE_CONSTRAINTS = 'constraints'
     XML_NODE_GENERIC = 'generic'
     XML_NODE_UNITTEST = 'unittest'
+    XML_NODE_ABORT = 'abort'
     # XML attributes identify parameters that can be applied to XML nodes.
     ATTRIBUTE_NAME = 'name'
     ATTRIBUTE_PATH = 'path'
     ATTRIBUTE_FLOW = 'flow'
     ATTRIBUTE_PREPROCESSOR = 'preprocessor'
     ATTRIBUTE_SYNTHESIS = 'synthesise'
+    ATTRIBUTE_PATTERN = 'pattern'
+    ATTRIBUTE_SEVERITY = 'severity'
     # These XML attributes are required configuration attributes that control
     # which tools and directories are used by the framework. They must be
     # present in the project file.
@@ -82,6 +85,14 @@ class ProjectAttributes:
     ATTRIBUTE_SYNTH_PART = 'part'
     ATTRIBUTE_REPORTER = 'reporter'
     ATTRIBUTE_LIBRARY = 'library'
+    ATTRIBUTE_JOBS = 'jobs'
+    ATTRIBUTE_SIM_SESSION = 'simulator_session'
+    ATTRIBUTE_SIM_TIMEOUT = 'simulation_timeout'
+    ATTRIBUTE_SYNTH_JOB_MEMORY = 'synthesis_job_memory'
+    ATTRIBUTE_SYNTH_INCREMENTAL = 'synthesis_incremental'
+    ATTRIBUTE_SYNTH_COMPRESSION = 'synthesis_archive_compression'
+    ATTRIBUTE_SYNTH_INCLUDE = 'synthesis_archive_include'
+    ATTRIBUTE_SYNTH_EXCLUDE = 'synthesis_archive_exclude'
 
     # Additional tool arguments can be attached to File objects by supplying
     # attributes using the naming convention:
@@ -101,6 +112,14 @@ class ProjectAttributes:
         else:
             return value.lower() != 'false'
 
+    def int_processor(value, root):
+        if isinstance(value, int):
+            return value
+        elif value is None:
+            return None
+        else:
+            return int(value)
+
     def string_tolower(value, root):
         if isinstance(value, str):
             return value.lower()
@@ -120,6 +139,14 @@ class ProjectAttributes:
         ATTRIBUTE_SYNTH_TOOL: lambda x, root: x,
         ATTRIBUTE_SYNTH_PART: lambda x, root: x,
         ATTRIBUTE_LIBRARY: string_tolower,
+        ATTRIBUTE_JOBS: int_processor,
+        ATTRIBUTE_SIM_SESSION: bool_processor,
+        ATTRIBUTE_SIM_TIMEOUT: int_processor,
+        ATTRIBUTE_SYNTH_JOB_MEMORY: int_processor,
+        ATTRIBUTE_SYNTH_INCREMENTAL: bool_processor,
+        ATTRIBUTE_SYNTH_COMPRESSION: string_tolower,
+        ATTRIBUTE_SYNTH_INCLUDE: lambda x, root: x,
+        ATTRIBUTE_SYNTH_EXCLUDE: lambda x, root: x,
     }
 
     # Default fields for different node types
@@ -222,17 +249,44 @@ class UnitTestFile(object):
         self.testsuite = None
 
 
+# Optional tool arguments of a File that has none. This dictionary is shared
+# by every such File and must not be modified.
+NO_TOOL_ARGS = {}
+
+
 class File(object):
     """
     The File object contains properties of a design source file that has been
     loaded from the project XML file.
+
+    Files use *__slots__* rather than an instance dictionary as a project
+    may contain a large number of them. Two files are equal if they have the
+    same library, path, synthesis flag, preprocessor and optional tool
+    arguments, the *md5* and *compile_time* that are set when the file is
+    compiled are not compared.
     """
+    __slots__ = (
+        'library',
+        'md5',
+        'compile_time',
+        'path',
+        'synthesise',
+        'preprocessor',
+        'fileType',
+        'optionalToolArgs',
+    )
 
     def __init__(self, library, **kwargs):
-        # The library to which this file belongs
-        self.library = library
+        # The library to which this file belongs, library names are interned
+        # as they are shared by many files.
+        self.library = sys.intern(library) if isinstance(
+            library,
+            str
+        ) else library
         # MD5 sum for change detection
         self.md5 = ''
+        # Time at which the file was last compiled
+        self.compile_time = None
         # The path to this source file
         self.path = kwargs[ProjectAttributes.ATTRIBUTE_PATH]
         # A flag to indicate whether or not this file should be included for
@@ -256,13 +310,13 @@ class File(object):
         # Search through the keyword arguments for any attributes that match
         # the XML_ADDITIONAL_TOOL_ARGS_RE search pattern and store these as
         # additional tool arguments
-        self.optionalToolArgs = {}
+        self.optionalToolArgs = NO_TOOL_ARGS
         for k, v in kwargs.items():
             match = ProjectAttributes.XML_ADDITIONAL_TOOL_ARGS_RE.match(k)
             if match:
                 try:
-                    toolName = match.group(1)
-                    flowName = match.group(2)
+                    toolName = sys.intern(match.group(1))
+                    flowName = sys.intern(match.group(2))
                 except IndexError:
                     # The attribute matched but did not return enough match
                     # groups.
@@ -273,6 +327,8 @@ class File(object):
                         )
                     )
                     continue
+                if self.optionalToolArgs is NO_TOOL_ARGS:
+                    self.optionalToolArgs = {}
                 if toolName not in self.optionalToolArgs:
                     self.optionalToolArgs[toolName] = {}
                 self.optionalToolArgs[toolName][flowName] = v
@@ -284,8 +340,32 @@ class File(object):
                     )
                 )
 
+    def get_identity(self):
+        """
+        Return a hashable tuple of the attributes that identify this file.
+        """
+        return (
+            self.library,
+            self.path,
+            self.synthesise,
+            self.preprocessor,
+            tuple(
+                (toolName, tuple(sorted(flows.items())))
+                for toolName, flows in sorted(self.optionalToolArgs.items())
+            ),
+        )
+
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, File):
+            return NotImplemented
+        return self.get_identity() == other.get_identity()
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash((self.library, self.path))
 
     def get_tool_arguments(self, toolName, flowName):
         """
@@ -293,7 +373,10 @@ class File(object):
         toolname and flowname. If the tool or flow are not present in the
         optional arguments then return an empty string.
         """
-        return self.optionalToolArgs.get(toolName, {}).get(flowName, '')
+        return self.optionalToolArgs.get(toolName, NO_TOOL_ARGS).get(
+            flowName,
+            ''
+        )
 
 
 class Constraints(object):
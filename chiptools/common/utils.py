@@ -1,6 +1,10 @@
+import collections
 import subprocess
 import os
 import logging
+import re
+import signal
+import sys
 import threading
 import time
 
@@ -61,6 +65,61 @@ def relative_path_to_abs(path, root=os.getcwd()):
     return path
 
 
+def file_signature(path):
+    """
+    Return a tuple of (modification time in ns, size, inode) for the given
+    file path. If the signature of a file is unchanged it is assumed that the
+    file contents are also unchanged.
+    """
+    stat = os.stat(path)
+    return (
+        getattr(stat, 'st_mtime_ns', int(stat.st_mtime * 1e9)),
+        stat.st_size,
+        stat.st_ino,
+    )
+
+
+def get_available_memory(meminfo_path='/proc/meminfo'):
+    """
+    Return the physical memory in bytes that is currently available, or None
+    if it cannot be determined on this platform. On Linux this is the
+    *MemAvailable* value from *meminfo_path*, which includes the page cache
+    that can be reclaimed, otherwise it is the number of free pages.
+    """
+    try:
+        with open(meminfo_path, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == 'MemAvailable:':
+                    return int(fields[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def is_process_running(pid):
+    """
+    Return True if a process with the given *pid* is running. On Windows a
+    process cannot be checked without signalling it, so False is returned
+    for any process other than this one.
+    """
+    if pid == os.getpid():
+        return True
+    if sys.platform == 'win32':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists but belongs to another user
+        return True
+    return True
+
+
 def time_delta_string(start_time, end_time):
     """Return a string representing the time delta in ms
     >>> time_delta_string(50e-3, 100e-3)
@@ -97,8 +156,8 @@ def seconds_to_timestring(duration):
     return str(duration * 1e9) + "ns"
 
 
-def execute(command, path=None, shell=True, quiet=False):
-    return popen_throws_ex(command, path, quiet)
+def execute(command, path=None, shell=True, quiet=False, monitor=None):
+    return popen_throws_ex(command, path, quiet, monitor)
 
 
 def call(command, path=None, shell=True):
@@ -119,17 +178,23 @@ def call(command, path=None, shell=True):
         raise exceptions.ExecutionError(return_val)
 
 
-def popen_throws_ex(command, path=None, quiet=False):
+def popen_throws_ex(command, path=None, quiet=False, monitor=None):
     '''
     Call the executable in the given path, hiding standard output unless the
     return value is an error. If the return value is an error raise an
-    exception for the caller to handle.
+    exception for the caller to handle. The optional OutputMonitor *monitor*
+    processes the output of the executable as it is printed.
     '''
 
-    if quiet:
+    if quiet and monitor is None:
         returnVal, stdout, stderr = popen_quiet(command, path)
     else:
-        returnVal, stdout, stderr = popen(command, path)
+        returnVal, stdout, stderr = popen(command, path, monitor)
+
+    if monitor is not None:
+        error = monitor.get_abort_error()
+        if error is not None:
+            raise error
 
     if returnVal != 0:
         errstring = ''
@@ -172,31 +237,337 @@ class LogWrapper:
         self.logfn(line.rstrip())
 
 
-def teed_call(cmd_args, **kwargs):
+class OutputMonitor(object):
+    """
+    An OutputMonitor processes the output of an executable line by line as it
+    is printed, rather than after the executable has terminated.
+
+    Matchers added using *add_matcher* are regular expressions that are
+    searched for in each line, when a matcher finds a match its callback is
+    called with the line. A *fatal* matcher stops the executable on the first
+    match if *kill_on_fatal* is True, the matching line is available from the
+    *fatal_line* attribute.
+
+    Abort patterns added using *add_abort_pattern* are matchers with a
+    severity, lines matching a *warning* pattern are recorded in the
+    *warnings* list while an *error* or *failure* pattern is fatal. If the
+    executable runs for longer than the optional *timeout* in seconds it is
+    stopped by a watchdog. The executable and any processes it started are
+    stopped together.
+
+    The *time_pattern* is a regular expression with one group that extracts
+    the simulation time from a line of simulator output, it is used to report
+    the simulation time at which a simulation was aborted.
+
+    By default the output is kept in memory so that it can be returned to
+    the caller. If *spool_path* is given the full output is written to that
+    file instead and only the last *tail_lines* lines of each stream are kept
+    in memory.
+    """
+    severities = ['warning', 'error', 'failure']
+    fatal_severities = ['error', 'failure']
+    # Time in seconds to wait for the simulation time to be printed after a
+    # fatal line before the executable is stopped.
+    time_grace = 0.5
+
+    def __init__(
+        self,
+        spool_path=None,
+        tail_lines=1000,
+        kill_on_fatal=True,
+        timeout=None,
+        time_pattern=None
+    ):
+        self.spool_path = spool_path
+        self.kill_on_fatal = kill_on_fatal
+        self.timeout = timeout
+        self.time_regex = None
+        if time_pattern is not None:
+            self.set_time_pattern(time_pattern)
+        self.matchers = []
+        self.warnings = []
+        self.fatal_line = None
+        self.fatal_severity = None
+        self.fatal_time = None
+        self.last_time = None
+        self.timed_out = False
+        self.process = None
+        self.spool = None
+        self.watchdog = None
+        self.killer = None
+        if spool_path is None:
+            tail_lines = None
+        self.lines = {
+            'stdout': collections.deque(maxlen=tail_lines),
+            'stderr': collections.deque(maxlen=tail_lines),
+        }
+        self.lock = threading.Lock()
+
+    def add_matcher(self, pattern, callback=None, fatal=False):
+        """
+        Call *callback* with each line of output that matches the regular
+        expression *pattern*. If *fatal* is True the first matching line
+        stops the executable.
+        """
+        severity = 'error' if fatal else None
+        self.matchers.append((re.compile(pattern), callback, severity))
+
+    def add_abort_pattern(self, pattern, severity='error'):
+        """
+        Add the regular expression *pattern* with the given *severity*, one
+        of *warning*, *error* or *failure*. Lines matching a warning pattern
+        are recorded in *warnings*, the executable is stopped by the first
+        line matching an error or failure pattern.
+        """
+        severity = severity.lower()
+        if severity not in self.severities:
+            raise ValueError(
+                'Invalid severity {0}, use one of {1}'.format(
+                    severity,
+                    ', '.join(self.severities)
+                )
+            )
+        self.matchers.append((re.compile(pattern), None, severity))
+
+    def set_time_pattern(self, pattern):
+        """
+        Set the regular expression used to extract the simulation time from
+        the output, the first group of the pattern is the time.
+        """
+        self.time_regex = re.compile(pattern)
+
+    def attach(self, process):
+        """
+        Attach the monitor to the *process* that is producing the output,
+        open the spool file if one is used and start the watchdog if a
+        timeout is set.
+        """
+        self.process = process
+        if self.spool_path is not None and self.spool is None:
+            self.spool = open(self.spool_path, 'w')
+        if self.timeout is not None and self.timeout > 0:
+            self.watchdog = threading.Timer(self.timeout, self.expire)
+            self.watchdog.daemon = True
+            self.watchdog.start()
+
+    def write(self, stream, line):
+        """
+        Process a *line* of output from the given *stream* (stdout or
+        stderr).
+        """
+        with self.lock:
+            self.lines[stream].append(line)
+            if self.spool is not None:
+                self.spool.write(line)
+        time_match = None
+        if self.time_regex is not None:
+            time_match = self.time_regex.search(line)
+        for regex, callback, severity in self.matchers:
+            if regex.search(line) is None:
+                continue
+            if callback is not None:
+                callback(line)
+            if severity in self.fatal_severities:
+                self.stop(
+                    line,
+                    severity,
+                    None if time_match is None else time_match.group(1)
+                )
+            elif severity is not None:
+                with self.lock:
+                    self.warnings.append(line.rstrip())
+        if time_match is not None:
+            with self.lock:
+                if self.fatal_line is None:
+                    self.last_time = time_match.group(1)
+                elif self.fatal_time is None:
+                    # Some simulators print the time of a message on the
+                    # line after it.
+                    self.fatal_time = time_match.group(1)
+                    if self.killer is not None:
+                        self.killer.cancel()
+                        self.killer = None
+                        self.kill()
+
+    def stop(self, line, severity='error', simulation_time=None):
+        """
+        Record the fatal *line* and stop the executable if *kill_on_fatal* is
+        set.
+        """
+        with self.lock:
+            if self.fatal_line is not None or self.timed_out:
+                return
+            self.fatal_line = line.rstrip()
+            self.fatal_severity = severity
+            self.fatal_time = simulation_time
+        log.error('Fatal output: ' + self.fatal_line)
+        if not self.kill_on_fatal:
+            return
+        if simulation_time is None and self.time_regex is not None:
+            # Wait briefly for the simulation time to be printed
+            with self.lock:
+                self.killer = threading.Timer(self.time_grace, self.kill)
+                self.killer.daemon = True
+                self.killer.start()
+        else:
+            self.kill()
+
+    def expire(self):
+        """
+        Stop the executable when the watchdog timeout expires.
+        """
+        with self.lock:
+            if self.fatal_line is not None:
+                return
+            self.timed_out = True
+        log.error(
+            'Stopping the executable after {0}s'.format(self.timeout)
+        )
+        self.kill()
+
+    def kill(self):
+        """
+        Stop the process attached to this monitor and its child processes.
+        """
+        if self.process is not None:
+            kill_process_tree(self.process)
+
+    def get_abort_error(self):
+        """
+        Return an exceptions.SimulationAborted describing why the executable
+        was stopped, or None if it was not stopped.
+        """
+        with self.lock:
+            if self.timed_out:
+                return exceptions.SimulationAborted(
+                    'timeout',
+                    simulation_time=self.last_time,
+                    timeout=self.timeout
+                )
+            if self.fatal_line is not None:
+                simulation_time = self.fatal_time
+                if simulation_time is None:
+                    simulation_time = self.last_time
+                return exceptions.SimulationAborted(
+                    'output',
+                    line=self.fatal_line,
+                    severity=self.fatal_severity,
+                    simulation_time=simulation_time
+                )
+        return None
+
+    def get_writer(self, stream):
+        """
+        Return a file like object that passes lines written to it to this
+        monitor as output from the given *stream*.
+        """
+        return OutputMonitorWriter(self, stream)
+
+    def get_output(self, stream):
+        """
+        Return the output kept in memory for the given *stream*.
+        """
+        with self.lock:
+            return ''.join(self.lines[stream])
+
+    def close(self):
+        """
+        Stop the watchdog and close the spool file if one is open.
+        """
+        for timer in [self.watchdog, self.killer]:
+            if timer is not None:
+                timer.cancel()
+        self.watchdog = None
+        self.killer = None
+        with self.lock:
+            if self.spool is not None:
+                self.spool.close()
+                self.spool = None
+
+
+class OutputMonitorWriter(object):
+    """File interface that writes lines to an OutputMonitor."""
+    def __init__(self, monitor, stream):
+        self.monitor = monitor
+        self.stream = stream
+
+    def write(self, line):
+        self.monitor.write(self.stream, line)
+
+
+def kill_process_tree(process):
+    """
+    Kill the subprocess.Popen *process* and any processes that it started.
+    The process must have been started in a new process group (or session)
+    for its child processes to be killed on POSIX platforms.
+    """
+    if process.poll() is not None:
+        return
+    if sys.platform == 'win32':
+        subprocess.call(
+            ['taskkill', '/F', '/T', '/PID', str(process.pid)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            process.kill()
+
+
+def teed_call(cmd_args, monitor=None, **kwargs):
     stdout, stderr = [kwargs.pop(s, None) for s in ['stdout', 'stderr']]
+    if monitor is not None:
+        # Start monitored processes in their own group so that the monitor
+        # can stop any processes they start along with them.
+        if sys.platform == 'win32':
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs['start_new_session'] = True
     p = subprocess.Popen(
         cmd_args,
         stdout=subprocess.PIPE if stdout is not None else None,
         stderr=subprocess.PIPE if stderr is not None else None,
         **kwargs
     )
+    if monitor is not None:
+        monitor.attach(p)
     threads = []
-    if stdout is not None:
-        threads.append(tee(p.stdout, stdout, LogWrapper(log.info)))
-    if stderr is not None:
-        threads.append(tee(p.stderr, stderr, LogWrapper(log.error)))
-    for t in threads:
-        t.join()  # wait for IO completion
+    try:
+        if stdout is not None:
+            threads.append(tee(p.stdout, stdout, LogWrapper(log.info)))
+        if stderr is not None:
+            threads.append(tee(p.stderr, stderr, LogWrapper(log.error)))
+        for t in threads:
+            t.join()  # wait for IO completion
+    except BaseException:
+        # A process in its own group is not interrupted with the caller
+        if monitor is not None:
+            monitor.kill()
+        raise
     return p.wait()
 
 
-def popen(command, path=None):
-    from io import StringIO
-    fout, ferr = StringIO(), StringIO()
-    exitcode = teed_call(command, cwd=path, stdout=fout, stderr=ferr)
-    stdout = fout.getvalue()
-    stderr = ferr.getvalue()
-    return exitcode, stdout, stderr
+def popen(command, path=None, monitor=None):
+    if monitor is None:
+        from io import StringIO
+        fout, ferr = StringIO(), StringIO()
+        exitcode = teed_call(command, cwd=path, stdout=fout, stderr=ferr)
+        stdout = fout.getvalue()
+        stderr = ferr.getvalue()
+        return exitcode, stdout, stderr
+    try:
+        exitcode = teed_call(
+            command,
+            monitor=monitor,
+            cwd=path,
+            stdout=monitor.get_writer('stdout'),
+            stderr=monitor.get_writer('stderr'),
+        )
+    finally:
+        monitor.close()
+    return exitcode, monitor.get_output('stdout'), monitor.get_output('stderr')
 
 
 def popen_quiet(command, path=None):
@@ -0,0 +1,196 @@
+"""
+The artifacts module implements a content addressed store for compiled
+simulation libraries. Libraries are stored under a key derived from the
+simulator name and version, the compilation arguments and the contents of the
+source files compiled into the library, so a library compiled in one workspace
+can be restored into any other workspace that would compile identical
+libraries.
+
+The store is a plain directory which can be local or on a network file
+system shared between users and CI machines. Each entry is written to a
+temporary directory and renamed into place so that readers never see a
+partially written entry. When the store exceeds its maximum size the least
+recently used entries are removed.
+
+The store is configured in the *artifact cache* section of the
+.chiptoolsconfig file:
+
+    [artifact cache]
+    path = /nfs/chiptools/artifacts
+    max_size = 20G
+"""
+import os
+import re
+import shutil
+import hashlib
+import logging
+import uuid
+
+log = logging.getLogger(__name__)
+
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)b?\s*$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'k': 2**10, 'm': 2**20, 'g': 2**30, 't': 2**40}
+
+
+def parse_size(value):
+    """
+    Return the number of bytes given by the size string *value*, which is a
+    number with an optional K, M, G or T suffix. None is returned for an empty
+    or invalid size.
+    """
+    if value is None:
+        return None
+    match = SIZE_RE.match(str(value))
+    if match is None:
+        log.error('Invalid artifact cache size: ' + str(value))
+        return None
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def get_key(*fields):
+    """
+    Return a hex digest identifying the given sequence of string *fields*.
+    """
+    digest = hashlib.sha256()
+    for field in fields:
+        digest.update(str(field).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def get_size(path):
+    """
+    Return the total size in bytes of the file or directory at *path*.
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
+class ArtifactStore(object):
+    """
+    An ArtifactStore holds compiled libraries in the *root* directory. Each
+    entry is a directory named after its key containing copies of the
+    artifact files and directories and a marker file, the modification time
+    of the marker file records when the entry was last used. If *max_size* is
+    given the least recently used entries are removed when the total size of
+    the store exceeds *max_size* bytes.
+    """
+    marker_name = '.chiptools_artifact'
+
+    def __init__(self, root, max_size=None):
+        self.root = root
+        self.max_size = max_size
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key)
+
+    def contains(self, key):
+        """
+        Return True if a complete entry exists for the given *key*.
+        """
+        return os.path.isfile(
+            os.path.join(self.entry_path(key), self.marker_name)
+        )
+
+    def restore(self, key, cwd, artifacts):
+        """
+        Copy the *artifacts* stored under *key* into the *cwd* directory,
+        replacing any existing files or directories of the same name. The
+        *artifacts* are paths relative to *cwd*. Return True if the entry was
+        restored or False if there is no complete entry for the key.
+        """
+        entry = self.entry_path(key)
+        if not self.contains(key):
+            return False
+        for name in artifacts:
+            source = os.path.join(entry, name)
+            destination = os.path.join(cwd, name)
+            if not os.path.exists(source):
+                continue
+            if os.path.isdir(destination):
+                shutil.rmtree(destination)
+            elif os.path.exists(destination):
+                os.remove(destination)
+            if os.path.isdir(source):
+                shutil.copytree(source, destination)
+            else:
+                shutil.copy2(source, destination)
+        # Mark the entry as recently used
+        os.utime(os.path.join(entry, self.marker_name), None)
+        log.debug('Restored artifact ' + key)
+        return True
+
+    def store(self, key, cwd, artifacts):
+        """
+        Copy the *artifacts*, given as paths relative to *cwd*, into the store
+        under *key*. Artifacts that do not exist are ignored.
+        """
+        if self.contains(key):
+            return
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        temp = os.path.join(self.root, '.tmp-' + uuid.uuid4().hex)
+        os.makedirs(temp)
+        try:
+            size = 0
+            for name in artifacts:
+                source = os.path.join(cwd, name)
+                destination = os.path.join(temp, name)
+                if os.path.isdir(source):
+                    shutil.copytree(source, destination)
+                elif os.path.isfile(source):
+                    shutil.copy2(source, destination)
+                else:
+                    continue
+                size += get_size(source)
+            with open(os.path.join(temp, self.marker_name), 'w') as f:
+                f.write(str(size))
+            try:
+                os.rename(temp, self.entry_path(key))
+            except OSError:
+                # Another process stored the same entry first
+                log.debug('Artifact already stored: ' + key)
+        finally:
+            if os.path.exists(temp):
+                shutil.rmtree(temp)
+        log.debug('Stored artifact ' + key)
+        self.evict()
+
+    def get_entries(self):
+        """
+        Return a list of (last used time, size, key) tuples for each complete
+        entry in the store.
+        """
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for key in os.listdir(self.root):
+            marker = os.path.join(self.entry_path(key), self.marker_name)
+            try:
+                with open(marker, 'r') as f:
+                    size = int(f.read() or 0)
+                entries.append((os.path.getmtime(marker), size, key))
+            except (OSError, IOError, ValueError):
+                continue
+        return entries
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the store is no larger
+        than its maximum size.
+        """
+        if self.max_size is None:
+            return
+        entries = sorted(self.get_entries())
+        total = sum(size for used, size, key in entries)
+        for used, size, key in entries:
+            if total <= self.max_size:
+                break
+            log.debug('Evicting artifact ' + key)
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total -= size
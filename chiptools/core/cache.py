@@ -1,7 +1,8 @@
-from copy import deepcopy
-import pickle
+import sqlite3
 import hashlib
+import json
 import os
+import threading
 import traceback
 import logging
 import datetime
@@ -23,19 +24,70 @@ class FileCache:
     determine if a given File object has been modified since it was last added
     to the cache.
 
-    Internally the cache file is stored as a Pickled dictionary of two items:
-        * LIBRARIES : A set of libraries that were added to the cache using
+    Internally the cache file is an SQLite database in WAL mode containing
+    seven tables, the first five of which are keyed by the tool name:
+        * LIBRARIES : The libraries that were added to the cache using
         *add_library*
-        * FILES : A dictionary of file path / file md5 sum pairs
-        of files added using *add_file*
+        * FILES : The file path, md5 sum and signature (modification time,
+        size and inode) of files added using *add_file*
+        * DEPENDENCIES : The file paths that each file depended on when it
+        was compiled, and the md5 sum of each file that it included
+        * TESTS : The duration of each unit test when it was last run, which
+        is used to schedule the longest tests first
+        * SNAPSHOTS : The fingerprint of the compiled design that each
+        elaborated simulation snapshot was built from
+        * PROJECTS : The operations read from each project file and the
+        fingerprint of the file that they were read from, so that unchanged
+        project files do not need to be parsed again
+        * UNITS : The design units scanned from each source file by the
+        *DependencyIndex*, with the file signature and md5 sum
+
+    Every change to the cache is committed as it is made, so the cost of
+    updating the cache is proportional to the number of files compiled, an
+    interrupted compilation never corrupts the cache and more than one
+    chiptools process can safely share the same cache file. SQLite WAL mode
+    requires shared memory between processes, so the cache should not be
+    placed on a network file system.
+
+    The recorded dependencies are used by *get_stale_files* to recompile the
+    files that depend on a changed file, even if the change has removed the
+    dependency from the current source. A file is also recompiled if a file
+    that it included, such as a Verilog header, has changed since it was
+    compiled.
+
+    A file is only read and hashed if its signature differs from the one
+    stored in the cache. Hashes are also remembered for the lifetime of the
+    FileCache instance so a file is never hashed twice in one pass.
     """
     cache_file_name = '_compilation.cache'
-    field_id_files = 'FILES'
-    field_id_libraries = 'LIBRARIES'
-    blank_cache_element = {
-        field_id_libraries: set(),
-        field_id_files: {},
-    }
+    # Increment this when the schema changes to invalidate existing caches
+    cache_version = 3
+    # Seconds to wait for another process to release a lock on the cache
+    cache_timeout = 60
+    schema = [
+        'CREATE TABLE IF NOT EXISTS LIBRARIES (' +
+        'tool TEXT, library TEXT, PRIMARY KEY (tool, library))',
+        'CREATE TABLE IF NOT EXISTS FILES (' +
+        'tool TEXT, path TEXT, md5 TEXT, signature TEXT, ' +
+        'PRIMARY KEY (tool, path))',
+        'CREATE TABLE IF NOT EXISTS DEPENDENCIES (' +
+        'tool TEXT, path TEXT, dependency TEXT, md5 TEXT, ' +
+        'PRIMARY KEY (tool, path, dependency))',
+        'CREATE TABLE IF NOT EXISTS TESTS (' +
+        'tool TEXT, test TEXT, duration REAL, PRIMARY KEY (tool, test))',
+        'CREATE TABLE IF NOT EXISTS SNAPSHOTS (' +
+        'tool TEXT, path TEXT, fingerprint TEXT, PRIMARY KEY (tool, path))',
+        'CREATE TABLE IF NOT EXISTS PROJECTS (' +
+        'path TEXT, synthesise TEXT, fingerprint TEXT, operations TEXT, ' +
+        'PRIMARY KEY (path, synthesise))',
+        'CREATE TABLE IF NOT EXISTS UNITS (' +
+        'path TEXT, library TEXT, signature TEXT, md5 TEXT, units TEXT, ' +
+        'PRIMARY KEY (path, library))',
+    ]
+    tables = [
+        'LIBRARIES', 'FILES', 'DEPENDENCIES', 'TESTS', 'SNAPSHOTS', 'PROJECTS',
+        'UNITS'
+    ]
 
     def __init__(self, cache_path):
         """
@@ -43,10 +95,47 @@ class FileCache:
         the cache file name and root directory.
         """
         self.cache_path = cache_path + self.cache_file_name
-        try:
-            self.load_cache()
-        except IOError:
-            self.initialise_cache()
+        # Dictionary of path : (signature, md5) for files hashed by this
+        # instance.
+        self.digests = {}
+        self.connection = None
+        # Serialises access to the database connection between threads
+        self.lock = threading.RLock()
+        self.load_cache()
+
+    def connect(self):
+        """
+        Open the database connection and create the cache tables if they are
+        not present. Tables created by an incompatible version of the cache
+        are dropped.
+        """
+        self.connection = sqlite3.connect(
+            self.cache_path,
+            timeout=self.cache_timeout,
+            check_same_thread=False
+        )
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            version = self.connection.execute(
+                'PRAGMA user_version'
+            ).fetchone()[0]
+            if version != self.cache_version:
+                for table in self.tables:
+                    self.connection.execute('DROP TABLE IF EXISTS ' + table)
+                self.connection.execute(
+                    'PRAGMA user_version={0}'.format(self.cache_version)
+                )
+            for statement in self.schema:
+                self.connection.execute(statement)
+
+    def close(self):
+        """
+        Close the database connection if it is open.
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
 
     def load_cache(self):
         """
@@ -54,15 +143,18 @@ class FileCache:
         file is present a new one will be created.
         """
         start_time = time.time()
-        try:
-            # Load the cache file so we know the compilation state of the
-            # design
-            with open(self.cache_path, 'rb') as pickeFile:
-                self.cache = pickle.load(pickeFile)
-        except:
-            log.warning('The cache file was corrupted, re-initialising...')
-            log.debug(traceback.format_exc())
-            self.initialise_cache()
+        with self.lock:
+            try:
+                self.connect()
+            except sqlite3.DatabaseError:
+                # The file is corrupted or was written by an older version of
+                # chiptools that stored the cache as a Pickled dictionary.
+                log.warning(
+                    'The cache file was corrupted, re-initialising...'
+                )
+                log.debug(traceback.format_exc())
+                self.delete()
+                self.connect()
         log.debug(
             'Cache loaded in ' + utils.time_delta_string(
                 start_time,
@@ -72,99 +164,246 @@ class FileCache:
 
     def initialise_cache(self):
         """
-        Initialise the FileCache by generating a new cache file and clearing
-        the local cache dictionary.
+        Initialise the FileCache by removing all entries from the cache file.
         """
         log.debug('Clearing cache...')
-        # The cache file doesn't exist, so we will create a new one
-        self.cache = {}
-        self.save_cache()
+        with self.lock, self.connection:
+            for table in self.tables:
+                self.connection.execute('DELETE FROM ' + table)
 
     def save_cache(self):
         """
-        Store the local cache dictionary into the linked cache file so that it
-        can be retrieved later.
+        Commit any outstanding changes to the linked cache file. Changes are
+        committed as they are made, so this is only needed by callers that
+        modify the database connection directly.
         """
         log.debug('Saving cache...')
-        with open(self.cache_path, 'wb') as cache_file:
-            pickle.dump(self.cache, cache_file)
+        with self.lock:
+            self.connection.commit()
         log.debug('...done')
 
+    def query(self, statement, parameters=()):
+        """
+        Return all of the rows returned by the given SQL *statement*.
+        """
+        with self.lock:
+            return self.connection.execute(statement, parameters).fetchall()
+
+    def get_digest(self, path):
+        """
+        Return a tuple of (signature, md5) for the file at the given *path*.
+        The file is only hashed if its signature has changed since it was
+        last hashed by this FileCache instance.
+        """
+        # Take the signature before reading the file so that a change made
+        # while the file is being hashed is detected on the next pass.
+        signature = utils.file_signature(path)
+        digest = self.digests.get(path, None)
+        if digest is None or digest[0] != signature:
+            with open(path, 'rb') as f:
+                md5 = hashlib.md5(f.read()).hexdigest()
+            digest = (signature, md5)
+            self.digests[path] = digest
+        return digest
+
+    @staticmethod
+    def signature_string(signature):
+        """
+        Return the given file *signature* tuple as a string for storage in
+        the cache, inode numbers can exceed the range of an SQLite integer.
+        """
+        return ':'.join(str(field) for field in signature)
+
     def is_file_changed(self, file_object, tool_name):
         """
         Compare the given md5 with the given file path from the cache, if
         the match return True or return False if the hashes do not match or
-        the file does not exist.
+        the file does not exist. The file is not hashed if its signature
+        matches the signature stored in the cache.
         """
         path = file_object.path
         if not os.path.exists(path):
             log.error('File does not exist: {0}'.format(path))
             return False
 
-        if tool_name in self.cache:
-            cached_md5 = self.cache[tool_name][
-                self.field_id_files
-            ].get(path, None)
-            with open(path, 'rb') as f:
-                md5 = hashlib.md5(f.read()).hexdigest()
-            if cached_md5 == md5:
-                # File is not changed
-                return False
-            else:
-                # File was changed
-                return True
+        rows = self.query(
+            'SELECT md5, signature FROM FILES WHERE tool=? AND path=?',
+            (tool_name, path)
+        )
+        if len(rows) == 0:
             # File is not in cache
             return True
+        cached_md5, cached_signature = rows[0]
+        if cached_signature == self.signature_string(
+            utils.file_signature(path)
+        ):
+            # File is not changed
+            return False
+        signature, md5 = self.get_digest(path)
+        if cached_md5 == md5:
+            # File is not changed, but it has been touched. Update the
+            # signature so that it does not need to be hashed again.
+            with self.lock, self.connection:
+                self.connection.execute(
+                    'UPDATE FILES SET signature=? WHERE tool=? AND path=?',
+                    (self.signature_string(signature), tool_name, path)
+                )
+            return False
         else:
+            # File was changed
             return True
 
     def library_in_cache(self, libname, tool_name):
         """
         Return True if the given *libname* library name is present in the
-        local cache dictionary.
+        cache.
         """
-        if tool_name in self.cache:
-            return libname in self.cache[tool_name][self.field_id_libraries]
-        return False
+        return len(
+            self.query(
+                'SELECT 1 FROM LIBRARIES WHERE tool=? AND library=?',
+                (tool_name, libname)
+            )
+        ) > 0
 
     def get_libraries(self, tool_name):
         """
-        Return the local cache dictionary library name set.
+        Return the set of library names in the cache for the given tool.
         """
-        if tool_name in self.cache:
-            return self.cache[tool_name].get(self.field_id_libraries, set())
-        return set()
+        return set(
+            row[0] for row in self.query(
+                'SELECT library FROM LIBRARIES WHERE tool=?',
+                (tool_name,)
+            )
+        )
 
     def get_tool_names(self):
-        return list(self.cache.keys())
+        return [
+            row[0] for row in self.query(
+                'SELECT tool FROM LIBRARIES UNION SELECT tool FROM FILES'
+            )
+        ]
 
     def add_library(self, library, tool_name):
         """
-        Add the given *library* name to the local cache dictionary library
-        name set.
+        Add the given *library* name to the cache library name set.
         """
-        if tool_name not in self.cache:
-            self.cache[tool_name] = deepcopy(self.blank_cache_element)
-        self.cache[tool_name][self.field_id_libraries].add(library)
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO LIBRARIES VALUES (?, ?)',
+                (tool_name, library)
+            )
         log.debug('Library added to cache: ' + library)
 
-    def add_file(self, fileObject, tool_name):
+    def get_dependencies(self, fileObject, tool_name):
+        """
+        Return the set of file paths that the given *fileObject* depended on
+        when it was last added to the cache.
+        """
+        return set(
+            row[0] for row in self.query(
+                'SELECT dependency FROM DEPENDENCIES ' +
+                'WHERE tool=? AND path=? AND md5 IS NULL',
+                (tool_name, fileObject.path)
+            )
+        )
+
+    def is_include_changed(self, fileObject, tool_name):
+        """
+        Return True if any of the files that the given *fileObject* included
+        when it was last added to the cache has changed or been removed.
+        """
+        for path, md5 in self.query(
+            'SELECT dependency, md5 FROM DEPENDENCIES ' +
+            'WHERE tool=? AND path=? AND md5 IS NOT NULL',
+            (tool_name, fileObject.path)
+        ):
+            if not os.path.isfile(path) or self.get_digest(path)[1] != md5:
+                log.debug('Included file was modified: ' + path)
+                return True
+        return False
+
+    def get_stale_files(self, files, graph, tool_name, libraries=()):
         """
-        Add the given *fileObject* to the local cache file/md5 dictionary. The
-        FileObject MD5 and compilation time are updated by this method before
-        it is added to the cache.
+        Return the set of indices into the ordered *files* list that must be
+        recompiled. A file is stale if it has changed since it was added to
+        the cache, if a file it included has changed, if its library is in
+        *libraries* or if it depends on a stale file. Dependencies are taken
+        from the *graph* dictionary of *index* : *set(indices)* and from the
+        dependencies recorded in the cache, only dependencies on files
+        earlier in the list are considered.
+        """
+        stale = set()
+        indices = {}
+        for index, file_object in enumerate(files):
+            dependencies = set(graph.get(index, ()))
+            dependencies.update(
+                indices[path] for path in self.get_dependencies(
+                    file_object,
+                    tool_name
+                ) if path in indices
+            )
+            if (
+                file_object.library in libraries or
+                self.is_file_changed(file_object, tool_name) or
+                self.is_include_changed(file_object, tool_name)
+            ):
+                stale.add(index)
+            elif dependencies & stale:
+                log.debug(
+                    'File depends on a modified file: ' +
+                    os.path.basename(file_object.path)
+                )
+                stale.add(index)
+            indices[file_object.path] = index
+        return stale
+
+    def add_file(
+        self,
+        fileObject,
+        tool_name,
+        dependencies=None,
+        includes=None
+    ):
         """
-        if tool_name not in self.cache:
-            self.cache[tool_name] = deepcopy(self.blank_cache_element)
-        with open(fileObject.path, 'rb') as f:
-            md5 = hashlib.md5(f.read()).hexdigest()
+        Add the given *fileObject* to the cache. The FileObject MD5 and
+        compilation time are updated by this method before it is added to the
+        cache. The optional *dependencies* set of file paths is recorded as
+        the files that *fileObject* was compiled against and the MD5 of each
+        of the optional *includes* file paths is recorded so that a change
+        to an included file will recompile *fileObject*.
+        """
+        signature, md5 = self.get_digest(fileObject.path)
         fileObject.compile_time = datetime.datetime.now().strftime(
             "%Y-%m-%d %H:%M:%S"
         )
         fileObject.md5 = md5
-        self.cache[tool_name][self.field_id_files][fileObject.path] = (
-            fileObject.md5
-        )
+        include_digests = [
+            (path, self.get_digest(path)[1]) for path in (includes or ())
+        ]
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO FILES VALUES (?, ?, ?, ?)',
+                (
+                    tool_name,
+                    fileObject.path,
+                    fileObject.md5,
+                    self.signature_string(signature),
+                )
+            )
+            self.connection.execute(
+                'DELETE FROM DEPENDENCIES WHERE tool=? AND path=?',
+                (tool_name, fileObject.path)
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO DEPENDENCIES VALUES (?, ?, ?, ?)',
+                [
+                    (tool_name, fileObject.path, dependency, None)
+                    for dependency in (dependencies or ())
+                ] + [
+                    (tool_name, fileObject.path, path, md5)
+                    for path, md5 in include_digests
+                ]
+            )
         log.debug(
             'File added to cache: ' +
             os.path.basename(fileObject.path) +
@@ -174,21 +413,178 @@ class FileCache:
 
     def remove_file(self, fileObject, tool_name):
         """
-        Remove the given *fileObject* from the local cache file/md5 dictionary
-        if it is present.
+        Remove the given *fileObject* from the cache if it is present.
         """
-        if tool_name not in self.cache:
-            self.cache[tool_name] = deepcopy(self.blank_cache_element)
-        if fileObject.path in self.cache[tool_name][self.field_id_files]:
-            del self.cache[tool_name][self.field_id_files][fileObject.path]
+        with self.lock, self.connection:
+            removed = self.connection.execute(
+                'DELETE FROM FILES WHERE tool=? AND path=?',
+                (tool_name, fileObject.path)
+            ).rowcount
+            self.connection.execute(
+                'DELETE FROM DEPENDENCIES WHERE tool=? AND path=?',
+                (tool_name, fileObject.path)
+            )
+        if removed:
             log.debug(
                 'File removed from cache: ' +
                 os.path.basename(fileObject.path)
             )
 
+    def get_test_durations(self, tool_name):
+        """
+        Return a dictionary of *test name* : *duration* in seconds for the
+        tests recorded using *add_test_durations* for the given tool.
+        """
+        return dict(
+            self.query(
+                'SELECT test, duration FROM TESTS WHERE tool=?',
+                (tool_name,)
+            )
+        )
+
+    def add_test_durations(self, durations, tool_name):
+        """
+        Record the *durations* dictionary of *test name* : *duration* in
+        seconds for the given tool, replacing any previous durations.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO TESTS VALUES (?, ?, ?)',
+                (
+                    (tool_name, name, duration)
+                    for name, duration in durations.items()
+                )
+            )
+
+    def get_file_digests(self, tool_name):
+        """
+        Return a dictionary of *path* : *md5* for the files that were last
+        compiled by the given tool.
+        """
+        return dict(
+            self.query(
+                'SELECT path, md5 FROM FILES WHERE tool=?',
+                (tool_name,)
+            )
+        )
+
+    def get_include_digests(self, tool_name):
+        """
+        Return a sorted list of (*path*, *included path*, *md5*) for the
+        files included by the files that were last compiled by the given
+        tool.
+        """
+        return sorted(
+            self.query(
+                'SELECT path, dependency, md5 FROM DEPENDENCIES ' +
+                'WHERE tool=? AND md5 IS NOT NULL',
+                (tool_name,)
+            )
+        )
+
+    def get_snapshot(self, path, tool_name):
+        """
+        Return the fingerprint recorded for the simulation snapshot at the
+        given *path* using *add_snapshot*, or None if it is not recorded.
+        """
+        rows = self.query(
+            'SELECT fingerprint FROM SNAPSHOTS WHERE tool=? AND path=?',
+            (tool_name, path)
+        )
+        if len(rows) == 0:
+            return None
+        return rows[0][0]
+
+    def add_snapshot(self, path, fingerprint, tool_name):
+        """
+        Record the *fingerprint* of the design that the simulation snapshot
+        at the given *path* was elaborated from.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO SNAPSHOTS VALUES (?, ?, ?)',
+                (tool_name, path, fingerprint)
+            )
+
+    def remove_snapshot(self, path, tool_name):
+        """
+        Remove the simulation snapshot at the given *path* from the cache.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM SNAPSHOTS WHERE tool=? AND path=?',
+                (tool_name, path)
+            )
+
+    def get_project_operations(self, path, synthesise, fingerprint):
+        """
+        Return the list of operations recorded for the project file at the
+        given *path* and *synthesise* flag using *add_project_operations*, or
+        None if they are not recorded or the file *fingerprint* has changed.
+        """
+        rows = self.query(
+            'SELECT fingerprint, operations FROM PROJECTS ' +
+            'WHERE path=? AND synthesise=?',
+            (path, str(synthesise))
+        )
+        if len(rows) == 0 or rows[0][0] != fingerprint:
+            return None
+        return json.loads(rows[0][1])
+
+    def add_project_operations(self, path, synthesise, fingerprint, ops):
+        """
+        Record the list of operations *ops* read from the project file at the
+        given *path* with the *synthesise* flag, and the *fingerprint* of the
+        file that they were read from.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO PROJECTS VALUES (?, ?, ?, ?)',
+                (path, str(synthesise), fingerprint, json.dumps(ops))
+            )
+
+    def get_design_units(self):
+        """
+        Return a dictionary of (*path*, *library*) : (*signature*, *md5*,
+        *units*) for the design units recorded using *add_design_units*, the
+        *units* are the JSON encoded units of the file.
+        """
+        return dict(
+            ((path, library), (signature, md5, units))
+            for path, library, signature, md5, units in self.query(
+                'SELECT path, library, signature, md5, units FROM UNITS'
+            )
+        )
+
+    def add_design_units(self, entries):
+        """
+        Record the *entries* dictionary of (*path*, *library*) :
+        (*signature*, *md5*, *units*) in one transaction, replacing any
+        previous entries for the same files.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO UNITS VALUES (?, ?, ?, ?, ?)',
+                (
+                    (path, library, signature, md5, units)
+                    for (path, library), (signature, md5, units)
+                    in entries.items()
+                )
+            )
+
+    def remove_design_units(self):
+        """
+        Remove all of the design units recorded using *add_design_units*.
+        """
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM UNITS')
+
     def delete(self):
         """
         Delete the cache file pointed to by this FileCache instance.
         """
-        if os.path.exists(self.cache_path):
-            os.remove(self.cache_path)
+        with self.lock:
+            self.close()
+            for suffix in ['', '-wal', '-shm']:
+                if os.path.exists(self.cache_path + suffix):
+                    os.remove(self.cache_path + suffix)
@@ -3,7 +3,9 @@ import logging
 import traceback
 import os
 import sys
+import shlex
 import shutil
+import subprocess
 import textwrap
 
 from chiptools.parsers.xml_project import XmlProjectParser
@@ -25,10 +27,71 @@ def wraps_do_commands(fn):
         try:
             return fn(*args, **kwargs)
         except:
+            args[0].failed = True
             log.error('Command failed due to error:')
             log.error(traceback.format_exc())
     return wrapper
 
+
+def split_command(command):
+    """
+    Split the given command string into a list of arguments. Arguments that
+    contain spaces can be quoted, as they would be on the system command line.
+    """
+    if os.name == 'nt':
+        # Backslashes are path separators rather than escape characters
+        return [
+            elem[1:-1] if len(elem) > 1 and elem[0] == elem[-1] == '"'
+            else elem for elem in shlex.split(command, posix=False)
+        ]
+    return shlex.split(command)
+
+
+def join_command(elems):
+    """
+    Return a command string for the given list of arguments that is split
+    back into the same arguments by *split_command*.
+    """
+    if os.name == 'nt':
+        return subprocess.list2cmdline(elems)
+    return ' '.join(shlex.quote(elem) for elem in elems)
+
+
+def parse_jobs(command):
+    """
+    Remove a *-j N* (or *-jN*) option from the given command string and return
+    a tuple of (*jobs*, *command*) where *jobs* is the integer number of jobs,
+    or None if the option was not supplied, and *command* is the remaining
+    command string.
+    """
+    elems = split_command(command)
+    jobs = None
+    remaining = []
+    idx = 0
+    while idx < len(elems):
+        elem = elems[idx]
+        if elem == '-j' and idx + 1 < len(elems):
+            jobs = int(elems[idx + 1])
+            idx += 1
+        elif elem.startswith('-j') and elem[2:].isdigit():
+            jobs = int(elem[2:])
+        else:
+            remaining.append(elem)
+        idx += 1
+    return jobs, join_command(remaining)
+
+
+def parse_assignments(text):
+    """
+    Return a dictionary of *name* : *value* for the given comma separated
+    string of *name=value* assignments.
+    """
+    assignments = {}
+    for item in text.split(','):
+        name, value = item.split('=', 1)
+        assignments[name.strip()] = value.strip()
+    return assignments
+
 SEP = ' ' * 4
 
 INTRO_TEMPL = (
@@ -100,6 +163,7 @@ class CommandLine(cmd.Cmd, object):
             )
 
         self.test_set = set()
+        self.failed = False
 
     def locateProjects(self):
         """
@@ -128,6 +192,10 @@ class CommandLine(cmd.Cmd, object):
     @wraps_do_commands
     def do_load_project(self, path):
         """Load the given project XML file: load_project <path_to_project>"""
+        elems = split_command(path)
+        if len(elems) == 1:
+            # The path was quoted or does not contain spaces
+            path = elems[0]
         path = os.path.abspath(path)
         if os.path.exists(path) and os.path.isfile(path):
             try:
@@ -137,7 +205,7 @@ class CommandLine(cmd.Cmd, object):
                         os.getcwd()
                     )
                 )
-                XmlProjectParser.load_project(path, self.project)
+                self.project.load_project(path)
             except:
                 log.error('The project could not be loaded due to an error:')
                 log.error(traceback.format_exc())
@@ -150,7 +218,13 @@ class CommandLine(cmd.Cmd, object):
 
     @wraps_do_commands
     def do_compile(self, command):
-        self.project.compile()
+        """Compile the project using the chosen simulator, the optional -j
+        argument sets the number of files that can be compiled in parallel.
+        Example: (Cmd) compile [tool_name] [-j N]"""
+        jobs, command = parse_jobs(command)
+        elems = split_command(command)
+        tool_name = elems[0] if len(elems) > 0 else None
+        self.project.compile(tool_name=tool_name, jobs=jobs)
 
     @wraps_do_commands
     def do_show_synthesis_fileset(self, command):
@@ -167,15 +241,33 @@ class CommandLine(cmd.Cmd, object):
     @wraps_do_commands
     def do_synthesise(self, command):
         """Synthesise the design using the chosen synthesis tool and report any
-        errors Example: (Cmd) simulate my_library.my_entity"""
-        command_elems = command.split(' ')
+        errors. The build is skipped if an archive built from the same inputs
+        exists, use --force to build anyway. For tools with flow stages the
+        --from-stage and --to-stage options select the stages to run.
+        Example: (Cmd) synthesise my_library.my_entity [tool_name] [part]
+        [--force] [--from-stage stage] [--to-stage stage]"""
+        elems = split_command(command)
+        force = False
+        stages = {'--from-stage': None, '--to-stage': None}
+        command_elems = []
+        idx = 0
+        while idx < len(elems):
+            elem = elems[idx]
+            if elem == '--force':
+                force = True
+            elif elem in stages and idx + 1 < len(elems):
+                stages[elem] = elems[idx + 1]
+                idx += 1
+            else:
+                command_elems.append(elem)
+            idx += 1
         fpga_part = None
         if len(command_elems) == 3:
             target, tool_name, fpga_part = command_elems
         elif len(command_elems) == 2:
             target, tool_name = command_elems
         else:
-            target = command_elems[0]
+            target = command_elems[0] if len(command_elems) > 0 else ''
             tool_name = None
 
         try:
@@ -192,8 +284,64 @@ class CommandLine(cmd.Cmd, object):
             library,
             entity,
             tool_name=tool_name,
-            fpga_part=fpga_part
+            fpga_part=fpga_part,
+            force=force,
+            from_stage=stages['--from-stage'],
+            to_stage=stages['--to-stage']
+        )
+
+    @wraps_do_commands
+    def do_synthesise_sweep(self, command):
+        """
+        Synthesise the design for each combination of the given FPGA parts,
+        generic sets and tool argument sets, running up to N synthesis jobs
+        in parallel, and report the timing slack and utilisation of each.
+        Each --generics or --args option adds a set of comma separated
+        name=value assignments, tool arguments are named by their
+        configuration item. The project must be loaded from a project file.
+        Example: (Cmd) synthesise_sweep my_library.my_entity [tool_name]
+        [-j N] [--part P]... [--generics name=value,...]...
+        [--args args_vivado_synthesis=value,...]...
+        """
+        jobs, command = parse_jobs(command)
+        elems = split_command(command)
+        options = {'--part': [], '--generics': [], '--args': []}
+        positional = []
+        idx = 0
+        while idx < len(elems):
+            elem = elems[idx]
+            if elem in options and idx + 1 < len(elems):
+                if elem == '--part':
+                    options[elem].append(elems[idx + 1])
+                else:
+                    options[elem].append(parse_assignments(elems[idx + 1]))
+                idx += 1
+            else:
+                positional.append(elem)
+            idx += 1
+        try:
+            library, entity = positional[0].split('.')
+        except (IndexError, ValueError):
+            log.error('Command \"' + command + '\" not understood.')
+            log.error(
+                "Please specify a library and entity.\n" +
+                "Example: (Cmd) synthesise_sweep my_library.my_entity " +
+                "[tool_name] [-j N] [--part P] [--generics name=value,...]"
+            )
+            self.failed = True
+            return
+        tool_name = positional[1] if len(positional) > 1 else None
+        results = self.project.synthesise_sweep(
+            library,
+            entity,
+            tool_name=tool_name,
+            parts=options['--part'],
+            generic_sets=options['--generics'],
+            argument_sets=options['--args'],
+            jobs=jobs
         )
+        if any(result['status'] != 'passed' for result in results):
+            self.failed = True
 
     @wraps_do_commands
     def do_run_preprocessors(self, command):
@@ -210,7 +358,7 @@ class CommandLine(cmd.Cmd, object):
         """Compile the given entity in the given library using the chosen
         simulator and invoke the simulator GUI.
         Example: (Cmd) simulate my_library.my_entity"""
-        command_elems = command.split(' ')
+        command_elems = split_command(command) or ['']
         if len(command_elems) == 2:
             target, tool_name = command_elems
         else:
@@ -491,11 +639,61 @@ class CommandLine(cmd.Cmd, object):
     def do_run_tests(self, command):
         """
         Run the tests that were selected via the add_tests command and report
-        the results.
+        the results, the optional -j argument sets the number of tests that
+        can be run in parallel.
+        Example: (Cmd) run_tests [tool_name] [-j N]
         """
-        if len(command) > 0:
-            tool_name = command
-        else:
-            tool_name = None
+        jobs, command = parse_jobs(command)
+        elems = split_command(command)
+        tool_name = elems[0] if len(elems) > 0 else None
+        self.show_test_selection()
+        if not self.project.run_tests(
+            self.test_set,
+            tool_name=tool_name,
+            jobs=jobs
+        ):
+            self.failed = True
+
+    @wraps_do_commands
+    def do_serve_tests(self, command):
+        """
+        Hand out the tests that were selected via the add_tests command to
+        test workers started with the test_worker command on this or other
+        machines, and report the results when they are all complete. The
+        address defaults to localhost:6174. Serving tests to other machines
+        on any other host address requires the CHIPTOOLS_AUTHKEY environment
+        variable to be set, and workers must use the same CHIPTOOLS_AUTHKEY
+        as the coordinator.
+        Example: (Cmd) serve_tests [host:port] [tool_name]
+        """
+        from chiptools.testing import distributed
+        elems = split_command(command)
+        address = distributed.parse_address(elems[0] if elems else '')
+        tool_name = elems[1] if len(elems) > 1 else None
         self.show_test_selection()
-        self.project.run_tests(self.test_set, tool_name=tool_name)
+        if not self.project.serve_tests(
+            address,
+            self.test_set,
+            tool_name=tool_name,
+            authkey=distributed.get_authkey()
+        ):
+            self.failed = True
+
+    @wraps_do_commands
+    def do_test_worker(self, command):
+        """
+        Compile the project and run the tests handed out by the serve_tests
+        command running at the given address until there are none left.
+        Example: (Cmd) test_worker host:port [tool_name]
+        """
+        elems = split_command(command)
+        if len(elems) == 0:
+            log.error('The address of the test coordinator is required.')
+            return
+        from chiptools.testing import distributed
+        tool_name = elems[1] if len(elems) > 1 else None
+        self.project.run_test_worker(
+            distributed.parse_address(elems[0]),
+            tool_name=tool_name,
+            authkey=distributed.get_authkey()
+        )
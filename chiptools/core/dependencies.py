@@ -0,0 +1,355 @@
+"""
+The dependencies module implements a lightweight lexical scanner for HDL
+source files and uses it to build a dependency graph of the files in a
+Project. The scanner does not attempt to parse the source languages, it uses
+regular expressions to find the design unit declarations and references that
+determine the order in which files must be compiled.
+
+Design units are identified by a tuple of (library, unit) where both names are
+lower case strings. References to the *work* library are resolved to the
+library that the referencing file is compiled into. Verilog and SystemVerilog
+do not qualify references with a library name, so units referenced from these
+languages use a library of None, which matches a unit of the same name in any
+library.
+
+Files named by Verilog *`include* directives are not part of the graph as they
+are not compiled on their own, they are resolved relative to the including
+file so that a change to them can recompile the files that include them.
+
+Scanning results are stored in a DependencyIndex, which is persisted in the
+project compilation cache so that a source file is only scanned again when
+its contents change.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import time
+
+from chiptools.common import utils
+from chiptools.common.filetypes import FileType
+
+log = logging.getLogger(__name__)
+
+VHDL_COMMENT_RE = re.compile(r'--[^\n]*')
+VERILOG_COMMENT_RE = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+# VHDL design unit declarations
+VHDL_ENTITY_RE = re.compile(r'\bentity\s+(\w+)\s+is\b', re.IGNORECASE)
+VHDL_PACKAGE_RE = re.compile(
+    r'\bpackage\s+(?!body\b)(\w+)\s+is\b',
+    re.IGNORECASE
+)
+VHDL_CONFIGURATION_RE = re.compile(
+    r'\bconfiguration\s+(\w+)\s+of\s+(\w+)\s+is\b',
+    re.IGNORECASE
+)
+# VHDL design unit references
+VHDL_PACKAGE_BODY_RE = re.compile(
+    r'\bpackage\s+body\s+(\w+)\s+is\b',
+    re.IGNORECASE
+)
+VHDL_ARCHITECTURE_RE = re.compile(
+    r'\barchitecture\s+\w+\s+of\s+(\w+)\s+is\b',
+    re.IGNORECASE
+)
+VHDL_USE_RE = re.compile(r'\buse\s+(\w+)\s*\.\s*(\w+)', re.IGNORECASE)
+VHDL_INSTANCE_RE = re.compile(
+    r'\b(?:entity|configuration)\s+(\w+)\s*\.\s*(\w+)',
+    re.IGNORECASE
+)
+VHDL_COMPONENT_RE = re.compile(r'\bcomponent\s+(\w+)', re.IGNORECASE)
+# Verilog/SystemVerilog design unit declarations
+VERILOG_UNIT_RE = re.compile(
+    r'\b(?:module|macromodule|interface|program|package)\s+' +
+    r'(?:(?:static|automatic)\s+)?(\w+)'
+)
+# Verilog/SystemVerilog design unit references
+VERILOG_IMPORT_RE = re.compile(r'\b(\w+)\s*::')
+VERILOG_INCLUDE_RE = re.compile(r'`include\s+"([^"]+)"')
+
+
+class DesignUnits(object):
+    """
+    A DesignUnits instance holds the design units that are provided by a
+    source file and the design units that the source file requires. Both are
+    stored as sets of (library, unit) tuples.
+
+    Units that are only bound when the design is elaborated, such as VHDL
+    component instantiations, do not affect the order in which files are
+    compiled and are stored separately in the *references* set. The names of
+    any files included by the source file are stored in the *includes* set.
+    """
+    def __init__(
+        self,
+        provides=None,
+        requires=None,
+        references=None,
+        includes=None
+    ):
+        self.provides = set() if provides is None else set(provides)
+        self.requires = set() if requires is None else set(requires)
+        self.references = set() if references is None else set(references)
+        self.includes = set() if includes is None else set(includes)
+
+
+def scan_vhdl(data, library):
+    """
+    Scan the VHDL source string *data* compiled into *library* and return a
+    DesignUnits instance describing the units it provides and requires.
+    """
+    data = VHDL_COMMENT_RE.sub('', data)
+    library = library.lower()
+    units = DesignUnits()
+
+    def qualify(libname, unit):
+        libname = libname.lower()
+        if libname == 'work':
+            libname = library
+        return (libname, unit.lower())
+
+    for match in VHDL_ENTITY_RE.finditer(data):
+        units.provides.add((library, match.group(1).lower()))
+    for match in VHDL_PACKAGE_RE.finditer(data):
+        units.provides.add((library, match.group(1).lower()))
+    for match in VHDL_CONFIGURATION_RE.finditer(data):
+        units.provides.add((library, match.group(1).lower()))
+        units.requires.add((library, match.group(2).lower()))
+    for match in VHDL_PACKAGE_BODY_RE.finditer(data):
+        units.requires.add((library, match.group(1).lower()))
+    for match in VHDL_ARCHITECTURE_RE.finditer(data):
+        units.requires.add((library, match.group(1).lower()))
+    for match in VHDL_USE_RE.finditer(data):
+        units.requires.add(qualify(match.group(1), match.group(2)))
+    for match in VHDL_INSTANCE_RE.finditer(data):
+        units.requires.add(qualify(match.group(1), match.group(2)))
+    for match in VHDL_COMPONENT_RE.finditer(data):
+        units.references.add((None, match.group(1).lower()))
+    # A file does not depend on the units that it declares itself.
+    units.requires -= units.provides
+    return units
+
+
+def scan_verilog(data, library):
+    """
+    Scan the Verilog or SystemVerilog source string *data* compiled into
+    *library* and return a DesignUnits instance describing the units it
+    provides and requires.
+    """
+    data = VERILOG_COMMENT_RE.sub('', data)
+    library = library.lower()
+    units = DesignUnits()
+    for match in VERILOG_UNIT_RE.finditer(data):
+        units.provides.add((library, match.group(1).lower()))
+    for match in VERILOG_IMPORT_RE.finditer(data):
+        units.requires.add((None, match.group(1).lower()))
+    for match in VERILOG_INCLUDE_RE.finditer(data):
+        units.includes.add(match.group(1))
+    # A file does not depend on the units that it declares itself.
+    provided_names = set(unit for libname, unit in units.provides)
+    units.requires = set(
+        (libname, unit) for libname, unit in units.requires
+        if unit not in provided_names
+    )
+    return units
+
+
+scanners = {
+    FileType.VHDL: scan_vhdl,
+    FileType.Verilog: scan_verilog,
+    FileType.SystemVerilog: scan_verilog,
+}
+
+
+def scan_data(data, file_object):
+    """
+    Scan the source file contents *data* (bytes) belonging to the given
+    *file_object* and return a DesignUnits instance. Files of a type that
+    cannot be scanned return an empty DesignUnits instance.
+    """
+    scanner = scanners.get(file_object.fileType, None)
+    if scanner is None:
+        return DesignUnits()
+    return scanner(data.decode('utf-8', 'replace'), file_object.library)
+
+
+def scan_file(file_object):
+    """
+    Scan the source file referenced by the given *file_object* and return a
+    DesignUnits instance. Files of a type that cannot be scanned return an
+    empty DesignUnits instance.
+    """
+    if file_object.fileType not in scanners:
+        return DesignUnits()
+    with open(file_object.path, 'rb') as f:
+        return scan_data(f.read(), file_object)
+
+
+def resolve_includes(file_object, includes):
+    """
+    Return the set of paths of the *includes* file names, included by the
+    source file referenced by *file_object*, that can be found relative to
+    the directory of the source file.
+    """
+    directory = os.path.dirname(file_object.path)
+    paths = set()
+    for name in includes:
+        path = os.path.normpath(os.path.join(directory, name))
+        if os.path.isfile(path):
+            paths.add(path)
+    return paths
+
+
+def build_graph(files, scan=scan_file, includes=None):
+    """
+    Return a dictionary of *index* : *set(indices)* where each index into the
+    ordered *files* list is mapped to the indices of the files that must be
+    compiled before it. If an *includes* dictionary is given it is updated
+    with *index* : *set(paths)* of the files included by each file, see
+    *resolve_includes*.
+
+    A file can only depend on files that appear before it in the *files*
+    list, so the project file order remains the authority on compilation order
+    and the resulting graph is always acyclic. If a file references a unit in
+    a project library that cannot be found in any earlier file, the file is
+    made to depend on all earlier files in that library so that the library
+    order is preserved.
+    """
+    graph = {}
+    providers = {}
+    named_providers = {}
+    library_files = {}
+    for index, file_object in enumerate(files):
+        library = file_object.library.lower()
+        units = scan(file_object)
+        if includes is not None:
+            includes[index] = resolve_includes(file_object, units.includes)
+        dependencies = set()
+        for libname, unit in units.requires:
+            if libname is None:
+                # Unqualified reference, match the unit in any library.
+                dependencies.update(named_providers.get(unit, []))
+            elif (libname, unit) in providers:
+                dependencies.add(providers[(libname, unit)])
+            elif libname in library_files:
+                log.debug(
+                    'Could not resolve {0}.{1} referenced by {2}, '.format(
+                        libname,
+                        unit,
+                        file_object.path
+                    ) + 'depending on the preceding library files instead.'
+                )
+                dependencies.update(library_files[libname])
+        graph[index] = dependencies
+        for key in units.provides:
+            providers.setdefault(key, index)
+            named_providers.setdefault(key[1], []).append(index)
+        library_files.setdefault(library, []).append(index)
+    return graph
+
+
+class DependencyIndex(object):
+    """
+    A DependencyIndex stores the DesignUnits of each source file in a project
+    so that files only need to be scanned when they change. The index is
+    persisted in the UNITS table of the given FileCache *cache*, so it is
+    updated in a transaction and can be shared by concurrent chiptools
+    processes in the same way as the compilation cache.
+
+    Each entry records the file signature (modification time, size and inode),
+    the MD5 sum of the file contents and the scanned DesignUnits. A file is
+    not read at all if its signature matches the index, and it is only scanned
+    again if its MD5 sum has changed.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        # Dictionary of (path, library) : (signature, md5, fields), loaded
+        # from the cache when the first file is scanned.
+        self.entries = None
+        # Entries that have changed since the index was last saved
+        self.modified = {}
+
+    def load(self):
+        """
+        Load the entries of this DependencyIndex from the cache.
+        """
+        start_time = time.time()
+        self.entries = {}
+        for key, (signature, md5, units) in self.cache.get_design_units(
+        ).items():
+            provides, requires, references, includes = json.loads(units)
+            self.entries[key] = (
+                signature,
+                md5,
+                (
+                    frozenset(tuple(unit) for unit in provides),
+                    frozenset(tuple(unit) for unit in requires),
+                    frozenset(tuple(unit) for unit in references),
+                    frozenset(includes),
+                )
+            )
+        log.debug(
+            'Dependency index loaded in ' + utils.time_delta_string(
+                start_time,
+                time.time()
+            )
+        )
+
+    def save(self):
+        """
+        Store the entries that have been modified since the index was last
+        saved in the cache.
+        """
+        if len(self.modified) == 0:
+            return
+        self.cache.add_design_units(
+            dict(
+                (
+                    key,
+                    (signature, md5, json.dumps([list(f) for f in fields]))
+                ) for key, (signature, md5, fields) in self.modified.items()
+            )
+        )
+        self.modified = {}
+
+    def scan(self, file_object):
+        """
+        Return the DesignUnits for the given *file_object*, scanning the file
+        only if it has changed since it was last added to the index.
+        """
+        if self.entries is None:
+            self.load()
+        key = (file_object.path, file_object.library.lower())
+        signature = self.cache.signature_string(
+            utils.file_signature(file_object.path)
+        )
+        entry = self.entries.get(key, None)
+        if entry is not None and entry[0] == signature:
+            return DesignUnits(*entry[2])
+        with open(file_object.path, 'rb') as f:
+            data = f.read()
+        md5 = hashlib.md5(data).hexdigest()
+        if entry is not None and entry[1] == md5:
+            fields = entry[2]
+        else:
+            log.debug('Scanning dependencies of ' + file_object.path)
+            units = scan_data(data, file_object)
+            fields = (
+                frozenset(units.provides),
+                frozenset(units.requires),
+                frozenset(units.references),
+                frozenset(units.includes),
+            )
+        self.entries[key] = (signature, md5, fields)
+        self.modified[key] = self.entries[key]
+        return DesignUnits(*fields)
+
+    def delete(self):
+        """
+        Remove the entries of this DependencyIndex from the cache.
+        """
+        self.entries = {}
+        self.modified = {}
+        self.cache.remove_design_units()
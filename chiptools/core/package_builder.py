@@ -1,28 +1,212 @@
+"""
+The package_builder module writes the outputs of a synthesis run to a tar
+archive. Files are streamed into the archive as they are added, optionally
+through gzip, bzip2, xz or zstd compression, so that the archive can be
+written while the synthesis flow runs. Files are added with their archive
+names instead of changing the working directory, so several archives can be
+written at the same time.
+
+Each archive ends with a manifest, *chiptools_manifest.txt*, listing the
+SHA-256 sum of every file in the archive in the format used by *sha256sum*.
+The zstd compression requires the optional *zstandard* package.
+"""
+import contextlib
+import fnmatch
+import hashlib
+import io
 import os
-import glob
 import tarfile
+import time
 import logging
 
+from chiptools.common import utils
+
+try:
+    # If zstandard is available zstd compression can be used
+    import zstandard
+except ImportError:
+    zstandard = None
+
 log = logging.getLogger(__name__)
 
+# Dictionary of compression name : archive file extension
+EXTENSIONS = {
+    None: '',
+    'gz': '.gz',
+    'bz2': '.bz2',
+    'xz': '.xz',
+    'zst': '.zst',
+}
+# Alternative names accepted for each compression
+COMPRESSION_NAMES = {
+    '': None,
+    'none': None,
+    'gzip': 'gz',
+    'bzip2': 'bz2',
+    'lzma': 'xz',
+    'zstd': 'zst',
+}
+MANIFEST_NAME = 'chiptools_manifest.txt'
+
+
+def get_compression(name):
+    """
+    Return the compression given by *name*, which is one of the keys of
+    *EXTENSIONS* or an alternative name such as 'gzip' or 'zstd'. None or
+    'none' returns None for an uncompressed archive.
+    """
+    if name is None:
+        return None
+    name = name.strip().lower()
+    name = COMPRESSION_NAMES.get(name, name)
+    if name not in EXTENSIONS:
+        raise ValueError('Unknown archive compression: ' + name)
+    if name == 'zst' and zstandard is None:
+        raise EnvironmentError(
+            'The zstandard package is required for zstd compressed archives.'
+        )
+    return name
+
+
+@contextlib.contextmanager
+def open_archive(path):
+    """
+    Open the archive at *path* for reading and return it as a context
+    manager. Compressed archives are detected by tarfile, except for zstd
+    archives which are identified by their *.zst* extension and can only be
+    read in order.
+    """
+    if path.endswith(EXTENSIONS['zst']):
+        get_compression('zst')
+        with open(path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f)
+            with tarfile.open(fileobj=reader, mode='r|') as archive:
+                yield archive
+    else:
+        with tarfile.open(path, 'r') as archive:
+            yield archive
+
+
+class HashingReader(object):
+    """
+    A HashingReader reads from the file object *fileobj* and updates a
+    SHA-256 *digest* with the data that is read, so that a file can be
+    hashed while it is written to an archive.
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.digest.update(data)
+        return data
+
 
 class PackageBuilder:
-    def __init__(self, path):
-        self.archive = tarfile.TarFile(name=path, mode='a')
+    """
+    A PackageBuilder writes files to the archive at *path* using the given
+    *compression*, see *get_compression*. Only files matching one of the
+    *include* patterns, if any are given, and none of the *exclude* patterns
+    are added. Patterns are matched against the file name and the archive
+    name of each file. Files can be added as they are written and the
+    remaining files added by *addAll* at the end; a file that has already
+    been added is only added again if it has been modified since, in which
+    case the later copy replaces the earlier one when the archive is
+    extracted and in the manifest.
+    """
+    def __init__(self, path, compression=None, include=None, exclude=None):
+        self.path = path
+        self.compression = get_compression(compression)
+        self.include = include or []
+        self.exclude = exclude or []
+        # Dictionary of arcname : sha256 for the files in the archive
+        self.manifest = {}
+        # Dictionary of arcname : file signature when the file was added
+        self.added = {}
+        self.stream = None
+        if self.compression is None:
+            self.archive = tarfile.TarFile(name=path, mode='a')
+        elif self.compression == 'zst':
+            self.stream = zstandard.ZstdCompressor().stream_writer(
+                open(path, 'wb')
+            )
+            self.archive = tarfile.open(fileobj=self.stream, mode='w|')
+        else:
+            self.archive = tarfile.open(path, mode='w|' + self.compression)
+
+    def is_included(self, arcname):
+        """
+        Return True if the file with the given *arcname* matches the include
+        and exclude patterns of this PackageBuilder.
+        """
+        name = os.path.basename(arcname)
+
+        def matches(patterns):
+            return any(
+                fnmatch.fnmatch(name, p) or fnmatch.fnmatch(arcname, p)
+                for p in patterns
+            )
+
+        if len(self.include) > 0 and not matches(self.include):
+            return False
+        return not matches(self.exclude)
+
+    def add(self, path, arcname=None):
+        """
+        Add the file or directory at *path* to the archive with the name
+        *arcname*, which defaults to the base name of *path*. Directories are
+        added recursively. Files that have not changed since they were added
+        or that do not match the include and exclude patterns are skipped.
+        """
+        if arcname is None:
+            arcname = os.path.basename(path)
+        arcname = arcname.replace(os.sep, '/')
+        if os.path.isdir(path) and not os.path.islink(path):
+            for name in sorted(os.listdir(path)):
+                self.add(os.path.join(path, name), arcname + '/' + name)
+            return
+        if not self.is_included(arcname):
+            return
+        signature = utils.file_signature(path)
+        if self.added.get(arcname, None) == signature:
+            return
+        if arcname in self.added:
+            log.debug('Modified since it was added: ' + arcname)
+        tarinfo = self.archive.gettarinfo(path, arcname)
+        if tarinfo.isreg():
+            with open(path, 'rb') as f:
+                reader = HashingReader(f)
+                self.archive.addfile(tarinfo, reader)
+            self.manifest[arcname] = reader.digest.hexdigest()
+        else:
+            self.archive.addfile(tarinfo)
+            self.manifest.pop(arcname, None)
+        self.added[arcname] = signature
+        log.debug('Added: ' + arcname)
 
     def addAll(self, path, pattern='*'):
         """Add all items from path that match pattern"""
-        currentDir = os.getcwd()
         if os.path.exists(path):
-            # Set CWD to the path
-            os.chdir(path)
-            for item in glob.glob(pattern):
-                self.archive.add(item)
+            for item in sorted(os.listdir(path)):
+                # Hidden items are skipped, as they would be by glob
+                if item.startswith('.') or not fnmatch.fnmatch(item, pattern):
+                    continue
+                self.add(os.path.join(path, item), item)
                 log.info('Added: ' + str(item))
-            # Restore the CWD
-            os.chdir(currentDir)
         else:
             log.error('Not a valid path: ' + str(path))
 
     def save(self):
+        """Write the manifest to the archive and close it."""
+        data = ''.join(
+            '{0}  {1}\n'.format(digest, arcname)
+            for arcname, digest in self.manifest.items()
+        ).encode('utf-8')
+        tarinfo = tarfile.TarInfo(MANIFEST_NAME)
+        tarinfo.size = len(data)
+        tarinfo.mtime = time.time()
+        self.archive.addfile(tarinfo, io.BytesIO(data))
         self.archive.close()
+        if self.stream is not None:
+            self.stream.close()
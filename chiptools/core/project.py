@@ -1,9 +1,9 @@
+import datetime
 import logging
 import glob
 import os
 import traceback
 import re
-import unittest
 import sys
 
 from chiptools.common import exceptions
@@ -12,12 +12,11 @@ from chiptools.common.filetypes import File
 from chiptools.common.filetypes import Constraints
 from chiptools.common.filetypes import ProjectAttributes
 from chiptools.common.filetypes import UnitTestFile
-from chiptools.core.preprocessor import Preprocessor
-from chiptools.core import reporter
 from chiptools.core.cache import FileCache
+from chiptools.core import dependencies
+from chiptools.core import artifacts
 from chiptools.parsers import options
 from chiptools.parsers import xml_project
-from chiptools.testing.custom_runners import HTMLTestRunner
 from chiptools.wrappers.wrapper import ToolWrapper
 if sys.version_info < (3, 0, 0):
     import imp
@@ -37,6 +36,7 @@ def load_tests(path, simulation_path):
 
     log.debug('Loading test package: ' + path + '...')
 
+    import unittest
     try:
         test_loader = unittest.TestLoader()
         # Load modules with support for Python 2 or 3
@@ -77,21 +77,30 @@ class Project:
 
         self.config = {}
         self.cache = FileCache('.chiptools')
+        self.dependency_index = dependencies.DependencyIndex(self.cache)
         self.root = root
         self.generics = {}
         self.constraints = []
         self.file_list = []
         self.project_data = {}
+        # Indexes of the files in the project, the set of all files and a
+        # dictionary of library : [files] for files included in synthesis.
+        self.file_set = set()
+        self.synthesis_data = {}
         self.tests = []
+        self.abort_patterns = []
+        self.project_path = None
 
     def load_project(self, path):
         """Initialise this project instance using the project file supplied
         by path."""
         xml_project.XmlProjectParser.load_project(path, self)
+        self.project_path = os.path.abspath(path)
 
     def set_cache_path(self, cache_path):
         # Update the FileCache to point at the new path
         self.cache = FileCache(cache_path)
+        self.dependency_index = dependencies.DependencyIndex(self.cache)
         self.root = os.path.dirname(cache_path)
 
     def add_file(self, path, library='work', **attribs):
@@ -104,11 +113,15 @@ class Project:
         file_object = File(**attribs)
         if library not in self.project_data:
             self.project_data[library] = []
-        if file_object not in self.project_data[library]:
+            self.synthesis_data[library] = []
+        if file_object not in self.file_set:
             # Both a dictionary and list of files are maintained so that
             # compilation order can be preserved
             self.project_data[library].append(file_object)
             self.file_list.append(file_object)
+            self.file_set.add(file_object)
+            if file_object.synthesise:
+                self.synthesis_data[library].append(file_object)
 
     def add_files(self, root, library='work', pattern='*.*', **attribs):
         """Add all files in the given directory to the project. The optional
@@ -186,12 +199,134 @@ class Project:
         """Add a generic key, value mapping for the project."""
         self.generics[name] = value
 
+    def add_abort_pattern(self, pattern, severity='error'):
+        """
+        Add a regular expression *pattern* that is searched for in the output
+        of every simulation. A simulation is stopped on the first line that
+        matches a pattern with a *severity* of 'error' or 'failure', lines
+        matching a 'warning' pattern are recorded but do not stop it.
+        """
+        severity = severity.lower()
+        if severity not in utils.OutputMonitor.severities:
+            raise ValueError(
+                'Unknown abort pattern severity: {0}'.format(severity)
+            )
+        self.abort_patterns.append((pattern, severity))
+
+    def get_abort_patterns(self):
+        """
+        Return a list of (*pattern*, *severity*) tuples for the abort patterns
+        that have been added to the project.
+        """
+        return self.abort_patterns
+
+    def get_simulation_timeout(self):
+        """
+        Return the wall clock time in seconds that a simulation may run for
+        before it is stopped, as set by the *simulation_timeout*
+        configuration item. Returns None if the item is not set or is 0.
+        """
+        timeout = self.config.get(
+            ProjectAttributes.ATTRIBUTE_SIM_TIMEOUT,
+            None
+        )
+        if not timeout:
+            return None
+        return timeout
+
+    def get_synthesis_job_memory(self):
+        """
+        Return the memory in MB that each job of a synthesis sweep is
+        expected to use, as set by the *synthesis_job_memory* configuration
+        item. Returns None if the item is not set or is 0.
+        """
+        memory = self.config.get(
+            ProjectAttributes.ATTRIBUTE_SYNTH_JOB_MEMORY,
+            None
+        )
+        if not memory:
+            return None
+        return memory
+
     def get_fpga_part(self):
         """
         Return the FPGA part to be used for synthesis.
         """
         return self.config.get(ProjectAttributes.ATTRIBUTE_SYNTH_PART, None)
 
+    def get_jobs(self):
+        """
+        Return the number of jobs that may be run in parallel, as set by the
+        *jobs* configuration item. Defaults to 1 if the item is not set.
+        """
+        jobs = self.config.get(ProjectAttributes.ATTRIBUTE_JOBS, None)
+        return 1 if jobs is None else max(1, jobs)
+
+    def get_simulator_session(self):
+        """
+        Return True if the simulator should compile the project using a
+        persistent session, as set by the *simulator_session* configuration
+        item. Defaults to False if the item is not set.
+        """
+        return bool(
+            self.config.get(ProjectAttributes.ATTRIBUTE_SIM_SESSION, False)
+        )
+
+    def get_synthesis_incremental(self):
+        """
+        Return True if synthesis tools that support it should reuse the
+        checkpoints of previous runs, as set by the *synthesis_incremental*
+        configuration item. Defaults to False if the item is not set.
+        """
+        return bool(
+            self.config.get(
+                ProjectAttributes.ATTRIBUTE_SYNTH_INCREMENTAL,
+                False
+            )
+        )
+
+    def get_synthesis_archive_compression(self):
+        """
+        Return the name of the compression to use for synthesis archives, as
+        set by the *synthesis_archive_compression* configuration item, or
+        None if synthesis archives are not compressed.
+        """
+        return self.config.get(
+            ProjectAttributes.ATTRIBUTE_SYNTH_COMPRESSION,
+            None
+        )
+
+    def get_synthesis_archive_patterns(self):
+        """
+        Return a tuple of (*include*, *exclude*) lists of the file name
+        patterns set by the comma or space separated
+        *synthesis_archive_include* and *synthesis_archive_exclude*
+        configuration items. Only files matching an include pattern, if any
+        are given, and no exclude pattern are stored in synthesis archives.
+        """
+        patterns = []
+        for name in [
+            ProjectAttributes.ATTRIBUTE_SYNTH_INCLUDE,
+            ProjectAttributes.ATTRIBUTE_SYNTH_EXCLUDE,
+        ]:
+            value = self.config.get(name, None) or ''
+            patterns.append([p for p in re.split(r'[,\s]+', value) if p])
+        return tuple(patterns)
+
+    def get_artifact_store(self):
+        """
+        Return an ArtifactStore for the compiled library artifact cache set
+        in the system configuration file, or None if no artifact cache is
+        configured.
+        """
+        path, max_size = self.options.get_artifact_cache()
+        if path is None:
+            return None
+        return artifacts.ArtifactStore(
+            utils.relative_path_to_abs(path, self.root),
+            artifacts.parse_size(max_size)
+        )
+
     def get_simulation_tool_name(self):
         """
         Return the name of the simulation tool to use for simulation.
@@ -231,6 +366,7 @@ class Project:
         Return function pointer to a reporter function that is executed after a
         synthesis run.
         """
+        from chiptools.core import reporter
         return reporter.get_reporter(
             self.config.get(ProjectAttributes.ATTRIBUTE_REPORTER, None)
         )
@@ -295,23 +431,35 @@ class Project:
         """
         return self.file_list
 
+    def get_dependency_graph(self, files=None, includes=None):
+        """
+        Return a dictionary of *index* : *set(indices)* where each index into
+        the *files* list is mapped to the indices of the files that it depends
+        on. If *files* is not supplied all files in the *Project* are used.
+        If an *includes* dictionary is given it is updated with *index* :
+        *set(paths)* of the files included by each file. Files are only
+        scanned for dependencies if they have changed since they were last
+        scanned.
+        """
+        if files is None:
+            files = self.get_files()
+        graph = dependencies.build_graph(
+            files,
+            scan=self.dependency_index.scan,
+            includes=includes
+        )
+        self.dependency_index.save()
+        return graph
+
     def get_synthesis_fileset(self):
         """
         Return a dictionary of {lib : [file_a, file_b]} where *lib* is a string
         indicating the name of the library and *[file_a, file_b]* is a list of
         *File* objects that has been filtered to contain only files that have
-        their *.synthesise* attribute set.
-        """
-        result = {}
-        if self.project_data is not None:
-            for libName, library in self.project_data.items():
-                if libName not in result:
-                    result[libName] = []
-                # Only include files that are registered for synthesis
-                result[libName] += (list(
-                    filter(lambda x: x.synthesise, library))
-                )
-        return result
+        their *.synthesise* attribute set. The dictionary is maintained as
+        files are added to the project and must not be modified.
+        """
+        return self.synthesis_data
 
     def get_available_simulators(self):
         """
@@ -354,6 +502,7 @@ class Project:
         files = self.file_list
         if files is None:
             return
+        from chiptools.core.preprocessor import Preprocessor
         for file_object in files:
             # Preprocess the file if it has a preprocessor
             if file_object.preprocessor:
@@ -368,18 +517,22 @@ class Project:
                         )
                     )
 
-    def compile(self, tool_name=None):
+    def compile(self, tool_name=None, jobs=None):
         """
         Compile the libraries and files loaded into the *Project*.
         The Simulation tool that is used is determined by the
         *tool_name* input if supplied, otherwise the *Project* configuration
         : 'simulator' tool name will be used instead.
+        The optional *jobs* input sets the maximum number of files that can be
+        compiled in parallel, otherwise the *Project* configuration : 'jobs'
+        will be used instead.
         """
         simulation_tool = self._get_tool(tool_name, tool_type='simulation')
         simulation_tool.compile_project(
             includes=self.options.get_simulator_library_dependencies(
                 simulation_tool.name
-            )
+            ),
+            jobs=jobs
         )
 
     def _get_tool(self, tool_name=None, tool_type='simulation'):
@@ -424,20 +577,142 @@ class Project:
         log.info('Simulating entity ' + entity + ' in library ' + library)
         simulation_tool.simulate(library, entity, **kwargs)
 
-    def synthesise(self, library, entity, tool_name=None, fpga_part=None):
+    def synthesise(
+        self,
+        library,
+        entity,
+        tool_name=None,
+        fpga_part=None,
+        force=False,
+        from_stage=None,
+        to_stage=None
+    ):
         """
         Synthesise the *Project* using the given *library* and *entity* as a
         top level. The synthesis tool that is used is determined by the
         *tool_name* input if supplied, otherwise the *Project* configuration
         : 'synthesiser' tool name will be used instead.
+
+        If a successful archive built from the same inputs already exists in
+        the synthesis directory it is reported and the build is skipped,
+        unless *force* is True. The inputs are identified by a fingerprint
+        of the synthesis fileset, constraints, generics, part, tool version
+        and tool arguments, see *Synthesiser.get_fingerprint*. Returns the
+        path to the archive.
+
+        For synthesis tools with flow stages the optional *from_stage* runs
+        the flow from the given stage and the optional *to_stage* stops the
+        flow after the given stage. An existing archive is not reused when a
+        stage is given, and the archive of a flow that stops early is not
+        reused by later builds.
         """
         # Run the preprocessors prior to build.
         self.run_preprocessors()
         synthesis_tool = self._get_tool(tool_name, tool_type='synthesis')
+        stage_args = {}
+        for name, stage in [
+            ('from_stage', from_stage),
+            ('to_stage', to_stage),
+        ]:
+            if stage is None:
+                continue
+            if stage not in synthesis_tool.stages:
+                raise ValueError(
+                    'Unknown {0} flow stage: {1}, the available stages '
+                    'are: {2}'.format(
+                        synthesis_tool.name,
+                        stage,
+                        ', '.join(synthesis_tool.stages) or 'none'
+                    )
+                )
+            stage_args[name] = stage
+        fingerprint = synthesis_tool.get_fingerprint(
+            library,
+            entity,
+            fpga_part
+        )
+        if len(stage_args) > 0:
+            force = True
+            if to_stage is not None and to_stage != synthesis_tool.stages[-1]:
+                fingerprint = None
+        if not force:
+            archive_path = synthesis_tool.find_archive(fingerprint)
+            if archive_path is not None:
+                log.info(
+                    'Synthesis inputs of entity ' + entity + ' in library ' +
+                    library + ' are unchanged, using existing archive: ' +
+                    archive_path
+                )
+                synthesis_tool.archive_path = archive_path
+                return archive_path
         log.info(
             'Synthesising entity ' + entity + ' in library ' + library
         )
-        synthesis_tool.synthesise(library, entity, fpga_part)
+        synthesis_tool.fingerprint = fingerprint
+        synthesis_tool.synthesise(library, entity, fpga_part, **stage_args)
+        return synthesis_tool.archive_path
+
+    def synthesise_sweep(
+        self,
+        library,
+        entity,
+        tool_name=None,
+        parts=None,
+        generic_sets=None,
+        argument_sets=None,
+        jobs=None
+    ):
+        """
+        Synthesise the *Project* using the given *library* and *entity* as a
+        top level for each combination of the FPGA *parts*, the
+        *generic_sets* dictionaries of *generic* : *value* and the
+        *argument_sets* dictionaries of tool argument *configuration item* :
+        *value*. Up to *jobs* synthesis runs are made in parallel in worker
+        processes, each in its own directory of a sweep directory created in
+        the synthesis directory. If *jobs* is None the number of CPUs is
+        used, limited by the available memory if the
+        *synthesis_job_memory* configuration item is set.
+
+        A summary table of the timing slack and resource utilisation of each
+        run is logged and written to *summary.txt* in the sweep directory.
+        Returns the list of job results, see *sweep.run_job*. Sweeps require
+        the Project to be loaded from a project file so that the workers can
+        load it.
+        """
+        from chiptools.core import sweep
+        if self.project_path is None:
+            raise EnvironmentError(
+                'Operation aborted, synthesis sweeps can only be run when ' +
+                'the project is loaded from a project file.'
+            )
+        # Check that the tool is available before starting the workers
+        synthesis_tool = self._get_tool(tool_name, tool_type='synthesis')
+        sweep_directory = os.path.join(
+            self.get_synthesis_directory(),
+            entity + '_sweep_' + datetime.datetime.now().strftime(
+                '%d%m%y_%H%M%S'
+            )
+        )
+        os.makedirs(sweep_directory)
+        log.info(
+            'Synthesis sweep of entity ' + entity + ' in library ' +
+            library + ' using ' + synthesis_tool.name + ', saving output ' +
+            'to: ' + sweep_directory
+        )
+        results = sweep.SynthesisSweep(
+            self.project_path,
+            library,
+            entity,
+            sweep_directory,
+            tool_name=synthesis_tool.name,
+            jobs=jobs,
+            job_memory=self.get_synthesis_job_memory(),
+        ).run(sweep.get_sweep_jobs(parts, generic_sets, argument_sets))
+        summary = sweep.format_summary(results)
+        with open(os.path.join(sweep_directory, 'summary.txt'), 'w') as f:
+            f.write(summary + '\n')
+        log.info('Synthesis sweep complete:\n' + summary)
+        return results
 
     def get_tests(self):
         """
@@ -448,7 +723,20 @@ class Project:
         )
         return files_with_tests
 
-    def run_tests(self, ids=None, tool_name=None):
+    def get_test_cases(self):
+        """
+        Return a list of (*file name*, *test case*) tuples for the test cases
+        in the Project, the position of a test case in the list is its ID.
+        """
+        tests = []
+        for file_object in self.get_tests():
+            file_name = os.path.basename(file_object.path)
+            for test_group in file_object.testsuite:
+                for test in utils.iterate_tests(test_group):
+                    tests.append((file_name, test))
+        return tests
+
+    def run_tests(self, ids=None, tool_name=None, jobs=None):
         """
         Run the Project unit tests. The *ids* input is an iterable containing
         integer IDs referencing test cases from the test suite. If *ids* is
@@ -458,47 +746,78 @@ class Project:
         The Simulation tool that is used is determined by the
         *tool_name* input if supplied, otherwise the *Project* configuration
         : 'simulator' tool name will be used instead.
+
+        If the optional *jobs* input is greater than 1 the tests are run in
+        that many worker processes, each of which simulates in its own
+        sandbox directory, and the results are merged into a single report.
+        Parallel test runs require the Project to be loaded from a project
+        file so that the workers can load it.
+
+        Return True if all of the tests that were run passed.
         """
+        import unittest
+        from chiptools.testing.custom_runners import HTMLTestRunner
+        from chiptools.testing import parallel
         simulation_tool = self._get_tool(tool_name, tool_type='simulation')
         # First compile the project
         simulation_tool.compile_project(
             includes=self.options.get_simulator_library_dependencies(
                 simulation_tool.name
-            )
+            ),
+            jobs=jobs
         )
 
         suite = unittest.TestSuite()
-        tests = []
-
-        for file_object in self.get_tests():
-            file_name = os.path.basename(file_object.path)
-            for test_group in file_object.testsuite:
-                for testId, test in enumerate(utils.iterate_tests(test_group)):
-                    # Patch in the simulation runtime data
-                    test.load_environment(self, tool_name=tool_name)
-                    # Add the test to the library
-                    tests.append((file_name, test))
+        tests = self.get_test_cases()
 
         if len(tests) == 0:
             log.warning('No tests available.')
-            return
+            return True
+
+        for fileName, test in tests:
+            # Patch in the simulation runtime data
+            test.load_environment(self, tool_name=tool_name)
 
         # Run all tests by default if no IDs are specified
         if ids is None:
             ids = list(range(len(tests)))
         elif len(ids) == 0:
             ids = list(range(len(tests)))
+        ids = [id for id in ids if id < len(tests)]
+        # Run the tests of each class together, and the tests of a class that
+        # share a generic set one after another, so that the class fixtures
+        # run once and the design is compiled or elaborated once for each set.
+        ids = parallel.order_by_generics(ids, tests)
 
         for id in ids:
-            if id < len(tests):
-                fileName, test = tests[id]
-                log.info(
-                    str(test.id())
-                )
-                suite.addTest(test)
-                log.info('Added ' + str(test) + ' to testsuite')
+            fileName, test = tests[id]
+            log.info(
+                str(test.id())
+            )
+            suite.addTest(test)
+            log.info('Added ' + str(test) + ' to testsuite')
+
+        if jobs is not None and jobs > 1 and self.project_path is None:
+            log.warning(
+                'Tests can only be run in parallel when the project is ' +
+                'loaded from a project file, running tests serially.'
+            )
+            jobs = None
 
         log.info('Running testsuite...')
+        if jobs is not None and jobs > 1:
+            start_time = datetime.datetime.now()
+            results = parallel.ParallelTestRunner(
+                self.project_path,
+                jobs,
+                tool_name=tool_name,
+                durations=self.cache.get_test_durations(simulation_tool.name)
+            ).run(tests, ids)
+            passed = self.report_test_results(
+                tests, ids, results, start_time, simulation_tool.name
+            )
+            log.info('...done')
+            return passed
         # TODO: Allow HTML or Console selection
         if True:
             with open(
@@ -506,10 +825,104 @@ class Project:
                     self.get_simulation_directory(), 'report.html'
                 ), 'w'
             ) as report:
-                HTMLTestRunner.HTMLTestRunner(
+                result = HTMLTestRunner.HTMLTestRunner(
                     verbosity=2,
                     stream=report
                 ).run(suite)
         else:
-            unittest.TextTestRunner(verbosity=2).run(suite)
+            result = unittest.TextTestRunner(verbosity=2).run(suite)
         log.info('...done')
+        return result.wasSuccessful()
+
+    def report_test_results(self, tests, ids, results, start_time, tool_name):
+        """
+        Write the HTML report *report.html* and the JUnit report *report.xml*
+        to the simulation directory for the results of tests that were run
+        by worker processes, and record the test durations in the cache. The
+        *results* dictionary maps each of the test *ids* to a tuple of
+        (*code*, *output*, *error*, *duration*). Return True if none of the
+        tests failed.
+        """
+        from chiptools.testing import parallel
+        simulation_directory = self.get_simulation_directory()
+        with open(
+            os.path.join(simulation_directory, 'report.html'), 'w'
+        ) as report:
+            result = parallel.write_html_report(
+                report, tests, ids, results, start_time
+            )
+        with open(
+            os.path.join(simulation_directory, 'report.xml'), 'w'
+        ) as report:
+            parallel.write_junit_report(report, tests, ids, results)
+        self.cache.add_test_durations(
+            dict(
+                (tests[id][1].id(), results[id][3]) for id in ids
+            ),
+            tool_name
+        )
+        log.info(
+            'Tests complete: {0} passed, {1} failed, {2} errors'.format(
+                result.success_count,
+                result.failure_count,
+                result.error_count
+            )
+        )
+        return result.failure_count + result.error_count == 0
+
+    def serve_tests(self, address, ids=None, tool_name=None, authkey=None):
+        """
+        Coordinate a distributed run of the Project unit tests. The tests
+        selected by *ids*, as for *run_tests*, are handed out to workers
+        started with *run_test_worker* that connect to the (*host*, *port*)
+        *address*, starting with the tests that took longest on previous
+        runs. The results are merged into a single report in the simulation
+        directory when all of the tests are complete.
+        The optional *authkey* bytes must match the key used by the workers.
+        Return True if none of the tests failed.
+        """
+        from chiptools.testing import distributed
+        simulation_tool = self._get_tool(tool_name, tool_type='simulation')
+        tests = self.get_test_cases()
+        if len(tests) == 0:
+            log.warning('No tests available.')
+            return True
+        if ids is None or len(ids) == 0:
+            ids = list(range(len(tests)))
+        ids = [id for id in ids if id < len(tests)]
+        start_time = datetime.datetime.now()
+        coordinator = distributed.TestCoordinator(
+            tests,
+            ids,
+            address,
+            authkey=authkey,
+            durations=self.cache.get_test_durations(simulation_tool.name)
+        )
+        coordinator.start()
+        results = coordinator.wait()
+        return self.report_test_results(
+            tests, ids, results, start_time, simulation_tool.name
+        )
+
+    def run_test_worker(self, address, tool_name=None, authkey=None):
+        """
+        Run Project unit tests handed out by the coordinator at the (*host*,
+        *port*) *address* until there are none left. The project is compiled
+        before any tests are run. The worker loads its own copy of the
+        Project from the project file and runs the tests in a sandbox in the
+        simulation directory.
+        """
+        from chiptools.testing import distributed
+        if self.project_path is None:
+            raise EnvironmentError(
+                'A test worker requires a project loaded from a project file.'
+            )
+        count = distributed.run_worker(
+            self.project_path,
+            address,
+            tool_name=tool_name,
+            authkey=authkey
+        )
+        log.info('Test worker finished after running {0} test(s)'.format(
+            count
+        ))
@@ -0,0 +1,114 @@
+"""
+The scheduler module provides a simple dependency aware job scheduler that is
+used to run independent tool invocations, such as file compilations, in
+parallel on a bounded pool of worker threads.
+"""
+import logging
+from concurrent import futures
+
+log = logging.getLogger(__name__)
+
+
+class JobScheduler(object):
+    """
+    A JobScheduler executes a target function on a set of nodes, ensuring that
+    a node is only dispatched once all of the nodes it depends on have
+    completed successfully. At most *jobs* nodes are executed concurrently.
+
+    Nodes can optionally be assigned to an exclusion group, nodes that share a
+    group are never executed concurrently. This is used to prevent tools from
+    writing to the same output library from more than one process at a time.
+
+    Scheduling stops on the first failure: nodes that are already running are
+    allowed to finish but no new nodes are dispatched, and the exception
+    raised by the failing node is raised to the caller.
+    """
+    def __init__(self, jobs=1):
+        self.jobs = max(1, int(jobs))
+
+    def run(
+        self,
+        nodes,
+        dependencies,
+        target,
+        on_complete=None,
+        on_failure=None,
+        group=None,
+    ):
+        """
+        Call *target(node)* for each node in the ordered *nodes* list.
+
+        *dependencies* is a dictionary of *node* : *set(nodes)* that gives the
+        nodes that must complete before the node can be dispatched, any
+        dependency that is not in *nodes* is considered to be complete. The
+        optional *on_complete(node)* and *on_failure(node, exception)*
+        callbacks are always called from the calling thread. The optional
+        *group(node)* function returns the exclusion group of a node or None.
+        """
+        if self.jobs == 1:
+            # Run the nodes in order in the calling thread.
+            for node in nodes:
+                try:
+                    target(node)
+                except Exception as e:
+                    if on_failure is not None:
+                        on_failure(node, e)
+                    raise
+                if on_complete is not None:
+                    on_complete(node)
+            return
+
+        node_set = set(nodes)
+        waiting = dict(
+            (
+                node,
+                set(d for d in dependencies.get(node, ()) if d in node_set)
+            ) for node in nodes
+        )
+        remaining = list(nodes)
+        completed = set()
+        running = {}
+        busy_groups = set()
+        failure = None
+        with futures.ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while True:
+                if failure is None:
+                    for node in list(remaining):
+                        if len(running) >= self.jobs:
+                            break
+                        if waiting[node] - completed:
+                            continue
+                        node_group = None if group is None else group(node)
+                        if node_group is not None:
+                            if node_group in busy_groups:
+                                continue
+                            busy_groups.add(node_group)
+                        remaining.remove(node)
+                        future = executor.submit(target, node)
+                        running[future] = (node, node_group)
+                if len(running) == 0:
+                    break
+                finished, _ = futures.wait(
+                    list(running.keys()),
+                    return_when=futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    node, node_group = running.pop(future)
+                    busy_groups.discard(node_group)
+                    exception = future.exception()
+                    if exception is None:
+                        completed.add(node)
+                        if on_complete is not None:
+                            on_complete(node)
+                    else:
+                        if on_failure is not None:
+                            on_failure(node, exception)
+                        if failure is None:
+                            failure = exception
+                            log.error(
+                                'A job failed, waiting for {0} '.format(
+                                    len(running)
+                                ) + 'running job(s) to finish...'
+                            )
+        if failure is not None:
+            raise failure
@@ -0,0 +1,268 @@
+"""
+The sweep module synthesises the same top level entity for each combination
+of a set of FPGA parts, generic sets and tool argument sets. Each job runs
+in its own worker process, loads its own copy of the project from the
+project file and uses its own synthesis directory, so the archives of
+concurrent jobs do not collide. The number of concurrent jobs is limited by
+the number of CPUs and, if a memory budget for each job is given, by the
+physical memory that is available.
+
+When a job completes the timing slack and resource utilisation are read from
+the reports in its archive and the results of all jobs are summarised in a
+table.
+"""
+import concurrent.futures
+import fnmatch
+import itertools
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import traceback
+
+from chiptools.common import utils
+from chiptools.common.filetypes import ProjectAttributes
+from chiptools.core import package_builder
+
+log = logging.getLogger(__name__)
+
+
+def get_sweep_jobs(parts=None, generic_sets=None, argument_sets=None):
+    """
+    Return a list of synthesis jobs for each combination of the FPGA *parts*,
+    the *generic_sets* dictionaries of *generic* : *value* and the
+    *argument_sets* dictionaries of *configuration item* : *value*, where
+    the configuration items are tool arguments such as
+    *args_quartus_fit*. A job is a dictionary of *name*, *part*, *generics*
+    and *arguments* items. A part of None uses the project part.
+    """
+    jobs = []
+    for index, (part, generics, arguments) in enumerate(itertools.product(
+        parts or [None],
+        generic_sets or [{}],
+        argument_sets or [{}]
+    )):
+        jobs.append({
+            'name': 'job_{0}'.format(index),
+            'part': part,
+            'generics': dict(generics),
+            'arguments': dict(arguments),
+        })
+    return jobs
+
+
+def get_job_limit(jobs, job_count, job_memory=None):
+    """
+    Return the number of synthesis jobs that may run at the same time. This
+    is *jobs*, or the number of CPUs if *jobs* is None, limited to the
+    *job_count* and, if the *job_memory* in MB used by each job is given, to
+    the number of jobs that fit in the available physical memory.
+    """
+    limit = jobs or multiprocessing.cpu_count()
+    if job_memory:
+        available = utils.get_available_memory()
+        if available is not None:
+            limit = min(limit, available // (job_memory * 2**20))
+    return max(1, min(limit, job_count))
+
+
+def read_archive_summary(synthesis_tool, archive_path):
+    """
+    Return the report summary of the *synthesis_tool* for the report files
+    stored in the archive at *archive_path*. Only the reports matching the
+    tool *report_patterns* are extracted.
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        with package_builder.open_archive(archive_path) as archive:
+            for index, member in enumerate(archive):
+                name = os.path.basename(member.name)
+                if not member.isfile() or not any(
+                    fnmatch.fnmatch(name, pattern)
+                    for pattern in synthesis_tool.report_patterns
+                ):
+                    continue
+                # Reports are extracted by name only so that the archive
+                # cannot write outside of the temporary directory.
+                path = os.path.join(directory, str(index))
+                os.makedirs(path)
+                with open(os.path.join(path, name), 'wb') as f:
+                    shutil.copyfileobj(archive.extractfile(member), f)
+        return synthesis_tool.get_report_summary(directory)
+    finally:
+        shutil.rmtree(directory)
+
+
+def run_job(project_path, library, entity, tool_name, job, directory):
+    """
+    Load the project file given by *project_path* and synthesise the
+    *entity* in *library* for the given *job* in the synthesis *directory*.
+    Return a dictionary of the job items updated with the job *status*
+    ('passed' or 'failed'), *duration* in seconds, *archive* path, timing
+    *slack*, *utilisation* and any *error*.
+    """
+    # Imported here so that only the worker processes import the project
+    from chiptools.core.project import Project
+    start_time = time.time()
+    result = dict(
+        job,
+        status='failed',
+        archive=None,
+        slack=None,
+        utilisation={},
+        error='',
+    )
+    project = Project()
+    try:
+        project.load_project(project_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        project.add_config(
+            ProjectAttributes.ATTRIBUTE_SYNTH_DIR,
+            directory,
+            force=True
+        )
+        for name, value in job['generics'].items():
+            project.add_generic(name, value)
+        for name, value in job['arguments'].items():
+            project.add_config(name, value, force=True)
+        synthesis_tool = project._get_tool(tool_name, tool_type='synthesis')
+        try:
+            project.synthesise(
+                library,
+                entity,
+                tool_name=tool_name,
+                fpga_part=job['part']
+            )
+            result['status'] = 'passed'
+        finally:
+            result['archive'] = synthesis_tool.archive_path
+        result.update(
+            read_archive_summary(synthesis_tool, result['archive'])
+        )
+    except:
+        result['error'] = traceback.format_exc()
+    finally:
+        project.cache.close()
+    result['duration'] = time.time() - start_time
+    return result
+
+
+def format_summary(results):
+    """
+    Return a table of the synthesis *results* returned by *run_job*, one row
+    per job.
+    """
+    headings = [
+        'Job', 'Part', 'Generics', 'Arguments', 'Status', 'Time',
+        'Slack (ns)', 'Utilisation (%)'
+    ]
+    rows = [headings]
+    for result in results:
+        rows.append([
+            result['name'],
+            str(result['part'] or '-'),
+            ' '.join(
+                '{0}={1}'.format(k, v) for k, v in result['generics'].items()
+            ) or '-',
+            ' '.join(
+                '{0}={1}'.format(k, v) for k, v in result['arguments'].items()
+            ) or '-',
+            result['status'],
+            '{0:.1f}s'.format(result['duration']),
+            '-' if result['slack'] is None else '{0:.3f}'.format(
+                result['slack']
+            ),
+            ', '.join(
+                '{0} {1:g}'.format(k, v)
+                for k, v in result['utilisation'].items()
+            ) or '-',
+        ])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(headings))]
+    lines = []
+    for index, row in enumerate(rows):
+        lines.append('  '.join(
+            value.ljust(width) for value, width in zip(row, widths)
+        ).rstrip())
+        if index == 0:
+            lines.append('  '.join('-' * width for width in widths))
+    return '\n'.join(lines)
+
+
+class SynthesisSweep(object):
+    """
+    The SynthesisSweep synthesises the *entity* in *library* from the
+    project file given by *project_path* for each of a list of jobs using
+    the synthesis tool given by *tool_name*. Each job uses its own directory
+    in the sweep *directory*. Up to *jobs* synthesis jobs run at the same
+    time, see *get_job_limit*.
+    """
+    def __init__(
+        self,
+        project_path,
+        library,
+        entity,
+        directory,
+        tool_name=None,
+        jobs=None,
+        job_memory=None
+    ):
+        self.project_path = project_path
+        self.library = library
+        self.entity = entity
+        self.directory = directory
+        self.tool_name = tool_name
+        self.jobs = jobs
+        self.job_memory = job_memory
+
+    def run(self, sweep_jobs):
+        """
+        Run the given list of *sweep_jobs* returned by *get_sweep_jobs* and
+        return a list of the results returned by *run_job* in the same
+        order.
+        """
+        jobs = get_job_limit(self.jobs, len(sweep_jobs), self.job_memory)
+        log.info(
+            'Running {0} synthesis job(s), {1} at a time...'.format(
+                len(sweep_jobs),
+                jobs
+            )
+        )
+        # Workers are started using spawn on all platforms so that they do not
+        # inherit the state of the parent process, such as open cache
+        # databases.
+        context = multiprocessing.get_context('spawn')
+        results = [None] * len(sweep_jobs)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=context,
+        ) as executor:
+            futures = dict(
+                (
+                    executor.submit(
+                        run_job,
+                        self.project_path,
+                        self.library,
+                        self.entity,
+                        self.tool_name,
+                        job,
+                        os.path.join(self.directory, job['name'])
+                    ),
+                    index
+                ) for index, job in enumerate(sweep_jobs)
+            )
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                log.info(
+                    '{0} {1} in {2:.1f}s'.format(
+                        result['name'],
+                        result['status'],
+                        result['duration']
+                    )
+                )
+                if result['error']:
+                    log.error(result['error'])
+        return results
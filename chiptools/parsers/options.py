@@ -226,3 +226,46 @@ class Options:
                 'Could not find .chiptoolsconfig section: ' + str(section_name)
             )
         return paths
+
+    def get_artifact_cache(self):
+        """
+        Return a tuple of (path, max_size) for the compiled library artifact
+        cache. The path is None if no artifact cache is configured and the
+        max_size is None if the cache size is not limited.
+
+        If the configuration file was modified since the last access it will be
+        reloaded and the new entries returned.
+        """
+        self.refresh()
+        section_name = 'artifact cache'
+        if not self._options.has_section(section_name):
+            return None, None
+        settings = Options.readOptionsPaths(
+            self._options,
+            section_name,
+            transform=lambda x: os.path.expandvars(x)
+        )
+        return settings.get('path', None), settings.get('max_size', None)
+
+    def get_toolchain_cache(self):
+        """
+        Return the path to the file that toolchain locations found on the
+        PATH are cached in between runs, or None if the toolchain cache is
+        not configured.
+
+        If the configuration file was modified since the last access it will be
+        reloaded and the new entries returned.
+        """
+        self.refresh()
+        section_name = 'toolchain cache'
+        if not self._options.has_section(section_name):
+            return None
+        settings = Options.readOptionsPaths(
+            self._options,
+            section_name,
+            transform=lambda x: os.path.expandvars(x)
+        )
+        path = settings.get('path', None)
+        if path is None:
+            return None
+        return os.path.expanduser(path)
@@ -1,10 +1,13 @@
+import hashlib
 import logging
 import traceback
+import re
 import xml
 import os
 import time
 
 from xml.dom import minidom
+from xml.etree import ElementTree
 
 from chiptools.common import utils
 from chiptools.common.filetypes import ProjectAttributes
@@ -112,6 +115,24 @@ class XmlProjectParser:
     | path      |*string*| (required) Path to the unit test file.             |
     +-----------+--------+----------------------------------------------------+
 
+    **<abort>**
+
+    The *abort* tag defines a regular expression that is searched for in each
+    line of simulator output while a simulation is running. A simulation is
+    stopped on the first line that matches an *error* or *failure* pattern so
+    that a failing testbench does not need to run to completion, and the test
+    fails with the matching line and the simulation time. Lines matching a
+    *warning* pattern are recorded but do not stop the simulation.
+
+    +-----------+--------+----------------------------------------------------+
+    | Attribute | Value  | Description                                        |
+    +===========+========+====================================================+
+    | pattern   |*string*| (required) Regular expression to search for.       |
+    +-----------+--------+----------------------------------------------------+
+    | severity  |*string*| (optional) One of warning, error or failure,       |
+    |           |        | defaults to error.                                 |
+    +-----------+--------+----------------------------------------------------+
+
     **<generic>**
 
     The *generic* tag defines a generic value setting for the top level entity
@@ -152,6 +173,29 @@ class XmlProjectParser:
     +----------------------+--------------------------------------------------+
     | part                 | FPGA part to target when performing synthesis.   |
     +----------------------+--------------------------------------------------+
+    | jobs                 | Number of parallel jobs to use when compiling.   |
+    +----------------------+--------------------------------------------------+
+    | simulator_session    | Compile using a persistent simulator session     |
+    |                      | where supported (true/false).                    |
+    +----------------------+--------------------------------------------------+
+    | simulation_timeout   | Stop a simulation that runs for longer than this |
+    |                      | number of seconds (wall clock time).             |
+    +----------------------+--------------------------------------------------+
+    | synthesis_job_memory | Memory in MB used by each synthesis sweep job,   |
+    |                      | limits the number of jobs that run in parallel.  |
+    +----------------------+--------------------------------------------------+
+    | synthesis_incremental| Reuse the checkpoints of the last good build     |
+    |                      | where supported (true/false).                    |
+    +----------------------+--------------------------------------------------+
+    | synthesis_archive_   | Compression of synthesis archives: none, gz,     |
+    | compression          | bz2, xz or zst (zst requires *zstandard*).       |
+    +----------------------+--------------------------------------------------+
+    | synthesis_archive_   | Comma separated file name patterns, only files   |
+    | include              | matching a pattern are archived.                 |
+    +----------------------+--------------------------------------------------+
+    | synthesis_archive_   | Comma separated file name patterns of files that |
+    | exclude              | are not archived, for example '*.ngd, *.dcp'.    |
+    +----------------------+--------------------------------------------------+
 
     In addition to the above configuration items, the *config* tag also allows
     tool-specific argument passing through the use of config attributes using
@@ -167,6 +211,14 @@ class XmlProjectParser:
               redefinition is attempted.
 
     """
+    # Environment variable references that are expanded in project paths,
+    # either $name, ${name} or %name%.
+    ENVIRONMENT_VARIABLE_RE = re.compile(
+        r'\$(\w+)|\$\{([^}]*)\}|%([^%\s]+)%'
+    )
+    # The XML parser used to read project files, either 'iterparse' or
+    # 'minidom'.
+    backend = 'iterparse'
 
     @staticmethod
     def load_project(path, project_object):
@@ -192,185 +244,351 @@ class XmlProjectParser:
     ):
         """Parse the XML project and update the project_dictionary or return
         a new dictionary if one is not supplied.
+
+        The operations read from each XML file are stored in the project
+        cache along with a fingerprint of the file contents and of the
+        environment variables that it references. A file with an unchanged
+        fingerprint is not parsed again and its operations are replayed from
+        the cache instead, included project files are checked individually so
+        only the files that have changed are parsed.
         """
         log.info('Parsing: ' + str(filepath) + ' synthesis=' + str(synthesise))
         start_time = time.time()
-        project_root = os.path.dirname(os.path.realpath(filepath))
-        try:
-            xml_obj = minidom.parse(filepath)
-            for project_node in xml_obj.getElementsByTagName(
-                ProjectAttributes.XML_NODE_PROJECT
+        path = os.path.realpath(filepath)
+        cache = getattr(project_object, 'cache', None)
+        fingerprint = XmlProjectParser.get_fingerprint(path)
+        operations = None
+        if cache is not None:
+            operations = cache.get_project_operations(
+                path,
+                synthesise,
+                fingerprint
+            )
+        if operations is None:
+            try:
+                operations = XmlProjectParser.read_project(path, synthesise)
+            except (
+                xml.parsers.expat.ExpatError,
+                ElementTree.ParseError
             ):
-                # Project attributes (if any)
-                # If this whole node should not be synthesised, ignore any
-                # child flags otherwise get the child synthesis flag and use
-                # that.
-                if synthesise is None:
-                    project_attribs = ProjectAttributes.process_attributes(
-                        project_node.attributes,
-                        project_root
-                    )
-                    synthesis_enabled = project_attribs.get(
-                        ProjectAttributes.ATTRIBUTE_SYNTHESIS,
-                        None
-                    )
-                else:
-                    synthesis_enabled = synthesise
+                log.error(
+                    'Error found in XML file, check the formatting. ' +
+                    'Refer to the traceback below for the line number and ' +
+                    'file.'
+                )
+                log.error(traceback.format_exc())
+                project_object.initialise()
+                return
+            if cache is not None:
+                cache.add_project_operations(
+                    path,
+                    synthesise,
+                    fingerprint,
+                    operations
+                )
+            log.debug(filepath + ' parsed in ' + utils.time_delta_string(
+                start_time,
+                time.time())
+            )
+        else:
+            log.debug(filepath + ' loaded from cache')
+        XmlProjectParser.apply_operations(operations, project_object)
 
-                for child in project_node.childNodes:
-                    if child.nodeName == ProjectAttributes.XML_NODE_PROJECT:
-                        attribs = ProjectAttributes.process_attributes(
-                            child.attributes,
-                            project_root,
-                            defaults=ProjectAttributes.PROJECT_NODE_DEFAULTS
-                        )
-                        # If this whole node should not be synthesised, ignore
-                        # any child flags otherwise get the child synthesis
-                        # flag and use that.
-                        if synthesis_enabled is None:
-                            synthesise = attribs.get(
-                                ProjectAttributes.ATTRIBUTE_SYNTHESIS,
-                                None
-                            )
-                        else:
-                            synthesise = synthesis_enabled
-
-                        if ProjectAttributes.ATTRIBUTE_PATH in attribs:
-                            log.debug(
-                                'Found sub-project: ' +
-                                str(
-                                    attribs[
-                                        ProjectAttributes.ATTRIBUTE_PATH
-                                    ]
-                                )
-                            )
-                            # Recursively call this parser with the new project
-                            # path
-                            XmlProjectParser.parse_project(
-                                str(
-                                    attribs[
-                                        ProjectAttributes.ATTRIBUTE_PATH
-                                    ]
-                                ),
-                                project_object,
-                                synthesise
-                            )
-                    elif child.nodeName == ProjectAttributes.XML_NODE_CONFIG:
-                        XmlProjectParser._add_config(
-                            child,
-                            project_root,
-                            project_object
-                        )
-                    elif child.nodeName == ProjectAttributes.XML_NODE_LIBRARY:
-                        XmlProjectParser._add_library(
-                            child,
-                            project_root,
-                            project_object,
-                            synthesis_enabled
-                        )
-                    elif child.nodeName == (
-                        ProjectAttributes.XML_NODE_CONSTRAINTS
-                    ):
-                        XmlProjectParser._add_constraints(
-                            child,
-                            project_root,
-                            project_object,
-                        )
-                    elif child.nodeName == (
-                        ProjectAttributes.XML_NODE_UNITTEST
-                    ):
-                        XmlProjectParser._add_unittest(
-                            child,
-                            project_root,
-                            project_object,
-                        )
-                    elif child.nodeName == ProjectAttributes.XML_NODE_GENERIC:
-                        # Build a dictionary of generics using the attribute
-                        # name and value
-                        attribs = child.attributes
-                        if attribs is None:
-                            continue
-                        attribs = dict(attribs.items())
-                        for attrName, attrVal in attribs.items():
-                            project_object.add_generic(
-                                attrName,
-                                attrVal
-                            )
-                    elif child.nodeName == ProjectAttributes.XML_NODE_FILE:
-                        # Files should not be left unassociated with a library
-                        # unless you wish to add all files to the work library.
-                        # The default behavior will be to add parentless files
-                        # to the work library, but a configuration option could
-                        # make this post an error instead.
-                        log.warning(
-                            'Found file with no parent library, ' +
-                            'defaulting to work library'
-                        )
-                        # If this whole node should not be synthesised, ignore
-                        # any child flags otherwise get the child synthesis
-                        # flag and use that.
-                        if synthesis_enabled is None:
-                            synthesise = (
-                                ProjectAttributes.get_processed_attribute(
-                                    child.attributes.get(
-                                        ProjectAttributes.ATTRIBUTE_SYNTHESIS,
-                                        None
-                                    ),
-                                    project_root,
-                                    ProjectAttributes.ATTRIBUTE_SYNTHESIS
-                                )
-                            )
-                        else:
-                            synthesise = synthesis_enabled
-
-                        XmlProjectParser._add_file(
-                            child,
-                            'work',
+    @staticmethod
+    def get_fingerprint(filepath):
+        """
+        Return a fingerprint of the contents of the XML file at *filepath*
+        and of the values of any environment variables that it references,
+        which are expanded in the paths that it contains.
+        """
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        fingerprint = hashlib.md5(data)
+        names = set()
+        for match in XmlProjectParser.ENVIRONMENT_VARIABLE_RE.finditer(
+            data.decode('utf-8', 'replace')
+        ):
+            names.add(match.group(match.lastindex))
+        for name in sorted(names):
+            value = os.environ.get(name, None)
+            fingerprint.update(
+                ('\0' + name + '=' + repr(value)).encode('utf-8')
+            )
+        return fingerprint.hexdigest()
+
+    @staticmethod
+    def read_project(filepath, synthesise=None):
+        """
+        Parse the XML project file at *filepath* and return the list of
+        operations that it applies to a project, included project files are
+        returned as a single operation and are not parsed. Each operation is
+        a list of the operation name followed by its arguments, see
+        *apply_operations*. The file is parsed using the parser named by
+        *XmlProjectParser.backend*.
+        """
+        if XmlProjectParser.backend == 'minidom':
+            return XmlProjectParser.read_project_minidom(filepath, synthesise)
+        return XmlProjectParser.read_project_iterparse(filepath, synthesise)
+
+    @staticmethod
+    def read_project_minidom(filepath, synthesise=None):
+        """
+        Implementation of *read_project* that builds a DOM of the whole
+        project file using xml.dom.minidom before processing it.
+        """
+        operations = []
+        project_root = os.path.dirname(os.path.realpath(filepath))
+        xml_obj = minidom.parse(filepath)
+        for project_node in xml_obj.getElementsByTagName(
+            ProjectAttributes.XML_NODE_PROJECT
+        ):
+            synthesis_enabled = XmlProjectParser._get_synthesis_enabled(
+                dict(project_node.attributes.items()),
+                project_root,
+                synthesise
+            )
+            for child in project_node.childNodes:
+                if child.nodeType != child.ELEMENT_NODE:
+                    continue
+                XmlProjectParser._add_node(
+                    child.nodeName,
+                    dict(child.attributes.items()),
+                    [
+                        dict(node.attributes.items())
+                        for node in child.childNodes
+                        if node.nodeName == ProjectAttributes.XML_NODE_FILE
+                    ],
+                    project_root,
+                    operations,
+                    synthesis_enabled
+                )
+        return operations
+
+    @staticmethod
+    def read_project_iterparse(filepath, synthesise=None):
+        """
+        Implementation of *read_project* that processes each child of a
+        project tag as soon as it has been read using
+        xml.etree.ElementTree.iterparse and then discards it, so the memory
+        used does not grow with the number of files in the project.
+        """
+        operations = []
+        project_root = os.path.dirname(os.path.realpath(filepath))
+        # The elements that are currently open and the synthesis flag of
+        # each open project element.
+        parents = []
+        projects = []
+        for event, element in ElementTree.iterparse(
+            filepath,
+            events=('start', 'end')
+        ):
+            if event == 'start':
+                if element.tag == ProjectAttributes.XML_NODE_PROJECT:
+                    projects.append(
+                        XmlProjectParser._get_synthesis_enabled(
+                            dict(element.attrib),
                             project_root,
-                            project_object,
-                            synthesise=synthesise
+                            synthesise
                         )
-                    elif child.nodeName == ProjectAttributes.XML_NODE_TEXT:
-                        pass
-                    elif child.nodeName == ProjectAttributes.XML_NODE_COMMENT:
-                        pass
-        except xml.parsers.expat.ExpatError:
-            log.error(
-                'Error found in XML file, check the formatting. ' +
-                'Refer to the traceback below for the line number and file.'
+                    )
+                parents.append(element)
+                continue
+            parents.pop()
+            if element.tag == ProjectAttributes.XML_NODE_PROJECT:
+                projects.pop()
+            if (
+                len(parents) == 0 or
+                parents[-1].tag != ProjectAttributes.XML_NODE_PROJECT
+            ):
+                continue
+            XmlProjectParser._add_node(
+                element.tag,
+                dict(element.attrib),
+                [
+                    dict(node.attrib) for node in element
+                    if node.tag == ProjectAttributes.XML_NODE_FILE
+                ],
+                project_root,
+                operations,
+                projects[-1]
             )
-            log.error(traceback.format_exc())
-            project_object.initialise()
-            return
-        log.debug(filepath + ' parsed in ' + utils.time_delta_string(
-            start_time,
-            time.time())
+            element.clear()
+        return operations
+
+    @staticmethod
+    def apply_operations(operations, project_object):
+        """
+        Apply the *operations* returned by *read_project* to the given
+        *project_object*, parsing any included project files.
+        """
+        for operation in operations:
+            name, args = operation[0], operation[1:]
+            if name == 'project':
+                path, synthesise = args
+                log.debug('Found sub-project: ' + path)
+                # Recursively call this parser with the new project path
+                XmlProjectParser.parse_project(
+                    path,
+                    project_object,
+                    synthesise
+                )
+            elif name == 'config':
+                project_object.add_config_dict(**args[0])
+            elif name == 'file':
+                path, library_name, attribs = args
+                project_object.add_file(
+                    path=path,
+                    library=library_name,
+                    **attribs
+                )
+            elif name == 'constraints':
+                path, attribs = args
+                project_object.add_constraints(path, **attribs)
+            elif name == 'unittest':
+                path, attribs = args
+                project_object.add_unittest(path, **attribs)
+            elif name == 'generic':
+                project_object.add_generic(*args)
+            elif name == 'abort':
+                try:
+                    project_object.add_abort_pattern(*args)
+                except ValueError as e:
+                    log.error(str(e) + ', the pattern is ignored.')
+            elif name == 'warning':
+                log.warning(args[0])
+            elif name == 'error':
+                log.error(args[0])
+
+    @staticmethod
+    def _get_synthesis_enabled(attribs, root, synthesise):
+        """
+        Return the synthesis flag for the children of a project tag with the
+        given *attribs*. If this whole project should not be synthesised,
+        ignore any child flags otherwise get the project synthesis flag and
+        use that.
+        """
+        if synthesise is not None:
+            return synthesise
+        return ProjectAttributes.process_attributes(attribs, root).get(
+            ProjectAttributes.ATTRIBUTE_SYNTHESIS,
+            None
         )
 
     @staticmethod
-    def _add_config(child, root, project_object):
+    def _add_node(name, attribs, files, root, operations, synthesis_enabled):
+        """
+        Append the operations for a child tag of a project tag to the
+        *operations* list. The *name* and *attribs* dictionary are the tag
+        name and attributes, and *files* is a list of the attribute
+        dictionaries of any file tags that it contains.
+        """
+        if name == ProjectAttributes.XML_NODE_PROJECT:
+            XmlProjectParser._add_project(
+                attribs,
+                root,
+                operations,
+                synthesis_enabled
+            )
+        elif name == ProjectAttributes.XML_NODE_CONFIG:
+            XmlProjectParser._add_config(attribs, root, operations)
+        elif name == ProjectAttributes.XML_NODE_LIBRARY:
+            XmlProjectParser._add_library(
+                attribs,
+                files,
+                root,
+                operations,
+                synthesis_enabled
+            )
+        elif name == ProjectAttributes.XML_NODE_CONSTRAINTS:
+            XmlProjectParser._add_constraints(attribs, root, operations)
+        elif name == ProjectAttributes.XML_NODE_UNITTEST:
+            XmlProjectParser._add_unittest(attribs, root, operations)
+        elif name == ProjectAttributes.XML_NODE_GENERIC:
+            # Build a dictionary of generics using the attribute name and
+            # value
+            for attrName, attrVal in attribs.items():
+                operations.append(['generic', attrName, attrVal])
+        elif name == ProjectAttributes.XML_NODE_ABORT:
+            XmlProjectParser._add_abort(attribs, operations)
+        elif name == ProjectAttributes.XML_NODE_FILE:
+            # Files should not be left unassociated with a library unless
+            # you wish to add all files to the work library. The default
+            # behavior will be to add parentless files to the work library,
+            # but a configuration option could make this post an error
+            # instead.
+            operations.append([
+                'warning',
+                'Found file with no parent library, ' +
+                'defaulting to work library'
+            ])
+            # If this whole node should not be synthesised, ignore any child
+            # flags otherwise get the child synthesis flag and use that.
+            if synthesis_enabled is None:
+                synthesise = ProjectAttributes.get_processed_attribute(
+                    attribs.get(ProjectAttributes.ATTRIBUTE_SYNTHESIS, None),
+                    root,
+                    ProjectAttributes.ATTRIBUTE_SYNTHESIS
+                )
+            else:
+                synthesise = synthesis_enabled
+            XmlProjectParser._add_file(
+                attribs,
+                'work',
+                root,
+                operations,
+                synthesise=synthesise
+            )
+
+    @staticmethod
+    def _add_project(attribs, root, operations, synthesis_enabled):
+        """Add an operation to parse the sub-project given by the project tag
+        *attribs*. The sub-project is parsed when the operations are applied
+        so that it is cached separately."""
+        attribs = ProjectAttributes.process_attributes(
+            attribs,
+            root,
+            defaults=ProjectAttributes.PROJECT_NODE_DEFAULTS
+        )
+        # If this whole node should not be synthesised, ignore any child
+        # flags otherwise get the child synthesis flag and use that.
+        if synthesis_enabled is None:
+            synthesise = attribs.get(
+                ProjectAttributes.ATTRIBUTE_SYNTHESIS,
+                None
+            )
+        else:
+            synthesise = synthesis_enabled
+        if ProjectAttributes.ATTRIBUTE_PATH in attribs:
+            operations.append([
+                'project',
+                str(attribs[ProjectAttributes.ATTRIBUTE_PATH]),
+                synthesise
+            ])
+
+    @staticmethod
+    def _add_config(attribs, root, operations):
         """Process and add all child attributes to the given
         configuration dict. Return a reference to the modified dict.
         """
         config = {}
-        for k, v in child.attributes.items():
+        for k, v in attribs.items():
             if v is not None:
                 config[k] = v
-        project_object.add_config_dict(**config)
+        operations.append(['config', config])
 
     @staticmethod
     def _add_file(
-        file_node,
+        attribs,
         library_name,
         root,
-        project_object,
+        operations,
         synthesise
     ):
         """Add the given file to the given library and ensure that any
         relative file paths are correctly converted into absolute paths using
         the project_root as a reference"""
         attribs = ProjectAttributes.process_attributes(
-            file_node.attributes,
+            attribs,
             root,
             defaults=ProjectAttributes.FILE_NODE_DEFAULTS
         )
@@ -382,74 +600,81 @@ class XmlProjectParser:
             # Path is passed directly, so remove it from kwargs
             path = attribs[ProjectAttributes.ATTRIBUTE_PATH]
             del attribs[ProjectAttributes.ATTRIBUTE_PATH]
-            project_object.add_file(
-                path=path,
-                library=library_name,
-                **attribs
-            )
+            operations.append(['file', path, library_name, attribs])
         else:
-            log.warning('Ignoring file with no path.')
+            operations.append(['warning', 'Ignoring file with no path.'])
 
     @staticmethod
     def _add_library(
-        child,
+        attribs,
+        files,
         root,
-        project_object,
+        operations,
         synthesise,
     ):
         """Process the given library node and add it to the
         project_dictionary. Any files containedwithin the library will be
         added to the project_dictionary under that library"""
         attribs = ProjectAttributes.process_attributes(
-            child.attributes, 
+            attribs,
             root,
             defaults=ProjectAttributes.LIBRARY_NODE_DEFAULTS
         )
         if attribs[ProjectAttributes.ATTRIBUTE_NAME] is None:
-            log.warning('Ignoring library with no name specified')
+            operations.append([
+                'warning',
+                'Ignoring library with no name specified'
+            ])
             return
         library_name = attribs[ProjectAttributes.ATTRIBUTE_NAME]
         if synthesise is None:
             synthesise = attribs[ProjectAttributes.ATTRIBUTE_SYNTHESIS]
         # Add all files in this library node to the project
-        for file_node in filter(
-            lambda x: x.nodeName == ProjectAttributes.XML_NODE_FILE,
-            child.childNodes
-        ):
+        for file_attribs in files:
             XmlProjectParser._add_file(
-                file_node,
+                file_attribs,
                 library_name,
                 root,
-                project_object,
+                operations,
                 synthesise,
             )
 
     @staticmethod
-    def _add_constraints(child, root, project_object):
+    def _add_constraints(attribs, root, operations):
         attribs = ProjectAttributes.process_attributes(
-            child.attributes, 
+            attribs,
             root,
             defaults=ProjectAttributes.CONSTRAINTS_NODE_DEFAULTS
         )
         path = attribs[ProjectAttributes.ATTRIBUTE_PATH]
         # Path is passed separately, so delete it from the kwargs dict.
         del attribs[ProjectAttributes.ATTRIBUTE_PATH]
-        project_object.add_constraints(
-            path,
-            **attribs
-        )
+        operations.append(['constraints', path, attribs])
 
     @staticmethod
-    def _add_unittest(child, root, project_object):
+    def _add_unittest(attribs, root, operations):
         attribs = ProjectAttributes.process_attributes(
-            child.attributes, 
+            attribs,
             root,
             defaults=ProjectAttributes.UNITTEST_NODE_DEFAULTS
         )
         path = attribs[ProjectAttributes.ATTRIBUTE_PATH]
         # Path is passed separately, so delete it from the kwargs dict.
         del attribs[ProjectAttributes.ATTRIBUTE_PATH]
-        project_object.add_unittest(
-            path,
-            **attribs
-        )
+        operations.append(['unittest', path, attribs])
+
+    @staticmethod
+    def _add_abort(attribs, operations):
+        pattern = attribs.get(ProjectAttributes.ATTRIBUTE_PATTERN, None)
+        if pattern is None:
+            operations.append([
+                'error',
+                'An abort pattern was defined without a pattern attribute ' +
+                'and will be ignored.'
+            ])
+            return
+        operations.append([
+            'abort',
+            pattern,
+            attribs.get(ProjectAttributes.ATTRIBUTE_SEVERITY, 'error')
+        ])
@@ -0,0 +1,337 @@
+"""
+The distributed module runs the unit tests of a project on several machines.
+
+A *TestCoordinator* enumerates the tests of a project, using the same test
+IDs shown by the *show_tests* command, and listens for workers on a socket.
+Each worker loads the same project file, compiles the project (which does
+nothing if its compilation cache is up to date) and then repeatedly asks the
+coordinator for a test, runs it in a sandbox directory and sends back the
+result. The coordinator hands out the tests that took longest on previous
+runs first and merges the results into a single report.
+
+Messages are JSON objects sent using *multiprocessing.connection*, which
+authenticates each worker when an authentication key is supplied. The key is
+read from the *CHIPTOOLS_AUTHKEY* environment variable by default. The
+coordinator listens on the loopback interface unless another host is given,
+and only listens on other interfaces when an authentication key is supplied
+so that other machines cannot hand back results without the key.
+"""
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from multiprocessing import connection
+
+from chiptools.testing import parallel
+
+log = logging.getLogger(__name__)
+
+# Default host and port used by the coordinator when none are given
+default_host = 'localhost'
+default_port = 6174
+# Number of times a test is handed out before a worker disconnecting while
+# running it is reported as an error
+max_attempts = 2
+
+
+def parse_address(address):
+    """
+    Return a tuple of (*host*, *port*) for the given *host:port* address
+    string, the host and port are optional.
+    """
+    host, _, port = address.rpartition(':')
+    if len(host) == 0:
+        host = default_host
+    if len(port) == 0:
+        port = default_port
+    return (host, int(port))
+
+
+def is_loopback(host):
+    """
+    Return True if every address that the given *host* name resolves to is a
+    loopback address, so that only this machine can connect to it.
+    """
+    try:
+        addresses = socket.getaddrinfo(host, None)
+    except (socket.gaierror, UnicodeError):
+        return False
+    if len(addresses) == 0:
+        return False
+    for family, kind, protocol, name, address in addresses:
+        # IPv6 addresses may include a scope ID after a percent sign
+        if not ipaddress.ip_address(address[0].split('%')[0]).is_loopback:
+            return False
+    return True
+
+
+def get_authkey():
+    """
+    Return the authentication key set in the *CHIPTOOLS_AUTHKEY* environment
+    variable as bytes, or None if the variable is not set.
+    """
+    authkey = os.environ.get('CHIPTOOLS_AUTHKEY', None)
+    if authkey is None:
+        return None
+    return authkey.encode('utf-8')
+
+
+def send(connection, **message):
+    connection.send_bytes(json.dumps(message).encode('utf-8'))
+
+
+def receive(connection):
+    return json.loads(connection.recv_bytes().decode('utf-8'))
+
+
+class TestCoordinator(object):
+    """
+    The TestCoordinator hands out the tests with the given *ids*, which index
+    the list of (file name, test case) tuples in *tests*, to workers that
+    connect to *address*. The optional *durations* dictionary of *test name*
+    : *duration* is used to hand out the longest tests first. An *authkey*
+    is required to listen on an address that is not a loopback address.
+    """
+    def __init__(self, tests, ids, address, authkey=None, durations={}):
+        if authkey is None and not is_loopback(address[0]):
+            raise ValueError(
+                'An authentication key is required to serve tests on ' +
+                (address[0] or 'all interfaces') + ', set the ' +
+                'CHIPTOOLS_AUTHKEY environment variable or serve tests on ' +
+                'localhost.'
+            )
+        self.tests = tests
+        self.ids = ids
+        self.authkey = authkey
+        self.pending = parallel.order_by_duration(ids, tests, durations)
+        self.attempts = {}
+        self.results = {}
+        self.condition = threading.Condition()
+        self.listener = connection.Listener(address, authkey=authkey)
+        # The listener address, which includes the port number assigned by
+        # the system when the port in the requested address was 0.
+        self.address = self.listener.address
+        self.thread = None
+
+    def start(self):
+        """
+        Start accepting workers in a background thread.
+        """
+        self.thread = threading.Thread(target=self.accept)
+        self.thread.daemon = True
+        self.thread.start()
+        log.info(
+            'Waiting for test workers on {0}:{1}'.format(*self.address)
+        )
+
+    def accept(self):
+        while not self.is_complete():
+            try:
+                worker = self.listener.accept()
+            except (OSError, EOFError, connection.AuthenticationError):
+                if self.is_complete():
+                    break
+                log.warning('A test worker failed to connect:')
+                log.warning(traceback.format_exc())
+                continue
+            thread = threading.Thread(target=self.serve, args=(worker,))
+            thread.daemon = True
+            thread.start()
+
+    def is_complete(self):
+        with self.condition:
+            return len(self.results) == len(self.ids)
+
+    def next_test(self):
+        """
+        Return the next test ID to hand out, or None if all of the tests are
+        complete. If there are no tests left to hand out but tests are still
+        running this blocks until they complete or are handed back.
+        """
+        with self.condition:
+            while len(self.pending) == 0:
+                if len(self.results) == len(self.ids):
+                    return None
+                self.condition.wait()
+            test_id = self.pending.pop(0)
+            self.attempts[test_id] = self.attempts.get(test_id, 0) + 1
+            return test_id
+
+    def add_result(self, test_id, code, output, error, duration):
+        with self.condition:
+            self.results[test_id] = (code, output, error, duration)
+            self.condition.notify_all()
+        log.info(
+            '{0} finished in {1:.1f}s'.format(
+                self.tests[test_id][1].id(),
+                duration
+            )
+        )
+
+    def hand_back(self, test_id, worker_name):
+        """
+        Hand back the test with *test_id* that was running on a worker that
+        disconnected, so that it is run by another worker.
+        """
+        log.warning(
+            'Test worker {0} disconnected while running {1}'.format(
+                worker_name,
+                self.tests[test_id][1].id()
+            )
+        )
+        with self.condition:
+            if self.attempts[test_id] >= max_attempts:
+                self.results[test_id] = (
+                    2,
+                    '',
+                    'The test worker {0} disconnected '.format(worker_name) +
+                    'while running this test.',
+                    0
+                )
+            else:
+                self.pending.insert(0, test_id)
+            self.condition.notify_all()
+
+    def serve(self, worker):
+        """
+        Hand out tests to the connected *worker* until there are none left.
+        """
+        test_id = None
+        worker_name = 'unknown'
+        try:
+            message = receive(worker)
+            worker_name = message.get('worker', worker_name)
+            log.info('Test worker {0} connected'.format(worker_name))
+            while True:
+                if message['type'] == 'result':
+                    if message['id'] != test_id:
+                        raise ValueError(
+                            'Unexpected result from ' + worker_name
+                        )
+                    self.add_result(
+                        message['id'],
+                        message['code'],
+                        message['output'],
+                        message['error'],
+                        message['duration'],
+                    )
+                test_id = None
+                next_id = self.next_test()
+                if next_id is None:
+                    send(worker, type='stop')
+                    break
+                test_id = next_id
+                send(
+                    worker,
+                    type='test',
+                    id=test_id,
+                    name=self.tests[test_id][1].id()
+                )
+                message = receive(worker)
+        except (OSError, EOFError, ValueError, KeyError):
+            log.debug(traceback.format_exc())
+            if test_id is not None:
+                self.hand_back(test_id, worker_name)
+        finally:
+            worker.close()
+
+    def wait(self):
+        """
+        Wait for all of the tests to complete, stop accepting workers and
+        return a dictionary of test ID : (*code*, *output*, *error*,
+        *duration*).
+        """
+        with self.condition:
+            while len(self.results) < len(self.ids):
+                self.condition.wait()
+        # Wake the accept thread with a connection so that it can exit
+        try:
+            connection.Client(self.address, authkey=self.authkey).close()
+        except (OSError, EOFError, connection.AuthenticationError):
+            pass
+        self.listener.close()
+        return self.results
+
+
+class TestWorker(object):
+    """
+    The TestWorker runs the list of *tests*, indexed by test ID, that it is
+    given by the coordinator at *address*.
+    """
+    def __init__(self, tests, address, authkey=None, name=None):
+        self.tests = tests
+        self.address = address
+        self.authkey = authkey
+        if name is None:
+            name = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self.name = name
+
+    def run(self):
+        """
+        Run tests until the coordinator has none left and return the number
+        of tests that were run.
+        """
+        count = 0
+        coordinator = connection.Client(self.address, authkey=self.authkey)
+        try:
+            send(coordinator, type='ready', worker=self.name)
+            while True:
+                message = receive(coordinator)
+                if message['type'] == 'stop':
+                    break
+                test_id = message['id']
+                if (
+                    test_id >= len(self.tests) or
+                    self.tests[test_id].id() != message['name']
+                ):
+                    # The project loaded by this worker does not match the
+                    # project loaded by the coordinator.
+                    code, output, error, duration = (
+                        2,
+                        '',
+                        'Test {0} on worker {1} is not {2}, '.format(
+                            test_id,
+                            self.name,
+                            message['name']
+                        ) + 'check that the project files match.',
+                        0
+                    )
+                else:
+                    log.info('Running ' + message['name'])
+                    code, output, error, duration = parallel.run_test_case(
+                        self.tests[test_id]
+                    )
+                send(
+                    coordinator,
+                    type='result',
+                    id=test_id,
+                    code=code,
+                    output=output,
+                    error=error,
+                    duration=duration,
+                )
+                count += 1
+        finally:
+            coordinator.close()
+        return count
+
+
+def run_worker(project_path, address, tool_name=None, authkey=None):
+    """
+    Load the project file given by *project_path*, compile it and run the
+    tests handed out by the coordinator at *address* in a sandbox directory.
+    The sandbox is named after the worker process so that several workers
+    can share a simulation directory, but the project must be compiled
+    before they are started as they would otherwise compile it at the same
+    time.
+    """
+    project, tests = parallel.load_worker_project(
+        project_path,
+        tool_name,
+        'sandbox_{0}_{1}'.format(socket.gethostname(), os.getpid())
+    )
+    project.compile(tool_name=tool_name)
+    return TestWorker(tests, address, authkey).run()
@@ -0,0 +1,378 @@
+"""
+The parallel module runs the unit tests of a project in a pool of worker
+processes. Each worker loads the project file, prepares a sandbox directory
+for its simulator and runs the tests it is given in that sandbox, so that
+tests which read and write files in their *simulation_root* can run at the
+same time. The compiled libraries are shared by all workers and are not
+modified by them, so the project must be compiled before the tests are run.
+
+The tests of each test class are handed to a worker together and run in a
+single suite, so that the class fixtures, which usually load the design into
+the simulator, run once for each class as they do when the tests are run
+serially.
+
+The functions in this module that run a single test case and merge the
+results of tests run elsewhere into a report are also used by the distributed
+test runner.
+"""
+import concurrent.futures
+import datetime
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+import unittest
+from xml.etree import ElementTree
+
+from chiptools.testing.custom_runners import HTMLTestRunner
+
+log = logging.getLogger(__name__)
+
+# The test cases loaded by the worker process, indexed by test ID.
+worker_tests = None
+
+
+def load_worker_project(project_path, tool_name, sandbox):
+    """
+    Load the project file given by *project_path*, prepare the *sandbox*
+    directory, relative to the simulation directory, for the simulator and
+    load the simulation environment of each test case. Return a tuple of
+    (*project*, *tests*) where *tests* is the list of test cases indexed by
+    test ID.
+    """
+    # Imported here as the project module imports the test runners
+    from chiptools.core.project import Project
+    project = Project()
+    project.load_project(project_path)
+    simulator = project._get_tool(tool_name, tool_type='simulation')
+    simulator.prepare_sandbox(
+        os.path.join(project.get_simulation_directory(), sandbox),
+        includes=project.options.get_simulator_library_dependencies(
+            simulator.name
+        )
+    )
+    tests = []
+    for file_name, test in project.get_test_cases():
+        test.load_environment(project, tool_name=tool_name)
+        tests.append(test)
+    return project, tests
+
+
+def initialise_worker(project_path, tool_name, sandboxes):
+    """
+    Load the project in a worker process, the worker takes a sandbox index
+    from the *sandboxes* queue so that each worker uses a different sandbox.
+    """
+    global worker_tests
+    project, worker_tests = load_worker_project(
+        project_path,
+        tool_name,
+        'sandbox_{0}'.format(sandboxes.get())
+    )
+
+
+class TimedTestResult(HTMLTestRunner._TestResult):
+    """
+    A TimedTestResult records the time at which each test stopped, in the
+    *stop_times* dictionary of id(*test*) : *time*, in addition to the
+    results recorded by the HTML test runner.
+    """
+    def __init__(self):
+        super(TimedTestResult, self).__init__(verbosity=2)
+        self.stop_times = {}
+
+    def stopTest(self, test):
+        super(TimedTestResult, self).stopTest(test)
+        self.stop_times[id(test)] = time.time()
+
+
+def run_test_cases(tests):
+    """
+    Run the list of *tests* in a single suite, so that the fixtures of a
+    class or module are only run once for consecutive tests that share them,
+    and return a list of (*code*, *output*, *error*, *duration*) tuples for
+    the tests where the *code*, *output* and *error* items are those
+    recorded by the HTML test runner (*code* is 0 for success, 1 for
+    failure, 2 for error and None if the test was skipped). The duration of
+    each test includes the fixtures that were run before it.
+    """
+    result = TimedTestResult()
+    start_time = time.time()
+    try:
+        unittest.TestSuite(tests).run(result)
+    except:
+        error = traceback.format_exc()
+        duration = (time.time() - start_time) / len(tests)
+        return [(2, '', error, duration) for test in tests]
+    positions = dict((id(test), index) for index, test in enumerate(tests))
+    records = {}
+    fixture_error = None
+    for code, test, output, error in result.result:
+        index = positions.get(id(test), None)
+        if index is None:
+            # Errors in class or module fixtures are recorded against the
+            # suite rather than a test.
+            if fixture_error is None:
+                fixture_error = (code, output, error)
+        elif index not in records or records[index][0] == 0:
+            records[index] = (code, output, error)
+    results = []
+    last_time = start_time
+    for index, test in enumerate(tests):
+        stop_time = result.stop_times.get(id(test), None)
+        if stop_time is None:
+            # The test was not run because a fixture failed
+            duration = 0
+            record = fixture_error or (None, '', '')
+        else:
+            duration = stop_time - last_time
+            last_time = stop_time
+            # HTMLTestRunner does not report skipped tests
+            record = records.get(index, (None, '', ''))
+        results.append(record + (duration,))
+    if fixture_error is not None and fixture_error not in [
+        record[:3] for record in results
+    ]:
+        # A fixture that failed after the tests ran, such as tearDownClass,
+        # is reported against the last test.
+        code, output, error, duration = results[-1]
+        if code is None or code == 0:
+            results[-1] = fixture_error + (duration,)
+    return results
+
+
+def run_test_case(test):
+    """
+    Run the given *test* case, including the class and module fixtures, and
+    return a tuple of (*code*, *output*, *error*, *duration*), see
+    *run_test_cases*.
+    """
+    return run_test_cases([test])[0]
+
+
+def run_tests(test_ids):
+    """
+    Run the tests with the given *test_ids* in the worker process in a single
+    suite and return a list of (*test_id*, *code*, *output*, *error*,
+    *duration*) tuples.
+    """
+    return [
+        (test_id,) + result for test_id, result in zip(
+            test_ids,
+            run_test_cases([worker_tests[test_id] for test_id in test_ids])
+        )
+    ]
+
+
+def get_test_groups(ids, tests):
+    """
+    Return a dictionary of test ID : (*class index*, *set index*) for the
+    test *ids*, which index the list of (file name, test case) tuples in
+    *tests*. Test classes are numbered in the order of their first test and
+    the generic sets declared by the tests of each class are numbered in the
+    order of the first test that uses them. Tests that do not declare a
+    generic set share a set.
+    """
+    classes = {}
+    generic_sets = {}
+    groups = {}
+    for id in ids:
+        test = tests[id][1]
+        class_index = classes.setdefault(type(test), len(classes))
+        get_generic_set = getattr(test, 'get_generic_set', None)
+        generic_set = None if get_generic_set is None else get_generic_set()
+        sets = generic_sets.setdefault(class_index, {})
+        groups[id] = (class_index, sets.setdefault(generic_set, len(sets)))
+    return groups
+
+
+def order_by_duration(ids, tests, durations):
+    """
+    Return the list of test *ids* sorted so that the test classes that took
+    longest to run, according to the *durations* dictionary of *test name* :
+    *duration*, are first. Classes with a test that has no recorded duration
+    are run before all other classes as their duration is unknown. The tests
+    of each class are kept together and ordered as for *order_by_generics*,
+    then by duration. The *tests* list of (file name, test case) tuples is
+    indexed by test ID.
+    """
+    groups = get_test_groups(ids, tests)
+
+    def duration_key(id):
+        duration = durations.get(tests[id][1].id(), None)
+        if duration is None:
+            return (0, 0)
+        return (1, -duration)
+
+    class_keys = {}
+    for id in ids:
+        class_index = groups[id][0]
+        known, duration = class_keys.get(class_index, (1, 0))
+        test_known, test_duration = duration_key(id)
+        class_keys[class_index] = (
+            min(known, test_known),
+            duration + test_duration
+        )
+    return sorted(
+        ids,
+        key=lambda id: (
+            class_keys[groups[id][0]],
+            groups[id],
+            duration_key(id),
+            id
+        )
+    )
+
+
+def group_by_class(ids, tests):
+    """
+    Return the ordered list of test *ids* split into a list of groups of
+    consecutive tests that belong to the same test class, see
+    *get_test_groups*.
+    """
+    groups = get_test_groups(ids, tests)
+    class_groups = []
+    for id in ids:
+        if (
+            len(class_groups) == 0 or
+            groups[class_groups[-1][-1]][0] != groups[id][0]
+        ):
+            class_groups.append([])
+        class_groups[-1].append(id)
+    return class_groups
+
+
+def order_by_generics(ids, tests):
+    """
+    Return the list of test *ids* reordered so that the tests of each test
+    class are run one after another, in the order of the first test of each
+    class, and the tests of a class that declare the same generic set are run
+    one after another. Tests that do not declare a generic set are kept
+    together in their original order.
+    """
+    groups = get_test_groups(ids, tests)
+    return sorted(ids, key=lambda id: groups[id])
+
+
+def write_html_report(stream, tests, ids, results, start_time):
+    """
+    Write an HTML report for the tests with the given *ids* to *stream* and
+    return the merged test result. The *results* dictionary maps each test
+    ID to a tuple of (*code*, *output*, *error*, *duration*) and *start_time*
+    is the datetime at which the tests were started.
+    """
+    runner = HTMLTestRunner.HTMLTestRunner(verbosity=2, stream=stream)
+    runner.startTime = start_time
+    result = HTMLTestRunner._TestResult(verbosity=2)
+    for id in ids:
+        code, output, error, duration = results[id]
+        if code is None:
+            continue
+        elif code == 0:
+            result.success_count += 1
+        elif code == 1:
+            result.failure_count += 1
+        else:
+            result.error_count += 1
+        result.result.append((code, tests[id][1], output, error))
+    runner.stopTime = datetime.datetime.now()
+    runner.generateReport(None, result)
+    return result
+
+
+def write_junit_report(stream, tests, ids, results):
+    """
+    Write a JUnit XML report for the tests with the given *ids* to *stream*,
+    the *results* dictionary maps each test ID to a tuple of (*code*,
+    *output*, *error*, *duration*).
+    """
+    suite = ElementTree.Element('testsuite', name='chiptools')
+    counts = {'tests': 0, 'failures': 0, 'errors': 0, 'skipped': 0}
+    total_duration = 0
+    for id in ids:
+        code, output, error, duration = results[id]
+        class_name, name = tests[id][1].id().rsplit('.', 1)
+        case = ElementTree.SubElement(
+            suite,
+            'testcase',
+            classname=class_name,
+            name=name,
+            time='{0:.3f}'.format(duration),
+        )
+        counts['tests'] += 1
+        total_duration += duration
+        if code is None:
+            counts['skipped'] += 1
+            ElementTree.SubElement(case, 'skipped')
+        elif code != 0:
+            tag = ['failure', 'error'][code == 2]
+            counts[tag + 's'] += 1
+            lines = error.strip().splitlines()
+            element = ElementTree.SubElement(
+                case,
+                tag,
+                message=lines[-1] if len(lines) > 0 else ''
+            )
+            element.text = error
+        if output:
+            ElementTree.SubElement(case, 'system-out').text = output
+    for name, count in counts.items():
+        suite.set(name, str(count))
+    suite.set('time', '{0:.3f}'.format(total_duration))
+    root = ElementTree.Element('testsuites')
+    root.append(suite)
+    stream.write(ElementTree.tostring(root, encoding='unicode'))
+
+
+class ParallelTestRunner(object):
+    """
+    The ParallelTestRunner runs a selection of the tests in the project file
+    given by *project_path* in *jobs* worker processes using the simulator
+    given by *tool_name*. The tests of each class are run together by one
+    worker. The optional *durations* dictionary of *test name* : *duration*
+    is used to start the longest test classes first.
+    """
+    def __init__(self, project_path, jobs, tool_name=None, durations={}):
+        self.project_path = project_path
+        self.jobs = jobs
+        self.tool_name = tool_name
+        self.durations = durations
+
+    def run(self, tests, ids):
+        """
+        Run the tests with the given *ids*, which index the list of (file
+        name, test case) tuples in *tests*, and return a dictionary of test
+        ID : (*code*, *output*, *error*, *duration*).
+        """
+        # Workers are started using spawn on all platforms so that they do not
+        # inherit the state of the parent process, such as open cache
+        # databases and loaded test modules.
+        context = multiprocessing.get_context('spawn')
+        sandboxes = context.Queue()
+        jobs = min(self.jobs, len(ids))
+        for index in range(jobs):
+            sandboxes.put(index)
+        results = {}
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=context,
+            initializer=initialise_worker,
+            initargs=(self.project_path, self.tool_name, sandboxes),
+        ) as executor:
+            futures = [
+                executor.submit(run_tests, group) for group in group_by_class(
+                    order_by_duration(ids, tests, self.durations),
+                    tests
+                )
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                for test_id, code, output, error, duration in future.result():
+                    results[test_id] = (code, output, error, duration)
+                    log.info(
+                        '{0} finished in {1:.1f}s'.format(
+                            tests[test_id][1].id(),
+                            duration
+                        )
+                    )
+        return results
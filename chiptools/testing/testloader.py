@@ -1,14 +1,42 @@
+import functools
 import unittest
 import logging
 import traceback
 import os
 import sys
+from chiptools.common import exceptions
 from chiptools.common import utils
 from chiptools.core.project import Project
 
 log = logging.getLogger(__name__)
 
 
+def with_generics(**generics):
+    """
+    Decorate a test method to run it with the given *generics* added to the
+    *generics* of its test case. Unlike generics that are set while the test
+    is running, generics declared in this way are known before the tests are
+    run, so ChipTools runs the tests that share a generic set one after
+    another and simulators that compile or elaborate the design for each
+    generic set only need to do so once per set:
+
+    >>> class MyUnitTest(ChipToolsTest):
+    ...     generics = {'data_width': 8}
+    ...     @with_generics(data_width=32)
+    ...     def test_32_bit_bus(self):
+    ...         self.simulate()
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            # Copy the generics so that the test case class is not modified
+            self.generics = dict(self.generics, **generics)
+            return function(self, *args, **kwargs)
+        wrapper.chiptools_generics = generics
+        return wrapper
+    return decorator
+
+
 class ChipToolsTest(unittest.TestCase):
     """
     The *ChipToolsTest* class is derived from unittest.TestCase and provides a
@@ -85,6 +113,10 @@ class ChipToolsTest(unittest.TestCase):
     >>> def test_16_bit_bus(self):
     ...     self.generics['data_width'] = 16
     ...     self.simulate()
+
+    Generics that are fixed for a test can instead be declared using the
+    *with_generics* decorator, which allows tests that share a generic set
+    to be run together.
     """
 
     entity = None
@@ -119,6 +151,36 @@ class ChipToolsTest(unittest.TestCase):
     ...     project = os.path.join(base, '..', 'my_project.xml')
     """
 
+    output_log = None
+    """
+    The optional *output_log* attribute names a file, relative to the
+    *simulation_root*, that the simulator output is written to instead of
+    being kept in memory. This should be used by tests that produce a large
+    amount of output, when it is set the *stdout* and *stderr* strings
+    returned by *simulate* only contain the last lines of the output.
+    """
+
+    abort_patterns = []
+    """
+    The optional *abort_patterns* attribute is a list of (*pattern*,
+    *severity*) tuples that are added to the abort patterns defined in the
+    project. The simulation is stopped on the first line of output matching
+    a pattern with a severity of 'error' or 'failure' and the test fails
+    with the matching line and the simulation time:
+
+    >>> class MyUnitTest(ChipToolsTest)
+    ...     abort_patterns = [('Error:', 'error'), ('Warning:', 'warning')]
+    """
+
+    timeout = None
+    """
+    The optional *timeout* attribute is the wall clock time in seconds that
+    the simulation may run for before it is stopped and the test fails. It
+    overrides the *simulation_timeout* set in the project.
+    """
+
+    _output_matchers = None
+
     _environment_type = None
 
     _loaded_path = None
@@ -129,13 +191,14 @@ class ChipToolsTest(unittest.TestCase):
         Return the simulation environment items from the supplied project
         instance as a tuple of (simulator, simulation_root, libraries).
         """
-        # Get the simulation root directory
-        simulation_root = project.get_simulation_directory()
         # Get the simulator instance to allow compilation/simulation
         simulator = project._get_tool(
             tool_name,
             tool_type='simulation'
         )
+        # Get the simulation root directory, this is a sandbox directory
+        # when the test is run by a parallel test worker.
+        simulation_root = simulator.get_run_directory()
         # Get the simulation library map so that external dependencies
         # can be resolved.
         simulation_libraries = (
@@ -242,6 +305,67 @@ class ChipToolsTest(unittest.TestCase):
         self.__class__._environment_type = 'chiptools'
         log.debug('Finished load_environment call on {0}'.format(self))
 
+    def add_output_matcher(self, pattern, callback=None, fatal=False):
+        """
+        Search each line of the simulator output for the regular expression
+        *pattern* while the simulator is running. Matchers apply to every
+        call to *simulate* made by the current test, so they are usually
+        added in the *setUp* method.
+
+        The optional *callback* is called with each matching line as it is
+        printed. If *fatal* is True the simulator is stopped on the first
+        matching line and the test fails, so a failing testbench does not
+        need to run to completion:
+
+        >>> def setUp(self):
+        ...     self.add_output_matcher('Error:|Failure:', fatal=True)
+        ...     self.reports = []
+        ...     self.add_output_matcher('report', callback=self.reports.append)
+        """
+        if self._output_matchers is None:
+            self._output_matchers = []
+        self._output_matchers.append((pattern, callback, fatal))
+
+    def get_generic_set(self):
+        """
+        Return the generics that this test declares that it simulates with,
+        which are the *generics* of the test case updated by any generics
+        declared using the *with_generics* decorator, as a sorted tuple of
+        (*name*, *value*) tuples.
+        """
+        method = getattr(self, self._testMethodName, None)
+        generics = dict(self.generics)
+        generics.update(getattr(method, 'chiptools_generics', {}))
+        return tuple(
+            sorted((name, str(value)) for name, value in generics.items())
+        )
+
+    def get_output_monitor(self):
+        """
+        Return a utils.OutputMonitor for the output matchers, abort patterns,
+        timeout and output log of this test, or None if none of them are
+        used.
+        """
+        if (
+            not self._output_matchers and
+            not self.abort_patterns and
+            self.output_log is None and
+            self.timeout is None
+        ):
+            return None
+        spool_path = None
+        if self.output_log is not None:
+            spool_path = os.path.join(self.simulation_root, self.output_log)
+        monitor = utils.OutputMonitor(
+            spool_path=spool_path,
+            timeout=self.timeout
+        )
+        for pattern, callback, fatal in self._output_matchers or []:
+            monitor.add_matcher(pattern, callback=callback, fatal=fatal)
+        for pattern, severity in self.abort_patterns:
+            monitor.add_abort_pattern(pattern, severity)
+        return monitor
+
     def simulate(self):
         """
         Launch the simulation tool in console mode to execute the testbench.
@@ -277,13 +401,23 @@ class ChipToolsTest(unittest.TestCase):
                 )
             )
 
-        ret_val, stdout, stderr = self._simulator.simulate(
-            library=self.library,
-            entity=self.entity,
-            includes=self._simulation_libraries,
-            duration=self.duration,
-            generics=self.generics,
-            gui=False
-        )
+        kwargs = {}
+        monitor = self.get_output_monitor()
+        if monitor is not None:
+            kwargs['monitor'] = monitor
+        try:
+            ret_val, stdout, stderr = self._simulator.simulate(
+                library=self.library,
+                entity=self.entity,
+                includes=self._simulation_libraries,
+                duration=self.duration,
+                generics=self.generics,
+                gui=False,
+                **kwargs
+            )
+        except exceptions.SimulationAborted as e:
+            # The simulation was stopped by an abort pattern, a fatal output
+            # matcher or the timeout, which is reported as a test failure.
+            raise self.failureException(str(e)) from e
         return (ret_val, stdout, stderr)
 
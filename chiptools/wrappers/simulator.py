@@ -1,10 +1,14 @@
 import logging
 import os
+import threading
 import time
+import traceback
 
 from chiptools.common import exceptions
 from chiptools.common.exceptions import FileNotFoundError
 from chiptools.common import utils
+from chiptools.core import artifacts
+from chiptools.core import scheduler
 from chiptools.wrappers.toolchains import ToolchainBase
 
 log = logging.getLogger(__name__)
@@ -17,6 +21,20 @@ class Simulator(ToolchainBase):
     Common functions used by all simulator tool wrappers are implemented in
     this class.
     """
+
+    # Set to True by simulators that can safely run more than one compiler
+    # process targeting the same library at the same time. When False, files
+    # in the same library are never compiled concurrently.
+    concurrent_library_compile = False
+    # Maximum total length of the file paths passed to a single compiler
+    # invocation, this is kept below the 8191 character limit of the Windows
+    # command processor which runs the batch file wrappers of some tools.
+    max_batch_length = 8000
+    # Regular expression used to extract the simulation time from a line of
+    # simulator output, the first group is the time. This is used to report
+    # the time at which a simulation was aborted.
+    simulation_time_pattern = None
+
     def __init__(self, project, executables, user_paths):
         super(Simulator, self).__init__(
             project,
@@ -24,6 +42,11 @@ class Simulator(ToolchainBase):
             user_paths
         )
         self.libraries = {}
+        # Held by compile workers when modifying shared simulator state
+        self.lock = threading.Lock()
+        # Directory that simulations are run in when it is not the simulation
+        # directory, see prepare_sandbox.
+        self.run_directory = None
 
     def compile(self, file_object):
         """
@@ -45,10 +68,117 @@ class Simulator(ToolchainBase):
         present on the entity being simulated.
         The optional argument *do* can be used to supply a string argument to
         be interpreted by the simulator as a script to execute after loading.
-
+        The optional argument *monitor* supplies a utils.OutputMonitor that
+        processes the simulator output line by line while it is running.
         """
         raise NotImplementedError
 
+    def get_monitor(self, monitor=None):
+        """
+        Return the utils.OutputMonitor used to watch a simulation, which is
+        the supplied *monitor* or a new monitor if the project defines abort
+        patterns or a simulation timeout. The project abort patterns and
+        timeout are added to the monitor. None is returned if the simulation
+        does not need to be watched.
+        """
+        patterns = self.project.get_abort_patterns()
+        timeout = self.project.get_simulation_timeout()
+        if monitor is None:
+            if len(patterns) == 0 and timeout is None:
+                return None
+            monitor = utils.OutputMonitor()
+        for pattern, severity in patterns:
+            monitor.add_abort_pattern(pattern, severity)
+        if monitor.timeout is None:
+            monitor.timeout = timeout
+        if (
+            monitor.time_regex is None and
+            self.simulation_time_pattern is not None
+        ):
+            monitor.set_time_pattern(self.simulation_time_pattern)
+        return monitor
+
+    def get_run_directory(self):
+        """
+        Return the directory that simulations are run in, which is the
+        simulation directory unless a sandbox has been prepared.
+        """
+        if self.run_directory is None:
+            return self.project.get_simulation_directory()
+        return self.run_directory
+
+    def prepare_sandbox(self, path, includes={}):
+        """
+        Create the directory *path* and run simulations in it instead of the
+        simulation directory, so that simulations running in different
+        sandboxes do not share their working files.
+        The libraries compiled in the simulation directory and the *includes*
+        dictionary of external libraries are used from the sandbox without
+        being modified. Simulators that locate libraries relative to their
+        working directory override this method to map them into the sandbox.
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.run_directory = path
+
+    def get_snapshot_name(self, entity, *fields):
+        """
+        Return the name of the simulation snapshot elaborated for *entity*
+        with the given elaboration *fields*, such as the generics bound at
+        elaboration. The name encodes the fields so that snapshots of the
+        same entity in different configurations can coexist.
+        """
+        return '{0}_{1}'.format(entity, artifacts.get_key(*fields)[:8])
+
+    def get_snapshot_fingerprint(self, library, entity, includes={}, *fields):
+        """
+        Return a fingerprint of everything a snapshot of *entity* in
+        *library* is elaborated from: the contents of the compiled project
+        files and the files they included, the *includes* dictionary of
+        external libraries and the additional elaboration *fields*.
+        """
+        digests = self.project.cache.get_file_digests(self.name)
+        include_fields = []
+        for libname, path in sorted(includes.items()):
+            modified = None
+            if os.path.exists(path):
+                modified = os.path.getmtime(path)
+            include_fields += [libname, path, modified]
+        return artifacts.get_key(
+            self.name,
+            library,
+            entity,
+            *(
+                include_fields +
+                list(fields) +
+                [
+                    (file_object.path, digests.get(file_object.path, None))
+                    for file_object in sorted(
+                        self.project.get_files(),
+                        key=lambda file_object: file_object.path
+                    )
+                ] +
+                self.project.cache.get_include_digests(self.name)
+            )
+        )
+
+    def is_snapshot_current(self, path, fingerprint):
+        """
+        Return True if the snapshot at *path* exists and was elaborated from
+        a design with the given *fingerprint*, in which case it does not need
+        to be elaborated again.
+        """
+        if not os.path.exists(path):
+            return False
+        return self.project.cache.get_snapshot(path, self.name) == fingerprint
+
+    def add_snapshot(self, path, fingerprint):
+        """
+        Record that the snapshot at *path* was elaborated from a design with
+        the given *fingerprint*.
+        """
+        self.project.cache.add_snapshot(path, fingerprint, self.name)
+
     def set_working_library(self, library, cwd=None):
         """
         Set the current working library where source files are to be compiled
@@ -64,6 +194,15 @@ class Simulator(ToolchainBase):
         """
         raise NotImplementedError
 
+    def map_libraries(self, libraries, cwd=None):
+        """
+        Map the *libraries* that files are compiled into, or read from, before
+        any files are compiled. Files may be compiled in parallel, so
+        simulators that list the libraries in a file read by the compiler
+        write it here rather than when each file is compiled.
+        """
+        pass
+
     def library_exists(self, libname, workdir):
         """
         Return True if the given libname exists in the workdir.
@@ -71,10 +210,208 @@ class Simulator(ToolchainBase):
         lib_path = os.path.join(workdir, libname)
         return os.path.isdir(lib_path)
 
-    def compile_project(self, includes={}):
+    def get_batch_key(self, file_object):
+        """
+        Return a key for the given *file_object*, consecutive files with the
+        same key can be passed to a single compiler invocation.
+        """
+        return (
+            file_object.library,
+            file_object.fileType,
+            file_object.get_tool_arguments(self.name, 'compile'),
+        )
+
+    def get_batches(self, file_objects):
+        """
+        Split the ordered list of *file_objects* into a list of batches, each
+        of which is a list of indices into *file_objects*. A batch contains
+        consecutive files with the same batch key and the total length of the
+        file paths in a batch does not exceed *max_batch_length*.
+        """
+        batches = []
+        batch_key = None
+        length = 0
+        for index, file_object in enumerate(file_objects):
+            key = self.get_batch_key(file_object)
+            path_length = len(file_object.path) + 1
+            if (
+                len(batches) == 0 or
+                key != batch_key or
+                length + path_length > self.max_batch_length
+            ):
+                batches.append([])
+                batch_key = key
+                length = 0
+            batches[-1].append(index)
+            length += path_length
+        return batches
+
+    def compile_batch(self, file_objects, cwd=None):
+        """
+        Compile the supplied list of *file_objects*, which share a batch key,
+        in order. Simulators that can compile more than one file in a single
+        invocation override this method.
+        """
+        for file_object in file_objects:
+            self.compile(file_object, cwd=cwd)
+
+    @staticmethod
+    def get_failed_position(file_objects, error):
+        """
+        Return the position in the list of *file_objects* of the first file
+        that is named in the message of the compilation *error*, the files
+        before it are assumed to have compiled successfully. If no file is
+        named then 0 is returned so that all of the files are recompiled.
+        """
+        message = str(error)
+        for position, file_object in enumerate(file_objects):
+            if (
+                file_object.path in message or
+                os.path.basename(file_object.path) in message
+            ):
+                return position
+        return 0
+
+    def get_library_artifacts(self, library, files):
+        """
+        Return a list of the paths, relative to the simulation directory, that
+        hold the compiled output of the given *library* built from the list
+        of *files*. Return None if the compiled library cannot be stored in
+        an artifact cache.
+        """
+        return [library]
+
+    def get_library_keys(self, files, graph, headers={}):
+        """
+        Return a dictionary of *library* : *key* where the key identifies the
+        compiled contents of each library built from the ordered *files* list.
+        The key covers the simulator version, the compilation arguments, the
+        external libraries and the contents of every file in the library, of
+        the files they include, given by the *headers* dictionary of *index*
+        : *set(paths)*, and of every file that they depend on. An empty
+        dictionary is returned if the simulator version cannot be determined.
+        """
+        version = self.get_version()
+        if not version:
+            log.debug(
+                'Unknown {0} version, artifact cache disabled.'.format(
+                    self.name
+                )
+            )
+            return {}
+        cache = self.project.cache
+        file_keys = []
+        library_fields = {}
+        for index, file_object in enumerate(files):
+            file_key = artifacts.get_key(
+                file_object.library,
+                os.path.basename(file_object.path),
+                file_object.fileType,
+                cache.get_digest(file_object.path)[1],
+                file_object.get_tool_arguments(self.name, 'compile'),
+                sorted(
+                    (os.path.basename(path), cache.get_digest(path)[1])
+                    for path in headers.get(index, ())
+                ),
+                *sorted(file_keys[d] for d in graph.get(index, ()))
+            )
+            file_keys.append(file_key)
+            library_fields.setdefault(file_object.library, []).append(
+                file_key
+            )
+        return dict(
+            (
+                library,
+                artifacts.get_key(
+                    self.name,
+                    version,
+                    self.project.get_tool_arguments(self.name, 'compile'),
+                    sorted(self.libraries.items()),
+                    *fields
+                )
+            ) for library, fields in library_fields.items()
+        )
+
+    def restore_libraries(self, store, keys, files, graph, stale, cwd):
+        """
+        Restore the libraries containing *stale* files from the artifact
+        *store* and return the set of indices into *files* that were
+        restored. A library is only restored if every file it depends on in
+        another library is up to date or was also restored, so that restored
+        libraries are never made obsolete by a later compilation.
+        """
+        restored = set()
+        libraries = []
+        for index in sorted(stale):
+            if files[index].library not in libraries:
+                libraries.append(files[index].library)
+        for library in libraries:
+            indices = [
+                index for index, file_object in enumerate(files)
+                if file_object.library == library
+            ]
+            blocked = any(
+                d in stale and d not in restored and
+                files[d].library != library
+                for index in indices for d in graph.get(index, ())
+            )
+            paths = self.get_library_artifacts(
+                library,
+                [files[index] for index in indices]
+            )
+            if blocked or paths is None or library not in keys:
+                continue
+            try:
+                if not store.restore(keys[library], cwd, paths):
+                    continue
+            except (OSError, IOError):
+                log.warning(
+                    'Could not restore library {0} '.format(library) +
+                    'from the artifact cache, it will be compiled instead.'
+                )
+                log.debug(traceback.format_exc())
+                continue
+            log.info(
+                '...restored library {0} from the artifact cache'.format(
+                    library
+                )
+            )
+            restored.update(indices)
+        return restored
+
+    def store_libraries(self, store, keys, files, libraries, cwd):
+        """
+        Copy the compiled *libraries* into the artifact *store*.
+        """
+        for library in libraries:
+            paths = self.get_library_artifacts(
+                library,
+                [f for f in files if f.library == library]
+            )
+            if paths is None or library not in keys:
+                continue
+            try:
+                store.store(keys[library], cwd, paths)
+            except (OSError, IOError):
+                log.warning(
+                    'Could not store library {0} '.format(library) +
+                    'in the artifact cache.'
+                )
+                log.debug(traceback.format_exc())
+
+    def compile_project(self, includes={}, jobs=None):
+        """
+        Compile the files in the project that have changed since they were
+        last compiled. If *jobs* is greater than one, or it is not supplied
+        and the project *jobs* configuration is greater than one, files that
+        do not depend on each other are compiled in parallel using up to
+        *jobs* concurrent compiler processes.
+        """
         self.libraries.update(includes)
         for libname, path in includes.items():
             self.set_library_path(libname, path)
+        if jobs is None:
+            jobs = self.project.get_jobs()
         # Load the cache
         cache = self.project.cache
         # Compile the project
@@ -87,65 +424,195 @@ class Simulator(ToolchainBase):
             skipped = 0
             count = 0
             start_time = time.time()
-            file_object = None
-            try:
-                for file_object in self.project.get_files():
-                    libname = file_object.library
-                    count += 1
-                    # Check the md5sum of this file and compare it to the
-                    # md5sum cache to see if it has changed since it was
-                    # last compiled
-                    if os.path.isfile(file_object.path):
-                        if (
-                            not force and
-                            not cache.is_file_changed(file_object, self.name)
-                        ):
-                            # The hashes match. If the library already exists
-                            # then dont compile the file.
-                            if self.library_exists(libname, cwd):
-                                if libname not in created_libraries:
-                                    skipped += 1
-                                    log.info(
-                                        "...skipping: " + file_object.path
-                                    )
-                                    continue
-                        cache.add_file(file_object, self.name)
-                        # Map or create the library, track which libraries
-                        # were already created
-                        if (
-                            not cache.library_in_cache(libname, self.name) or
-                            not self.library_exists(libname, cwd)
-                        ):
-                            # If this library is in the cache file someone must
-                            # have deleted it since the last run, we need to
-                            # recompile all files that are targeted at this
-                            # library.
-                            created_libraries.append(libname)
-                            log.info("...adding library: " + libname)
-                            self.add_library(libname)
-                            cache.add_library(libname.lower(), self.name)
-                        # Map the library to work so files can be added
-                        self.set_working_library(libname, cwd=cwd)
-                        log.info(
-                            '...compiling {0} ({1}) into library {2}'.format(
-                                os.path.basename(file_object.path),
-                                file_object.fileType,
-                                libname)
-                        )
-                        # Compile the source
-                        self.compile(file_object, cwd=cwd)
+            pending = []
+
+            batches = []
+
+            def compile_batch(batch):
+                file_objects = [pending[index] for index in batches[batch]]
+                # Map the library to work so files can be added
+                self.set_working_library(file_objects[0].library, cwd=cwd)
+                for file_object in file_objects:
+                    log.info(
+                        '...compiling {0} ({1}) into library {2}'.format(
+                            os.path.basename(file_object.path),
+                            file_object.fileType,
+                            file_object.library)
+                    )
+                # Compile the sources
+                self.compile_batch(file_objects, cwd=cwd)
+
+            def file_complete(index):
+                cache.add_file(
+                    pending[index],
+                    self.name,
+                    dependencies=pending_dependencies[index],
+                    includes=pending_headers[index]
+                )
+
+            def batch_complete(batch):
+                for index in batches[batch]:
+                    file_complete(index)
+
+            def batch_failed(batch, e):
+                # Files that precede the file that failed were compiled,
+                # clear the MD5 for the failed file and any that follow it
+                # so they will recompile next time.
+                file_objects = [pending[index] for index in batches[batch]]
+                failed = self.get_failed_position(file_objects, e)
+                for position, index in enumerate(batches[batch]):
+                    if position < failed:
+                        file_complete(index)
                     else:
+                        cache.remove_file(pending[index], self.name)
+
+            try:
+                files = self.project.get_files()
+                for file_object in files:
+                    if not os.path.isfile(file_object.path):
                         raise FileNotFoundError(
                             'File could not be found: ' +
                             '{0}, operation aborted.'.format(
                                 file_object.path
                             )
                         )
+                count = len(files)
+                # Map or create the libraries, track which libraries were
+                # created so that all of the files targeted at them are
+                # compiled.
+                for file_object in files:
+                    libname = file_object.library
+                    if libname in created_libraries:
+                        continue
+                    if (
+                        not cache.library_in_cache(libname, self.name) or
+                        not self.library_exists(libname, cwd)
+                    ):
+                        # If this library is in the cache file someone must
+                        # have deleted it since the last run, we need to
+                        # recompile all files that are targeted at this
+                        # library.
+                        created_libraries.append(libname)
+                        log.info("...adding library: " + libname)
+                        self.add_library(libname)
+                        cache.add_library(libname.lower(), self.name)
+                # Check the md5sum of each file against the cache to see if
+                # it has changed since it was last compiled, any file that
+                # depends on a changed file must also be recompiled.
+                # Files included by each file, such as Verilog headers, are
+                # recorded so that a change to them recompiles the file.
+                headers = {}
+                graph = self.project.get_dependency_graph(
+                    files,
+                    includes=headers
+                )
+                if force:
+                    stale = set(range(len(files)))
+                else:
+                    stale = cache.get_stale_files(
+                        files,
+                        graph,
+                        self.name,
+                        libraries=created_libraries
+                    )
+                # Restore any libraries that need compiling from the
+                # artifact cache if one is configured.
+                store = self.project.get_artifact_store()
+                keys = {}
+                restored = set()
+                if store is not None and len(stale) > 0:
+                    keys = self.get_library_keys(files, graph, headers)
+                    restored = self.restore_libraries(
+                        store,
+                        keys,
+                        files,
+                        graph,
+                        stale,
+                        cwd
+                    )
+                    for index in sorted(restored):
+                        cache.add_file(
+                            files[index],
+                            self.name,
+                            dependencies=set(
+                                files[d].path for d in graph[index]
+                            ),
+                            includes=headers[index]
+                        )
+                    stale -= restored
+                positions = {}
+                for index, file_object in enumerate(files):
+                    if index in stale:
+                        positions[index] = len(pending)
+                        pending.append(file_object)
+                    elif index not in restored:
+                        skipped += 1
+                        log.info("...skipping: " + file_object.path)
+                # Map the full project graph onto the pending files, any
+                # dependency that is not being recompiled is up to date.
+                pending_graph = dict(
+                    (
+                        positions[index],
+                        set(positions[d] for d in graph[index] if d in stale)
+                    ) for index in stale
+                )
+                # Record the files each file was compiled against so that a
+                # later change to one of them will recompile its dependents.
+                pending_dependencies = [
+                    set(files[d].path for d in graph[index])
+                    for index in sorted(stale)
+                ]
+                pending_headers = [headers[index] for index in sorted(stale)]
+                # Consecutive files that can be passed to the same compiler
+                # invocation are compiled as a batch.
+                batches.extend(self.get_batches(pending))
+                batch_of = {}
+                for batch, indices in enumerate(batches):
+                    for index in indices:
+                        batch_of[index] = batch
+                batch_graph = dict(
+                    (
+                        batch,
+                        set(
+                            batch_of[d] for index in indices
+                            for d in pending_graph[index]
+                        ) - set([batch])
+                    ) for batch, indices in enumerate(batches)
+                )
+                # Batches are compiled in project order unless parallel jobs
+                # are requested, in which case the dependency graph is used
+                # to determine which batches can be compiled concurrently.
+                if jobs > 1 and len(batches) > 1:
+                    log.info(
+                        '...compiling {0} file(s) using {1} jobs'.format(
+                            len(pending),
+                            jobs
+                        )
+                    )
+                self.map_libraries(
+                    sorted(set(f.library for f in files)),
+                    cwd=cwd
+                )
+                scheduler.JobScheduler(jobs).run(
+                    list(range(len(batches))),
+                    batch_graph,
+                    compile_batch,
+                    on_complete=batch_complete,
+                    on_failure=batch_failed,
+                    group=(
+                        None if self.concurrent_library_compile else
+                        lambda batch: pending[batches[batch][0]].library
+                    ),
+                )
+                if len(keys) > 0:
+                    self.store_libraries(
+                        store,
+                        keys,
+                        files,
+                        sorted(set(f.library for f in pending)),
+                        cwd
+                    )
             except:
-                # Clear the SHA1 for the file that failed so it will recompile
-                # next time
-                if file_object is not None:
-                    cache.remove_file(file_object, self.name)
                 cache.save_cache()
                 raise
             if skipped > 0:
@@ -13,6 +13,9 @@ class Ghdl(Simulator):
 
     name = 'ghdl'
     executables = ['ghdl']
+    version_args = ['--version']
+    # GHDL prints the time of a message as 'file.vhd:1:2:@10ns:'
+    simulation_time_pattern = r'@(\d+(?:\.\d+)?[munpf]?s)'
 
     def __init__(self, project, user_paths):
         super(Ghdl, self).__init__(project, self.executables, user_paths)
@@ -26,22 +29,50 @@ class Ghdl(Simulator):
         generics={},
         includes={},
         args=[],
-        duration=None
+        duration=None,
+        monitor=None
     ):
-        # Elaborate
-        args = [
-            '-e',
-            '--work=' + library,
+        monitor = self.get_monitor(monitor)
+        cwd = self.get_run_directory()
+        # Libraries are compiled into the simulation directory, which may not
+        # be the directory that the simulation runs in.
+        library_args = []
+        simulation_directory = self.project.get_simulation_directory()
+        if cwd != simulation_directory:
+            library_args = [
+                '--workdir=' + simulation_directory,
+                '-P' + simulation_directory,
+            ]
+        # Elaborate, unless the executable elaborated by a previous
+        # simulation in this directory is up to date. Generics are bound when
+        # the simulation is run so one executable serves every generic set.
+        # The mcode backend does not write an executable and elaborates the
+        # design each time it is run.
+        executable = os.path.join(cwd, entity.lower())
+        fingerprint = self.get_snapshot_fingerprint(
+            library,
             entity,
-        ]
-        Ghdl._call(
-            self.ghdl, args, cwd=self.project.get_simulation_directory()
+            includes,
+            simulation_directory
         )
+        if self.is_snapshot_current(executable, fingerprint):
+            log.info('Reusing elaborated executable ' + executable)
+        else:
+            self.project.cache.remove_snapshot(executable, self.name)
+            args = [
+                '-e',
+                '--work=' + library,
+            ]
+            args += library_args
+            args += [entity]
+            Ghdl._call(self.ghdl, args, cwd=cwd)
+            self.add_snapshot(executable, fingerprint)
         # Run command
         args = [
             '-r',
             '--work=' + library,
         ]
+        args += library_args
         # Primary Unit
         args += [entity]
         # Map any generics
@@ -56,13 +87,18 @@ class Ghdl(Simulator):
         ret, stdout, stderr = Ghdl._call(
             self.ghdl,
             args,
-            cwd=self.project.get_simulation_directory(),
-            quiet=False
+            cwd=cwd,
+            quiet=False,
+            monitor=monitor
         )
 
         return ret, stdout, stderr
 
     def compile(self, file_object, cwd=None):
+        self.compile_batch([file_object], cwd=cwd)
+
+    def compile_batch(self, file_objects, cwd=None):
+        file_object = file_objects[0]
         args = self.project.get_tool_arguments(self.name, 'compile')
         if len(args) == 0:
             args = file_object.get_tool_arguments(self.name, 'compile')
@@ -70,8 +106,8 @@ class Ghdl(Simulator):
         args += [
             '-a',
             '--work=' + file_object.library,
-            file_object.path
         ]
+        args += [f.path for f in file_objects]
         if file_object.fileType == FileType.VHDL:
             Ghdl._call(
                 self.ghdl,
@@ -79,10 +115,11 @@ class Ghdl(Simulator):
                 cwd=self.project.get_simulation_directory()
             )
         else:
-            log.warning(
-                'Simulator ignoring file with unsupported extension: ' +
-                file_object.path
-            )
+            for f in file_objects:
+                log.warning(
+                    'Simulator ignoring file with unsupported extension: ' +
+                    f.path
+                )
 
     def library_exists(self, libname, workdir):
         """
@@ -96,6 +133,22 @@ class Ghdl(Simulator):
                 return True
         return False
 
+    def get_library_artifacts(self, library, files):
+        """
+        GHDL stores each library as a *library-objNN.cf* index in the
+        simulation directory, with an object file for each source file when
+        a code generating backend is used. Paths that do not exist are
+        ignored by the artifact cache.
+        """
+        paths = [
+            '{0}-obj{1}.cf'.format(library, standard)
+            for standard in ['87', '93', '02', '08', '19']
+        ]
+        for file_object in files:
+            name = os.path.splitext(os.path.basename(file_object.path))[0]
+            paths.append(name + '.o')
+        return paths
+
     def set_working_library(self, library, cwd=None):
         pass
 
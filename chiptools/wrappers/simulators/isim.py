@@ -13,6 +13,9 @@ class Isim(Simulator):
 
     name = 'isim'
     executables = ['fuse', 'vlogcomp', 'vhpcomp']
+    version_args = ['-version']
+    # ISim prints the time of a message as 'at 10 ns(1):'
+    simulation_time_pattern = r'\bat\s+(\d+(?:\.\d+)?\s*[munpf]?s)\('
 
     # Name of the output file generated by fuse
     sim_exe_name = 'fuse_sim'
@@ -33,11 +36,37 @@ class Isim(Simulator):
         # modified their ISE installation structure.
         os.environ['XILINX'] = os.path.join(self.path, '../../')
 
-    def write_includes(self):
-        """Write the includes dictionary to the xilinxsim.ini file in the
-        simulation directory, which is required by vlogcomp, vhpcomp and fuse
-        to locate existing compiled libraries."""
-        cwd = self.project.get_simulation_directory()
+    def prepare_sandbox(self, path, includes={}):
+        """
+        Create a sandbox at *path* with an xilinxsim.ini that maps the project
+        libraries in the simulation directory and the *includes*.
+        """
+        super(Isim, self).prepare_sandbox(path, includes)
+        simulation_directory = self.project.get_simulation_directory()
+        libraries = dict(includes)
+        for libname in self.project.get_libraries():
+            libraries[libname] = os.path.join(simulation_directory, libname)
+        self.write_includes(libraries, path)
+
+    def map_libraries(self, libraries, cwd=None):
+        """
+        Write the xilinxsim.ini file listing the *libraries* once, before any
+        files are compiled, so that it is not rewritten while the compiler
+        reads it.
+        """
+        for libname in libraries:
+            self.libraries.setdefault(libname, libname)
+        self.write_includes(cwd=cwd)
+
+    def write_includes(self, libraries=None, cwd=None):
+        """Write the *libraries* dictionary (by default the includes
+        dictionary) to the xilinxsim.ini file in *cwd* (by default the
+        simulation directory), which is required by vlogcomp, vhpcomp and
+        fuse to locate existing compiled libraries."""
+        if libraries is None:
+            libraries = self.libraries
+        if cwd is None:
+            cwd = self.project.get_simulation_directory()
         with open(os.path.join(cwd, self.sim_ini_name), 'w') as f:
             f.write('--Do not modify this file, any changes will be lost.\n')
             f.write(
@@ -45,7 +74,7 @@ class Isim(Simulator):
                     utils.get_date_string()
                 )
             )
-            for libname, path in self.libraries.items():
+            for libname, path in libraries.items():
                 f.write('{0}={1}\n'.format(libname, path))
 
     def simulate(
@@ -56,9 +85,11 @@ class Isim(Simulator):
         generics={},
         includes={},
         args=[],
-        duration=None
+        duration=None,
+        monitor=None
     ):
-        cwd = self.project.get_simulation_directory()
+        monitor = self.get_monitor(monitor)
+        cwd = self.get_run_directory()
         # Execute FUSE on the design files:
         fuse_args = [
             library + '.' + entity,
@@ -88,17 +119,19 @@ class Isim(Simulator):
         ret, stdout, stderr = Isim._call(
             os.path.join(cwd, self.sim_exe_name),
             sim_args,
-            cwd=self.project.get_simulation_directory(),
-            quiet=False
+            cwd=cwd,
+            quiet=False,
+            monitor=monitor
         )
 
         return ret, stdout, stderr
 
     def compile(self, file_object, cwd=None):
+        self.compile_batch([file_object], cwd=cwd)
+
+    def compile_batch(self, file_objects, cwd=None):
+        file_object = file_objects[0]
         cwd = self.project.get_simulation_directory()
-        if file_object.library not in self.libraries:
-            self.libraries[file_object.library] = file_object.library
-            self.write_includes()
         args = self.project.get_tool_arguments(self.name, 'compile')
         if len(args) == 0:
             args = file_object.get_tool_arguments(self.name, 'compile')
@@ -107,8 +140,8 @@ class Isim(Simulator):
             '-incremental',
             '-work',
             file_object.library + '=' + file_object.library,
-            file_object.path
         ]
+        args += [f.path for f in file_objects]
         if file_object.fileType == FileType.VHDL:
             Isim._call(self.vhpcomp, args, cwd=cwd)
         elif file_object.fileType == FileType.Verilog:
@@ -116,10 +149,11 @@ class Isim(Simulator):
         elif file_object.fileType == FileType.SystemVerilog:
             Isim._call(self.vlogcomp, args, cwd=cwd)
         else:
-            log.warning(
-                'ISIM wrapper skipping file with unknown type: ' +
-                file_object.path
-            )
+            for f in file_objects:
+                log.warning(
+                    'ISIM wrapper skipping file with unknown type: ' +
+                    f.path
+                )
 
     def library_exists(self, libname, workdir):
         if os.path.exists(os.path.join(workdir, libname)):
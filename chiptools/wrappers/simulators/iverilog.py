@@ -7,6 +7,8 @@ from chiptools.wrappers.simulator import Simulator
 from chiptools.common.exceptions import FileNotFoundError
 from chiptools.common.filetypes import FileType
 from chiptools.common import utils
+from chiptools.core import artifacts
+from chiptools.core import dependencies
 
 log = logging.getLogger(__name__)
 
@@ -25,13 +27,15 @@ class Iverilog(Simulator):
             FileType.SystemVerilog
         ]
         self.files = []
-    def compile_project(self, includes={}):
+
+    def compile_project(self, includes={}, jobs=None):
         """
         This method stages files for compilation as we cannot perform
         compilation until additional runtime information such as generic
         assignments and the desired top-level entity are known. Incremental
-        compilation is not supported by Icarus so the cache and library
-        tracking are not used at all.
+        compilation is not supported by Icarus so the file cache and library
+        tracking are not used, instead the compiled images are cached by
+        simulate. The *jobs* argument is ignored.
         """
         self.files = []
         for file_object in self.project.get_files():
@@ -60,6 +64,14 @@ class Iverilog(Simulator):
             )
         )
 
+    def prepare_sandbox(self, path, includes={}):
+        """
+        Create a sandbox at *path* and stage the project files, which are
+        compiled in the sandbox when simulate is called.
+        """
+        super(Iverilog, self).prepare_sandbox(path, includes)
+        self.compile_project(includes)
+
     def simulate(
         self,
         library,
@@ -68,17 +80,76 @@ class Iverilog(Simulator):
         generics={},
         includes={},
         args=[],
-        duration=None
+        duration=None,
+        monitor=None
     ):
         """
-        Compile and simulate the design.
+        Compile and simulate the design. Generics are compiled into the
+        image, so an image is compiled for each generic set. Images are kept
+        in the run directory and are reused by later simulations, including
+        those of later test runs, until the staged files change.
+        """
+        monitor = self.get_monitor(monitor)
+        image = self.get_snapshot_name(
+            entity,
+            sorted(generics.items()),
+            sorted(includes.items())
+        ) + '.vvp'
+        image_path = os.path.join(self.get_run_directory(), image)
+        fingerprint = self.get_snapshot_fingerprint(
+            library,
+            entity,
+            includes,
+            sorted(generics.items())
+        )
+        if self.is_snapshot_current(image_path, fingerprint):
+            log.info('Reusing compiled image ' + image)
+        else:
+            self.project.cache.remove_snapshot(image_path, self.name)
+            self.compile_image(image, entity, generics, includes)
+            self.add_snapshot(image_path, fingerprint)
+        return self.run_image(image, monitor)
+
+    def get_snapshot_fingerprint(self, library, entity, includes={}, *fields):
+        """
+        Return a fingerprint of everything an image of *entity* is compiled
+        from by *compile_image*: the ordered contents of the staged files and
+        the files they include, the *includes* search paths and the
+        additional *fields*, such as the generics. The staged files are not
+        compiled until an image is built so their current contents are used
+        rather than the contents recorded by the file cache.
+        """
+        cache = self.project.cache
+        fields = list(fields)
+        for file_object in self.files:
+            fields.append(
+                (file_object.path, cache.get_digest(file_object.path)[1])
+            )
+            headers = dependencies.resolve_includes(
+                file_object,
+                self.project.dependency_index.scan(file_object).includes
+            )
+            fields += sorted(
+                (path, cache.get_digest(path)[1]) for path in headers
+            )
+        return artifacts.get_key(
+            self.name,
+            entity,
+            sorted(includes.items()),
+            *fields
+        )
+
+    def compile_image(self, image, entity, generics={}, includes={}):
+        """
+        Compile the staged files into the vvp *image* with *entity* as the
+        top level.
         """
         start_time = time.time()
         args = []
         # Specify the output name
         args += [
             '-o',
-            'icarus_sim'
+            image
         ]
         # Get the files
         for file_object in self.files:
@@ -112,7 +183,7 @@ class Iverilog(Simulator):
         Iverilog._call(
             self.iverilog,
             args,
-            cwd=self.project.get_simulation_directory()
+            cwd=self.get_run_directory()
         )
         log.info("...done")
         log.info(
@@ -120,6 +191,11 @@ class Iverilog(Simulator):
             ' file(s) processed in ' +
             utils.time_delta_string(start_time, time.time())
         )
+
+    def run_image(self, image, monitor=None):
+        """
+        Simulate the compiled vvp *image*.
+        """
         ######################################################################
         # Invoke simulation
         # $ vvp [flags] foo.vvp [extended args]
@@ -142,15 +218,16 @@ class Iverilog(Simulator):
         extended = list(filter(lambda x: x in extended_args, args))
         args = flags
         # Target application
-        args += ['icarus_sim']
+        args += [image]
         # Extended Args
         args += extended
         # Run the simulation
         ret, stdout, stderr = Iverilog._call(
             self.vvp,
             args,
-            cwd=self.project.get_simulation_directory(),
-            quiet=False
+            cwd=self.get_run_directory(),
+            quiet=False,
+            monitor=monitor
         )
         return ret, stdout, stderr
 
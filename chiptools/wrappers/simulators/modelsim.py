@@ -1,14 +1,104 @@
 import logging
 import os
+import re
 import shlex
+import subprocess
+import threading
+import uuid
 
 from chiptools.wrappers.simulator import Simulator
 from chiptools.common.filetypes import FileType
+from chiptools.common import exceptions
 from chiptools.common import utils
 
 log = logging.getLogger(__name__)
 
 
+def tcl_quote(arg):
+    """
+    Return the string *arg* quoted as a single TCL word.
+    """
+    if (
+        len(arg) > 0 and
+        '{' not in arg and
+        '}' not in arg and
+        not arg.endswith('\\')
+    ):
+        return '{' + arg + '}'
+    return '"' + re.sub(r'([\\"$\[\]{}])', r'\\\1', arg) + '"'
+
+
+class ModelsimSession(object):
+    """
+    A ModelsimSession drives a long running *vsim -c* process over a pipe so
+    that ModelSim commands such as *vlib*, *vmap*, *vcom* and *vlog* can be
+    executed as TCL commands without starting a new process (and checking out
+    a new license) for each command.
+
+    Each command is wrapped in a TCL *catch* and followed by a sentinel line
+    that reports the command status, the output of the command is everything
+    printed before the sentinel.
+    """
+    def __init__(self, vsim, cwd):
+        self.cwd = cwd
+        self.sentinel = 'CHIPTOOLS_DONE_' + uuid.uuid4().hex
+        self.sentinel_re = re.compile(re.escape(self.sentinel) + r' (\d+)')
+        log.debug('Starting ModelSim session in ' + cwd)
+        self.process = subprocess.Popen(
+            [vsim, '-c'],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+
+    def call(self, command, args=[]):
+        """
+        Execute the ModelSim *command* with the list of *args* in the session
+        and return the output. An ExecutionError is raised if the command
+        fails or the session terminates.
+        """
+        script = ' '.join([command] + [tcl_quote(arg) for arg in args])
+        log.debug('session: ' + script)
+        self.process.stdin.write(
+            'set chiptools_status [catch {' + script + '} chiptools_result]' +
+            '\n' +
+            'puts "' + self.sentinel + ' $chiptools_status"\n'
+        )
+        self.process.stdin.flush()
+        output = []
+        while True:
+            line = self.process.stdout.readline()
+            if line == '':
+                raise exceptions.ExecutionError(
+                    'The ModelSim session terminated unexpectedly:\n' +
+                    ''.join(output)
+                )
+            match = self.sentinel_re.search(line)
+            if match is not None:
+                break
+            output.append(line)
+        output = ''.join(output)
+        if int(match.group(1)) != 0:
+            raise exceptions.ExecutionError(output)
+        log.debug(output)
+        return output
+
+    def close(self):
+        """
+        Quit the session and wait for the process to terminate.
+        """
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write('quit -f\n')
+                self.process.stdin.flush()
+                self.process.communicate(timeout=30)
+            except (OSError, IOError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+
 class Modelsim(Simulator):
     """
     ModelsimSimulator provides a wrapper around ModelSim to allow simulations
@@ -21,6 +111,9 @@ class Modelsim(Simulator):
 
     name = 'modelsim'
     executables = ['vcom', 'vlib', 'vlog', 'vmap', 'vsim']
+    version_args = ['-version']
+    # ModelSim prints the time of a message as 'Time: 10 ns'
+    simulation_time_pattern = r'Time:\s*(\d+(?:\.\d+)?\s*[munpf]?s)\b'
 
     def __init__(self, project, user_paths):
         super(Modelsim, self).__init__(project, self.executables, user_paths)
@@ -29,6 +122,10 @@ class Modelsim(Simulator):
         self.vlog = os.path.join(self.path, 'vlog')
         self.vlib = os.path.join(self.path, 'vlib')
         self.vsim = os.path.join(self.path, 'vsim')
+        # Persistent sessions, one for each compile thread, that are used
+        # instead of new processes when the project enables them.
+        self.sessions = []
+        self.session = threading.local()
 
     def simulate(
         self,
@@ -38,7 +135,8 @@ class Modelsim(Simulator):
         generics={},
         includes={},
         args=[],
-        duration=None
+        duration=None,
+        monitor=None
     ):
         """
         Invoke the simulator and target the given *entity* in the given
@@ -53,7 +151,10 @@ class Modelsim(Simulator):
         the entity being simulated.
         The optional argument *do* can be used to supply a string argument to
         be interpreted by the simulator as a script to execute after loading.
+        The optional argument *monitor* supplies a utils.OutputMonitor that
+        processes the simulator output line by line while it is running.
         """
+        monitor = self.get_monitor(monitor)
         # Add any custom arguments from the project file
         arguments = self.project.get_tool_arguments(self.name, 'simulate')
         arguments = shlex.split(['', arguments][arguments is not None])
@@ -83,69 +184,113 @@ class Modelsim(Simulator):
         ret, stdout, stderr = Modelsim._call(
             self.vsim,
             arguments,
-            cwd=self.project.get_simulation_directory(),
-            quiet=False
+            cwd=self.get_run_directory(),
+            quiet=False,
+            monitor=monitor
         )
         return ret, stdout, stderr
 
+    def prepare_sandbox(self, path, includes={}):
+        """
+        Create a sandbox at *path* with a modelsim.ini that maps the project
+        libraries and *includes* from the simulation directory, falling back
+        to the modelsim.ini of the simulation directory for everything else.
+        """
+        super(Modelsim, self).prepare_sandbox(path, includes)
+        simulation_directory = self.project.get_simulation_directory()
+        libraries = dict(includes)
+        for libname in self.project.get_libraries():
+            libraries[libname] = os.path.join(simulation_directory, libname)
+        with open(os.path.join(path, 'modelsim.ini'), 'w') as f:
+            f.write('; Generated by ChipTools on {0}\n'.format(
+                utils.get_date_string()
+            ))
+            f.write('[Library]\n')
+            f.write('others = {0}\n'.format(
+                os.path.join(simulation_directory, 'modelsim.ini')
+            ))
+            for libname, library_path in sorted(libraries.items()):
+                f.write('{0} = {1}\n'.format(libname, library_path))
+
+    def compile_project(self, includes={}, jobs=None):
+        """
+        Compile the project, using persistent ModelSim sessions rather than
+        a new process for each command if the *simulator_session*
+        configuration item is set.
+        """
+        if not self.project.get_simulator_session():
+            return super(Modelsim, self).compile_project(includes, jobs)
+        self.sessions = []
+        self.session = threading.local()
+        try:
+            return super(Modelsim, self).compile_project(includes, jobs)
+        finally:
+            for session in self.sessions:
+                session.close()
+            self.sessions = []
+
+    def run(self, executable, args):
+        """
+        Run the ModelSim *executable* (such as vcom) with the list of *args*
+        in the simulation directory, using the session of the calling thread
+        if sessions are enabled.
+        """
+        cwd = self.project.get_simulation_directory()
+        if not self.project.get_simulator_session():
+            return Modelsim._call(executable, args, cwd=cwd)
+        session = getattr(self.session, 'session', None)
+        if session is None:
+            session = ModelsimSession(self.vsim, cwd)
+            self.session.session = session
+            with self.lock:
+                self.sessions.append(session)
+        return session.call(os.path.basename(executable), args)
+
     def compile(self, file_object, cwd=None):
         """
-        Compile the supplied *file_object* into the current working library.
+        Compile the supplied *file_object* into its library.
+        """
+        self.compile_batch([file_object], cwd=cwd)
+
+    def compile_batch(self, file_objects, cwd=None):
+        """
+        Compile the supplied list of *file_objects*, which share a library,
+        file type and arguments, into their library using a single vcom or
+        vlog invocation.
         """
-        # Before compiling this file, check to see if it has any additional
-        # arguments that need passing to modelsim. First check the global
-        # project config, and then check the local file config.
+        file_object = file_objects[0]
+        # Before compiling these files, check to see if they have any
+        # additional arguments that need passing to modelsim. First check the
+        # global project config, and then check the local file config.
         args = self.project.get_tool_arguments(self.name, 'compile')
         if len(args) == 0:
             args = file_object.get_tool_arguments(self.name, 'compile')
         args = shlex.split(['', args][args is not None])
-        args += [file_object.path]
+        # The target library is passed explicitly rather than mapped to work
+        # so that files can be compiled into different libraries at the same
+        # time.
+        args += ['-work', file_object.library]
+        args += [f.path for f in file_objects]
         if file_object.fileType == FileType.VHDL:
-            Modelsim._call(
-                self.vcom,
-                args,
-                cwd=self.project.get_simulation_directory()
-            )
+            self.run(self.vcom, args)
         elif file_object.fileType == FileType.Verilog:
-            Modelsim._call(
-                self.vlog,
-                args,
-                cwd=self.project.get_simulation_directory()
-            )
+            self.run(self.vlog, args)
         elif file_object.fileType == FileType.SystemVerilog:
-            Modelsim._call(
-                self.vlog,
-                args,
-                cwd=self.project.get_simulation_directory()
-            )
+            self.run(self.vlog, args)
         else:
-            log.warning(
-                'Simulator ignoring file with unsupported extension: ' +
-                file_object.path
-            )
+            for f in file_objects:
+                log.warning(
+                    'Simulator ignoring file with unsupported extension: ' +
+                    f.path
+                )
 
     def set_working_library(self, library, cwd=None):
-        Modelsim._call(
-            self.vmap,
-            ['work', library],
-            cwd=self.project.get_simulation_directory()
-        )
+        # The library is passed to vcom/vlog using -work
+        pass
 
     def set_library_path(self, library, path, cwd=None):
-        Modelsim._call(
-            self.vmap,
-            [library, path],
-            cwd=self.project.get_simulation_directory()
-        )
+        self.run(self.vmap, [library, path])
 
     def add_library(self, library):
-        Modelsim._call(
-            self.vlib,
-            [library],
-            cwd=self.project.get_simulation_directory()
-        )
-        Modelsim._call(
-            self.vmap,
-            [library, library],
-            cwd=self.project.get_simulation_directory()
-        )
+        self.run(self.vlib, [library])
+        self.run(self.vmap, [library, library])
@@ -25,6 +25,9 @@ class Vivado(Simulator):
     xsim_name = 'xsim' + platform_suffix
 
     executables = [xvhdl_name, xvlog_name, xelab_name, xsim_name]
+    version_args = ['-version']
+    # XSim prints the time of a message as 'Time: 10 ns'
+    simulation_time_pattern = r'Time:\s*(\d+(?:\.\d+)?\s*[munpf]?s)\b'
 
     sim_ini_name = 'xsim.ini'
     sim_tcl_name = 'xsim.tcl'
@@ -37,11 +40,36 @@ class Vivado(Simulator):
         self.xelab = os.path.join(self.path, self.xelab_name)
         self.xsim = os.path.join(self.path, self.xsim_name)
 
-    def write_includes(self):
-        """Write the includes dictionary to the xsim.ini file in the
-        simulation directory, which is required by xvlog, xvhdl and xelab
+    def prepare_sandbox(self, path, includes={}):
+        """
+        Create a sandbox at *path* with an xsim.ini that maps the project
+        libraries in the simulation directory and the *includes*.
+        """
+        super(Vivado, self).prepare_sandbox(path, includes)
+        simulation_directory = self.project.get_simulation_directory()
+        libraries = dict(includes)
+        for libname in self.project.get_libraries():
+            libraries[libname] = os.path.join(simulation_directory, libname)
+        self.write_includes(libraries, path)
+
+    def map_libraries(self, libraries, cwd=None):
+        """
+        Write the xsim.ini file listing the *libraries* once, before any files
+        are compiled, so that it is not rewritten while the compiler reads it.
+        """
+        for libname in libraries:
+            self.libraries.setdefault(libname, libname)
+        self.write_includes(cwd=cwd)
+
+    def write_includes(self, libraries=None, cwd=None):
+        """Write the *libraries* dictionary (by default the includes
+        dictionary) to the xsim.ini file in *cwd* (by default the simulation
+        directory), which is required by xvlog, xvhdl and xelab
         to locate existing compiled libraries."""
-        cwd = self.project.get_simulation_directory()
+        if libraries is None:
+            libraries = self.libraries
+        if cwd is None:
+            cwd = self.project.get_simulation_directory()
         with open(os.path.join(cwd, self.sim_ini_name), 'w') as f:
             f.write('--Do not modify this file, any changes will be lost.\n')
             f.write(
@@ -49,7 +77,7 @@ class Vivado(Simulator):
                     utils.get_date_string()
                 )
             )
-            for libname, path in self.libraries.items():
+            for libname, path in libraries.items():
                 f.write('{0}={1}\n'.format(libname, path))
 
     def simulate(
@@ -60,9 +88,95 @@ class Vivado(Simulator):
         generics={},
         includes={},
         args=[],
-        duration=None
+        duration=None,
+        monitor=None
     ):
-        cwd = self.project.get_simulation_directory()
+        monitor = self.get_monitor(monitor)
+        cwd = self.get_run_directory()
+        simulation_directory = self.project.get_simulation_directory()
+        # Elaborated snapshots are named after the generics and debug setting
+        # that they were elaborated with, and are reused by later simulations
+        # in this directory while the compiled design is unchanged.
+        snapshot_fields = [sorted(generics.items()), gui]
+        snapshot = self.get_snapshot_name(entity, library, *snapshot_fields)
+        snapshot_path = os.path.join(cwd, 'xsim.dir', snapshot)
+        fingerprint = self.get_snapshot_fingerprint(
+            library,
+            entity,
+            includes,
+            simulation_directory,
+            *snapshot_fields
+        )
+        if self.is_snapshot_current(snapshot_path, fingerprint):
+            log.info('Reusing elaborated snapshot ' + snapshot)
+        else:
+            self.project.cache.remove_snapshot(snapshot_path, self.name)
+            self.elaborate(
+                library,
+                entity,
+                snapshot,
+                gui=gui,
+                generics=generics,
+                includes=includes,
+                cwd=cwd
+            )
+            self.add_snapshot(snapshot_path, fingerprint)
+        # Fuse generates a simulation executable, this can be called now with
+        # the specified simulator arguments:
+        sim_args = []
+        if gui:
+            sim_args += ['-gui']
+            sim_args += ['-onfinish', 'stop']
+            sim_args += ['-onerror', 'stop']
+        else:
+            sim_args += ['-onfinish', 'quit']
+            sim_args += ['-onerror', 'quit']
+        # Create a TCL file:
+        with open(os.path.join(cwd, self.sim_tcl_name), 'w') as f:
+            # Set run duration
+            if duration is not None:
+                if duration <= 0:
+                    duration = 'all'
+                else:
+                    duration = utils.seconds_to_timestring(duration)
+                f.write(
+                    (
+                        'if { [catch {%(command)s} result] } {\n' +
+                        '   puts stderr \"Command failed: $result\"\n' +
+                        '   exit 1\n' +
+                        '}\n'
+                    ) % dict(command='run {0}\n'.format(duration))
+                )
+                f.write('exit\n')
+        sim_args += ['-tclbatch', self.sim_tcl_name]
+        # Path to snapshot to execute
+        sim_args += [snapshot]
+        # Run the simulation
+        ret, stdout, stderr = Vivado._call(
+            self.xsim,
+            sim_args,
+            cwd=cwd,
+            quiet=False,
+            monitor=monitor
+        )
+
+        return ret, stdout, stderr
+
+    def elaborate(
+        self,
+        library,
+        entity,
+        snapshot,
+        gui=False,
+        generics={},
+        includes={},
+        cwd=None
+    ):
+        """
+        Run xelab to elaborate the given *entity* in *library* into the
+        simulation snapshot named *snapshot* in the *cwd* directory.
+        """
+        simulation_directory = self.project.get_simulation_directory()
         # Set simulator generics
         # NOTE: Different behavior is required when calling xelab on Windows
         # as the command line argument to xelab '-generic_top' does not work
@@ -97,11 +211,13 @@ class Vivado(Simulator):
                     '-lib' + ' ' +
                     libname +               # Library Name
                     '\"' + '=' + '\"' +
-                    libname + ' '           # Library Path
+                    os.path.join(
+                        simulation_directory, libname
+                    ) + ' '                 # Library Path
                 )
             # Execute XELAB on the design files:
             xelab_args += (' ' + library + '.' + str(entity))
-            xelab_args += (' ' + '-s' + ' ' + str(entity))
+            xelab_args += (' ' + '-s' + ' ' + snapshot)
             Vivado._call_str_args(self.xelab, xelab_args, cwd=cwd, quiet=False)
         else:
             # Normal behavior on other platforms.
@@ -124,58 +240,21 @@ class Vivado(Simulator):
             for libname in self.project.get_libraries():
                 xelab_args += [
                     '-lib',
-                    libname + '=' + str(libname) + ' ',
+                    libname + '=' +
+                    os.path.join(simulation_directory, libname) + ' ',
                 ]
 
             # Execute XELAB on the design files:
             xelab_args += [library + '.' + str(entity)]
-            xelab_args += ['-s', str(entity)]
+            xelab_args += ['-s', snapshot]
             Vivado._call(self.xelab, xelab_args, cwd=cwd, quiet=False)
-        # Fuse generates a simulation executable, this can be called now with
-        # the specified simulator arguments:
-        sim_args = []
-        if gui:
-            sim_args += ['-gui']
-            sim_args += ['-onfinish', 'stop']
-            sim_args += ['-onerror', 'stop']
-        else:
-            sim_args += ['-onfinish', 'quit']
-            sim_args += ['-onerror', 'quit']
-        # Create a TCL file:
-        with open(os.path.join(cwd, self.sim_tcl_name), 'w') as f:
-            # Set run duration
-            if duration is not None:
-                if duration <= 0:
-                    duration = 'all'
-                else:
-                    duration = utils.seconds_to_timestring(duration)
-                f.write(
-                    (
-                        'if { [catch {%(command)s} result] } {\n' +
-                        '   puts stderr \"Command failed: $result\"\n' +
-                        '   exit 1\n' +
-                        '}\n'
-                    ) % dict(command='run {0}\n'.format(duration))
-                )
-                f.write('exit\n')
-        sim_args += ['-tclbatch', self.sim_tcl_name]
-        # Path to snapshot to execute
-        sim_args += [entity]
-        # Run the simulation
-        ret, stdout, stderr = Vivado._call(
-            self.xsim,
-            sim_args,
-            cwd=self.project.get_simulation_directory(),
-            quiet=False
-        )
-
-        return ret, stdout, stderr
 
     def compile(self, file_object, cwd=None):
+        self.compile_batch([file_object], cwd=cwd)
+
+    def compile_batch(self, file_objects, cwd=None):
+        file_object = file_objects[0]
         cwd = self.project.get_simulation_directory()
-        if file_object.library not in self.libraries:
-            self.libraries[file_object.library] = file_object.library
-        self.write_includes()
         args = self.project.get_tool_arguments(self.name, 'compile')
         if len(args) == 0:
             args = file_object.get_tool_arguments(self.name, 'compile')
@@ -183,8 +262,8 @@ class Vivado(Simulator):
         args += [
             '-work',
             file_object.library,
-            file_object.path
         ]
+        args += [f.path for f in file_objects]
         if file_object.fileType == FileType.VHDL:
             Vivado._call(self.xvhdl, args, cwd=cwd)
         elif file_object.fileType == FileType.Verilog:
@@ -192,10 +271,11 @@ class Vivado(Simulator):
         elif file_object.fileType == FileType.SystemVerilog:
             Vivado._call(self.xvlog, args, cwd=cwd)
         else:
-            log.warning(
-                'Vivado wrapper skipping file with unknown type: ' +
-                file_object.path
-            )
+            for f in file_objects:
+                log.warning(
+                    'Vivado wrapper skipping file with unknown type: ' +
+                    f.path
+                )
 
     def library_exists(self, libname, workdir):
         if os.path.exists(os.path.join(workdir, libname)):
@@ -1,10 +1,12 @@
+import fnmatch
 import os
 import logging
 import traceback
 
 from chiptools.common import exceptions
+from chiptools.common import utils
 from chiptools.common.exceptions import FileNotFoundError
-from chiptools.core import package_builder
+from chiptools.core import artifacts
 from chiptools.wrappers.toolchains import ToolchainBase
 
 log = logging.getLogger(__name__)
@@ -51,27 +53,243 @@ class Synthesiser(ToolchainBase):
     implementations. Common functions used by all synthesis tool wrappers are
     implemented in this class.
     """
+    # Shell patterns matching the names of the report files that are read by
+    # *get_report_summary*.
+    report_patterns = []
+    # Names of the flow stages that can be selected with the *from_stage* and
+    # *to_stage* synthesis arguments, in the order they are run.
+    stages = []
+    # Name of the file holding the build fingerprint in each archive, a copy
+    # is also stored next to each successful archive with this extension.
+    fingerprint_name = 'chiptools_fingerprint.txt'
+    fingerprint_extension = '.fingerprint'
+    # Extension of the archives that are still being written
+    partial_extension = '.partial'
+
     def __init__(self, project, executables, user_paths):
         super(Synthesiser, self).__init__(
             project,
             executables,
             user_paths
         )
+        # Path to the archive written by the last call to *storeOutputs*
+        self.archive_path = None
+        # Fingerprint of the build inputs that is stored with the archive
+        self.fingerprint = None
+        # PackageBuilder for the archive being written by the current build
+        # and the directory its archive names are relative to.
+        self.archive = None
+        self.archive_root = None
 
     def synthesise(self, library, entity, fpga_part=None):
         """
         Synthesise the target entity in the given library for the currently
         loaded project.
         """
-        pass
+        self.archive_path = None
+        self.archive = None
+        self.remove_partial_archives()
+
+    def remove_partial_archives(self):
+        """
+        Remove the partial archives left in the synthesis directory by builds
+        that were stopped before their archive was complete. Partial archives
+        written by processes that are still running are kept.
+        """
+        directory = self.project.get_synthesis_directory()
+        if directory is None or not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if not name.endswith(self.partial_extension):
+                continue
+            pid = name[:-len(self.partial_extension)].rpartition('.')[2]
+            if pid.isdigit() and utils.is_process_running(int(pid)):
+                continue
+            try:
+                os.remove(os.path.join(directory, name))
+                log.debug('Removed partial archive: ' + name)
+            except OSError:
+                # Open archives cannot be removed on Windows
+                pass
+
+    def begin_archive(self, workingDirectory):
+        """
+        Start writing the archive of the files in the supplied
+        workingDirectory so that outputs can be added with *archive_outputs*
+        while the flow runs. The archive is written to a temporary name
+        alongside the working directory, including the ID of this process,
+        and renamed by *storeOutputs*.
+        """
+        from chiptools.core import package_builder
+        include, exclude = self.project.get_synthesis_archive_patterns()
+        self.archive_root = workingDirectory
+        self.archive = package_builder.PackageBuilder(
+            os.path.normpath(workingDirectory) +
+            '.{0}'.format(os.getpid()) + self.partial_extension,
+            compression=self.project.get_synthesis_archive_compression(),
+            include=include,
+            exclude=exclude
+        )
+
+    def archive_outputs(self, paths):
+        """
+        Add the files that exist in the given list of *paths* to the archive
+        started by *begin_archive*. Nothing is done if no archive has been
+        started.
+        """
+        if self.archive is None:
+            return
+        for path in paths:
+            if os.path.exists(path):
+                self.archive.add(
+                    path,
+                    os.path.relpath(path, self.archive_root)
+                )
 
-    def storeOutputs(self, workingDirectory, archiveName):
+    def storeOutputs(self, workingDirectory, archiveName, failed=False):
         """
         Add all files found in the supplied workingDirectory to an archive
-        with the name archiveName. A PackageBuilder instance is used to manage
-        the creation of the archive file.
+        with the name archiveName, followed by the extension of the
+        compression set by the *synthesis_archive_compression* configuration
+        item. A PackageBuilder instance is used to manage the creation of the
+        archive file, files that were added while the flow ran are only added
+        again if they have been modified since. If a build *fingerprint* is
+        set it is added to the archive and, unless the build *failed*, stored
+        next to the archive so that the archive can be found by
+        *find_archive*.
         """
-        archivePath = os.path.join(workingDirectory, '../', archiveName)
-        archive = package_builder.PackageBuilder(archivePath)
+        if self.fingerprint is not None:
+            with open(
+                os.path.join(workingDirectory, self.fingerprint_name), 'w'
+            ) as f:
+                f.write(self.fingerprint + '\n')
+        if self.archive is None or self.archive_root != workingDirectory:
+            self.begin_archive(workingDirectory)
+        archive = self.archive
+        self.archive = None
         archive.addAll(workingDirectory)
         archive.save()
+        from chiptools.core import package_builder
+        archivePath = os.path.normpath(
+            os.path.join(workingDirectory, '../', archiveName) +
+            package_builder.EXTENSIONS[archive.compression]
+        )
+        os.replace(archive.path, archivePath)
+        self.archive_path = archivePath
+        if self.fingerprint is not None and not failed:
+            with open(
+                self.archive_path + self.fingerprint_extension, 'w'
+            ) as f:
+                f.write(self.fingerprint + '\n')
+
+    def get_source_fields(self, files=True, constraints=True):
+        """
+        Return a list of the paths, md5 sums and tool arguments of the
+        synthesis fileset, if *files* is True, and the paths and md5 sums of
+        the constraints used by this tool, if *constraints* is True, in the
+        order they are used.
+        """
+        fields = []
+        if files:
+            file_set = self.project.get_synthesis_fileset()
+            for libName in sorted(file_set.keys()):
+                for file_object in file_set[libName]:
+                    flows = file_object.optionalToolArgs.get(self.name, {})
+                    fields += [
+                        libName,
+                        file_object.path,
+                        self.project.cache.get_digest(file_object.path)[1],
+                        sorted(
+                            (flow, file_object.get_tool_arguments(
+                                self.name,
+                                flow
+                            )) for flow in flows
+                        ),
+                    ]
+        if constraints:
+            for file_object in self.project.get_constraints():
+                if file_object.flow == self.name or file_object.flow is None:
+                    fields += [
+                        file_object.path,
+                        self.project.cache.get_digest(file_object.path)[1],
+                    ]
+        return fields
+
+    def get_fingerprint(self, library, entity, fpga_part=None):
+        """
+        Return a fingerprint of the inputs to a build of the *entity* in
+        *library* for the *fpga_part*, or the project part if it is None.
+        The fingerprint covers the contents of the synthesis fileset and
+        constraints, the generics, the part, the tool name and version and
+        the project and file tool arguments for every flow stage.
+        """
+        if fpga_part is None:
+            fpga_part = self.project.get_fpga_part()
+        prefix = 'args_{0}_'.format(self.name)
+        return artifacts.get_key(
+            self.name,
+            self.get_version(),
+            library,
+            entity,
+            fpga_part,
+            sorted(
+                (str(k), str(v))
+                for k, v in self.project.get_generics().items()
+            ),
+            sorted(
+                (k, str(v)) for k, v in self.project.config.items()
+                if k.startswith(prefix)
+            ),
+            *self.get_source_fields()
+        )
+
+    def find_archive(self, fingerprint):
+        """
+        Return the path to the most recent successful archive in the
+        synthesis directory that was built with the given *fingerprint*, or
+        None if there is no such archive.
+        """
+        directory = self.project.get_synthesis_directory()
+        if directory is None or not os.path.isdir(directory):
+            return None
+        archives = []
+        for name in os.listdir(directory):
+            if not name.endswith(self.fingerprint_extension):
+                continue
+            path = os.path.join(directory, name)
+            archive_path = path[:-len(self.fingerprint_extension)]
+            if archive_path.endswith(self.partial_extension):
+                continue
+            if not os.path.isfile(archive_path):
+                continue
+            try:
+                with open(path, 'r') as f:
+                    if f.read().strip() != fingerprint:
+                        continue
+            except (IOError, OSError):
+                continue
+            archives.append((os.path.getmtime(archive_path), archive_path))
+        if len(archives) == 0:
+            return None
+        return max(archives)[1]
+
+    def get_report_summary(self, directory):
+        """
+        Return a dictionary summarising the synthesis reports found in the
+        given *directory*. The *slack* item is the worst timing slack in ns,
+        or None if it could not be found, and the *utilisation* item is a
+        dictionary of *resource name* : *percentage used*.
+        """
+        return {'slack': None, 'utilisation': {}}
+
+    @staticmethod
+    def find_reports(directory, pattern):
+        """
+        Return a sorted list of the paths of the files in the given
+        *directory*, or its subdirectories, with names matching *pattern*.
+        """
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            for name in fnmatch.filter(files, pattern):
+                paths.append(os.path.join(root, name))
+        return sorted(paths)
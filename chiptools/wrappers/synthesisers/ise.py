@@ -9,6 +9,7 @@ import shlex
 from chiptools.common.filetypes import FileType
 from chiptools.common import exceptions
 from chiptools.common.exceptions import FileNotFoundError
+from chiptools.core import artifacts
 from chiptools.wrappers import synthesiser
 
 log = logging.getLogger(__name__)
@@ -66,6 +67,25 @@ class Ise(synthesiser.Synthesiser):
         'bitgen',
         'xflow'
     ]
+    # The XST help starts with the release banner, for example
+    # 'Release 14.7 - xst P.20131013 (lin64)'
+    version_executable = 'xst'
+    version_args = ['-help']
+    report_patterns = ['*.par', '*.twr', '*_map.mrp']
+    # Stages of the manual flow, the outputs of each stage are kept in a
+    # stage cache so that a later build can resume from the first stage
+    # whose inputs have changed.
+    stages = ['xst', 'ngdbuild', 'map', 'par', 'bitgen', 'promgen']
+    # Suffixes of the entity files written by each stage that are kept in
+    # the stage cache, the first file is the stage output which must exist.
+    stage_outputs = {
+        'xst': ['.ngc', '.srp', '.log'],
+        'ngdbuild': ['.ngd', '.bld'],
+        'map': ['_map.ncd', '.pcf', '_map.mrp', '_map.map', '_map.ngm'],
+        'par': ['.ncd', '.par', '.pad', '.twr', '.twx', '.unroutes'],
+        'bitgen': ['.bit', '.bgn', '.drc'],
+        'promgen': ['.mcs', '.prm', '.cfi'],
+    }
 
     def __init__(self, project, user_paths, mode='manual'):
         """
@@ -85,6 +105,43 @@ class Ise(synthesiser.Synthesiser):
         self.bitgen = os.path.join(self.path, 'bitgen')
         self.xflow = os.path.join(self.path, 'xflow')
 
+    def get_report_summary(self, directory):
+        """
+        Return the worst setup slack from the place and route or timing
+        reports and the utilisation of each resource from the map report
+        found in the given *directory*.
+        """
+        summary = super(Ise, self).get_report_summary(directory)
+        for pattern in ['*.par', '*.twr']:
+            for path in self.find_reports(directory, pattern):
+                with open(path, 'r') as f:
+                    for line in f:
+                        match = re.search(
+                            r'\|\s*SETUP\s*\|\s*(-?[\d.]+)ns\|',
+                            line
+                        )
+                        if match is None:
+                            continue
+                        slack = float(match.group(1))
+                        if (
+                            summary['slack'] is None or
+                            slack < summary['slack']
+                        ):
+                            summary['slack'] = slack
+        for path in self.find_reports(directory, '*_map.mrp'):
+            with open(path, 'r') as f:
+                for line in f:
+                    match = re.match(
+                        r'^\s*Number of (.+?):\s+[\d,]+ out of\s+[\d,]+' +
+                        r'\s+(\d+)%',
+                        line
+                    )
+                    if match is not None:
+                        summary['utilisation'][match.group(1)] = float(
+                            match.group(2)
+                        )
+        return summary
+
     @synthesiser.throws_synthesis_exception
     def makeProject(self, projectFilePath, fileFormat='mixed'):
         """
@@ -153,7 +210,14 @@ class Ise(synthesiser.Synthesiser):
         log.info("...done")
 
     @synthesiser.throws_synthesis_exception
-    def synthesise(self, library, entity, fpga_part=None):
+    def synthesise(
+        self,
+        library,
+        entity,
+        fpga_part=None,
+        from_stage=None,
+        to_stage=None
+    ):
         """
         Synthesise the target entity in the given library for the currently
         loaded project.
@@ -164,6 +228,10 @@ class Ise(synthesiser.Synthesiser):
         * Invoke XFLOW or the flow tools individually with appropriate command
           line arguments * Generate reports
         * Archive the outputs of the synthesis flow
+
+        In the manual flow the optional *from_stage* forces the flow to be
+        run from the given stage and the optional *to_stage* stops the flow
+        after the given stage, see *ise_manual_flow*.
         """
         super(Ise, self).synthesise(library, entity, fpga_part)
         # make a temporary working directory for the synth tool
@@ -213,6 +281,11 @@ class Ise(synthesiser.Synthesiser):
             self.addConstraints(entity, synthesisDirectory)
             self.makeProject(projectFilePath)
             if self.mode == 'xflow':
+                if from_stage is not None or to_stage is not None:
+                    raise exceptions.SynthesisException(
+                        'Flow stages can only be selected in the manual ' +
+                        'ISE flow.'
+                    )
                 try:
                     # Run the flow
                     self.ise_xflow(
@@ -230,9 +303,15 @@ class Ise(synthesiser.Synthesiser):
                     log.error(
                         'Synthesis error, storing output in error directory...'
                     )
-                    self.storeOutputs(workingDirectory, 'ERROR_' + archiveName)
+                    self.storeOutputs(
+                        workingDirectory,
+                        'ERROR_' + archiveName,
+                        failed=True
+                    )
                     raise
             elif self.mode == 'manual':
+                # Stage outputs are archived as each stage completes
+                self.begin_archive(workingDirectory)
                 try:
                     # Run the flow
                     self.ise_manual_flow(
@@ -242,15 +321,21 @@ class Ise(synthesiser.Synthesiser):
                         generics,
                         synthesisDirectory,
                         reportDirectory,
-                        exportDirectory
+                        exportDirectory,
+                        from_stage=from_stage,
+                        to_stage=to_stage,
+                        library=library
                     )
-                    self.generate_programming_files(entity, synthesisDirectory)
                 except:
                     # Archive the outputs
                     log.error(
                         'Synthesis error, storing output in error directory...'
                     )
-                    self.storeOutputs(workingDirectory, 'ERROR_' + archiveName)
+                    self.storeOutputs(
+                        workingDirectory,
+                        'ERROR_' + archiveName,
+                        failed=True
+                    )
                     raise
             else:
                 raise exceptions.SynthesisException(
@@ -641,7 +726,10 @@ class Ise(synthesiser.Synthesiser):
         generics,
         workingDirectory,
         reportDirectory,
-        exportDirectory
+        exportDirectory,
+        from_stage=None,
+        to_stage=None,
+        library='work'
     ):
         """
         Execute the manual ISE tool flow in the following order:
@@ -650,16 +738,223 @@ class Ise(synthesiser.Synthesiser):
         #. MAP
         #. PAR
         #. BITGEN
+        #. PROMGEN
 
         Refer to the individual documentation for these tools for more
         information.
+
+        The outputs of each stage are stored in the stage cache of the
+        *entity* in *library*, see *get_stage_directory*, along with a key of
+        the stage inputs. The flow resumes from the first stage whose inputs
+        have changed since it was last run, or from *from_stage* if that is
+        earlier, and the outputs of the stages before it are copied from the
+        stage cache. If *to_stage* is given the flow stops after that stage.
+        Returns the list of stages that were run.
         """
+        stage_directory = self.get_stage_directory(
+            library,
+            entity,
+            part,
+            generics
+        )
+        keys = self.get_stage_keys(entity, part, generics)
+        first = len(self.stages)
+        if from_stage is not None:
+            first = self.stages.index(from_stage)
+        last = len(self.stages) - 1
+        if to_stage is not None:
+            last = self.stages.index(to_stage)
+        resume = 0
+        while resume <= last and resume < first:
+            stage = self.stages[resume]
+            if not self.is_stage_cached(
+                stage_directory, stage, keys[stage], entity
+            ):
+                break
+            self.copy_stage_outputs(
+                stage,
+                entity,
+                stage_directory,
+                workingDirectory
+            )
+            # Another build may have replaced the cached outputs while they
+            # were copied, in which case the stage is run again.
+            if not self.is_stage_cached(
+                stage_directory, stage, keys[stage], entity
+            ):
+                break
+            log.info('Using cached outputs of the {0} stage'.format(stage))
+            self.archive_stage_outputs(stage, entity, workingDirectory)
+            resume += 1
         # XST > NGDBUILD > MAP > PAR > BitGen > PromGen
-        self.ise_xst(part, entity, generics, workingDirectory)
-        self.ise_ngdbuild(part, entity, workingDirectory)
-        self.ise_map(part, entity, workingDirectory)
-        self.ise_par(entity, workingDirectory)
-        self.ise_bitgen(part, entity, workingDirectory)
+        stage_functions = {
+            'xst': lambda: self.ise_xst(
+                part, entity, generics, workingDirectory
+            ),
+            'ngdbuild': lambda: self.ise_ngdbuild(
+                part, entity, workingDirectory
+            ),
+            'map': lambda: self.ise_map(part, entity, workingDirectory),
+            'par': lambda: self.ise_par(entity, workingDirectory),
+            'bitgen': lambda: self.ise_bitgen(part, entity, workingDirectory),
+            'promgen': lambda: self.generate_programming_files(
+                entity, workingDirectory
+            ),
+        }
+        stages_run = self.stages[resume:last + 1]
+        for stage in stages_run:
+            log.info('Running the {0} stage...'.format(stage))
+            stage_functions[stage]()
+            self.store_stage_outputs(
+                stage,
+                entity,
+                keys[stage],
+                workingDirectory,
+                stage_directory
+            )
+            self.archive_stage_outputs(stage, entity, workingDirectory)
+        return stages_run
+
+    def archive_stage_outputs(self, stage, entity, working_directory):
+        """
+        Add the files written by the *stage* for the *entity* in the
+        *working_directory* to the archive of the current build.
+        """
+        self.archive_outputs(
+            os.path.join(working_directory, name)
+            for name in self.get_stage_files(stage, entity)
+        )
+
+    def get_stage_directory(self, library, entity, part, generics):
+        """
+        Return the path to the directory in the synthesis directory where
+        the outputs of each stage of the manual flow for the *entity* in
+        *library* are kept. Builds for different parts or *generics*, such
+        as the points of a synthesis sweep, use different directories so
+        that they do not replace each other's outputs, builds that only
+        differ in their tool arguments share a directory and resume from the
+        first stage whose arguments have changed.
+        """
+        return os.path.join(
+            self.project.get_synthesis_directory(),
+            'stages',
+            self.name,
+            library,
+            entity,
+            artifacts.get_key(part, generics)[:16]
+        )
+
+    def get_stage_keys(self, entity, part, generics):
+        """
+        Return a dictionary of *stage* : *key* where *key* identifies the
+        inputs to the stage of the manual flow. The key of each stage
+        includes the key of the stage before it, so a change to the inputs
+        of a stage also changes the keys of the stages that follow it. The
+        ISE version is included in the key of the first stage so that an ISE
+        update runs every stage again.
+        """
+        keys = {}
+        key = self.get_version()
+        for stage in self.stages:
+            if stage == 'promgen':
+                arguments = sorted(
+                    (k, self.project.config[k])
+                    for k in self.project.get_all_tool_argument_keys(
+                        self.name
+                    )
+                    if k.startswith('args_{0}_promgen'.format(self.name))
+                )
+            else:
+                arguments = self.project.get_tool_arguments(self.name, stage)
+            fields = [key, stage, entity, part, arguments]
+            if stage == 'xst':
+                fields += [generics] + self.get_source_fields(
+                    constraints=False
+                )
+            elif stage == 'ngdbuild':
+                fields += self.get_source_fields(files=False)
+            key = artifacts.get_key(*fields)
+            keys[stage] = key
+        return keys
+
+    def get_stage_files(self, stage, entity):
+        """
+        Return a list of the names of the files written by the *stage* of
+        the manual flow for the *entity*, the first file must exist for the
+        stage to be cached.
+        """
+        if stage == 'promgen':
+            # One file is written for each PROM format, see
+            # *generate_programming_files*.
+            prefix = 'args_{0}_promgen_'.format(self.name)
+            names = [entity + '.mcs']
+            for key in sorted(
+                self.project.get_all_tool_argument_keys(self.name)
+            ):
+                if key.startswith(prefix) and key != prefix + 'mcs':
+                    names.append(entity + '.' + key[len(prefix):])
+            return names + [entity + '.prm', entity + '.cfi']
+        return [entity + suffix for suffix in self.stage_outputs[stage]]
+
+    def is_stage_cached(self, stage_directory, stage, key, entity):
+        """
+        Return True if the outputs of the *stage* stored in the
+        *stage_directory* were made from inputs matching the given *key*.
+        """
+        try:
+            with open(os.path.join(stage_directory, stage + '.key')) as f:
+                if f.read().strip() != key:
+                    return False
+        except (IOError, OSError):
+            return False
+        return os.path.exists(
+            os.path.join(
+                stage_directory,
+                self.get_stage_files(stage, entity)[0]
+            )
+        )
+
+    def copy_stage_outputs(self, stage, entity, source, destination):
+        """
+        Copy the files written by the *stage* for the *entity* that exist in
+        the *source* directory to the *destination* directory.
+        """
+        for name in self.get_stage_files(stage, entity):
+            path = os.path.join(source, name)
+            if os.path.exists(path):
+                shutil.copyfile(path, os.path.join(destination, name))
+
+    def store_stage_outputs(
+        self,
+        stage,
+        entity,
+        key,
+        working_directory,
+        stage_directory
+    ):
+        """
+        Copy the files written by the *stage* in the *working_directory* to
+        the *stage_directory* and record the *key* of the stage inputs. The
+        key is removed while the files are replaced so that an interrupted
+        copy is never reused.
+        """
+        if not os.path.exists(stage_directory):
+            os.makedirs(stage_directory)
+        key_path = os.path.join(stage_directory, stage + '.key')
+        if os.path.exists(key_path):
+            os.remove(key_path)
+        for name in self.get_stage_files(stage, entity):
+            path = os.path.join(stage_directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        self.copy_stage_outputs(
+            stage,
+            entity,
+            working_directory,
+            stage_directory
+        )
+        with open(key_path, 'w') as f:
+            f.write(key)
 
     @synthesiser.throws_synthesis_exception
     def addConstraints(self, entity, synthesisDirectory):
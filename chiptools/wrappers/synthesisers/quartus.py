@@ -1,6 +1,7 @@
 import os
 import logging
 import datetime
+import re
 import shlex
 import traceback
 
@@ -34,6 +35,8 @@ class Quartus(synthesiser.Synthesiser):
     """
     name = 'quartus'
     executables = ['quartus_sh', 'quartus_cpf']
+    version_args = ['--version']
+    report_patterns = ['*.sta.summary', '*.fit.summary']
 
     def __init__(self, project, user_paths):
         """
@@ -97,7 +100,11 @@ class Quartus(synthesiser.Synthesiser):
                 log.error(
                     'Synthesis error, storing output in error directory...'
                 )
-                self.storeOutputs(workingDirectory, 'ERROR_' + archiveName)
+                self.storeOutputs(
+                    workingDirectory,
+                    'ERROR_' + archiveName,
+                    failed=True
+                )
                 raise
             log.info(
                 'Build successful, checking reports for unacceptable ' +
@@ -118,6 +125,45 @@ class Quartus(synthesiser.Synthesiser):
             self.storeOutputs(workingDirectory, archiveName)
             log.info('...done')
 
+    def get_report_summary(self, directory):
+        """
+        Return the worst setup slack from the TimeQuest summary and the
+        utilisation of each resource from the fitter summary found in the
+        given *directory*.
+        """
+        summary = super(Quartus, self).get_report_summary(directory)
+        for path in self.find_reports(directory, '*.sta.summary'):
+            setup = False
+            with open(path, 'r') as f:
+                for line in f:
+                    name, sep, value = line.partition(':')
+                    name = name.strip()
+                    if name == 'Type':
+                        setup = 'Setup' in value
+                    elif name == 'Slack' and setup:
+                        try:
+                            slack = float(value)
+                        except ValueError:
+                            continue
+                        if (
+                            summary['slack'] is None or
+                            slack < summary['slack']
+                        ):
+                            summary['slack'] = slack
+        for path in self.find_reports(directory, '*.fit.summary'):
+            with open(path, 'r') as f:
+                for line in f:
+                    match = re.match(
+                        r'^(.+?)\s*:\s*[\d,]+\s*/\s*[\d,]+\s*' +
+                        r'\(\s*<?\s*(\d+)\s*%\s*\)',
+                        line
+                    )
+                    if match is not None:
+                        summary['utilisation'][match.group(1)] = float(
+                            match.group(2)
+                        )
+        return summary
+
     @synthesiser.throws_synthesis_exception
     def makeProject(
         self,
@@ -1,12 +1,15 @@
 import os
+import re
 import logging
 import datetime
+import shutil
 import sys
 import traceback
 import tempfile
 
 from chiptools.common.filetypes import FileType
 from chiptools.common.exceptions import FileNotFoundError
+from chiptools.core import artifacts
 from chiptools.wrappers import synthesiser
 
 log = logging.getLogger(__name__)
@@ -14,12 +17,27 @@ log = logging.getLogger(__name__)
 
 class Vivado(synthesiser.Synthesiser):
     name = 'vivado'
+    report_patterns = ['*_post_route_timing.rpt', '*_post_route_util.rpt']
+    # Resources reported by *get_report_summary*
+    resources = [
+        'Slice LUTs',
+        'CLB LUTs',
+        'Slice Registers',
+        'CLB Registers',
+        'Block RAM Tile',
+        'DSPs',
+    ]
+    # Names of the files kept in each incremental checkpoint directory
+    synth_checkpoint = 'post_synth.dcp'
+    route_checkpoint = 'post_route.dcp'
+    inputs_key_name = 'inputs.key'
 
     if sys.platform == 'win32':
         vivado_name = 'vivado.bat'
     else:
         vivado_name = 'vivado'
     executables = [vivado_name]
+    version_args = ['-version']
 
     def __init__(self, project, user_paths):
         """
@@ -55,23 +73,62 @@ class Vivado(synthesiser.Synthesiser):
             if os.path.exists(self.project_path):
                 os.remove(self.project_path)
 
+            # In incremental mode the checkpoints of the last good build of
+            # this entity, part and generics are reused. Synthesis is skipped
+            # if none of its inputs have changed since that build.
+            incremental = self.project.get_synthesis_incremental()
+            if incremental:
+                checkpoint_dir = self.get_checkpoint_directory(
+                    entity,
+                    fpga_part,
+                    generics
+                )
+                inputs_key = self.get_inputs_key(entity, fpga_part, generics)
+                synth_checkpoint = os.path.join(
+                    checkpoint_dir,
+                    self.synth_checkpoint
+                ).replace('\\', '/')
+                route_checkpoint = os.path.join(
+                    checkpoint_dir,
+                    self.route_checkpoint
+                ).replace('\\', '/')
+                reuse_synthesis = (
+                    os.path.exists(synth_checkpoint) and
+                    self.read_inputs_key(checkpoint_dir) == inputs_key
+                )
+            else:
+                reuse_synthesis = False
+
             ###################################################################
             # Generate a Vivado TCL script from the source tree:
             # This process is based on the example script provided in ug975
             # Vivado quick reference guide.
             ###################################################################
-            # Step 1: Add source files (HDL, UCF, NGC, XCI)
-            self.add_sources()
-            self.add_constraints()
-            # Step 2: Run synthesis, report utilisation and timing estimates,
-            # write checkpoint.
-            self.synth_design(
-                synthesis_name,
-                fpga_part,
-                entity,
-                generics,
-                *self.project.get_tool_arguments(self.name, 'synthesis')
-            )
+            if reuse_synthesis:
+                log.info(
+                    'Synthesis inputs are unchanged, using checkpoint: ' +
+                    synth_checkpoint
+                )
+                self.write_tcl('open_checkpoint {0}'.format(synth_checkpoint))
+            else:
+                # Step 1: Add source files (HDL, UCF, NGC, XCI)
+                self.add_sources()
+                self.add_constraints()
+                # Step 2: Run synthesis, report utilisation and timing
+                # estimates, write checkpoint.
+                if incremental and os.path.exists(synth_checkpoint):
+                    log.info(
+                        'Using incremental synthesis checkpoint: ' +
+                        synth_checkpoint
+                    )
+                    self.read_incremental_checkpoint(synth_checkpoint)
+                self.synth_design(
+                    synthesis_name,
+                    fpga_part,
+                    entity,
+                    generics,
+                    *self.project.get_tool_arguments(self.name, 'synthesis')
+                )
             self.report_timing(entity + '_post_synth_timing.rpt')
             self.write_checkpoint(entity + '_post_synth.dcp')
             self.report_utilization(entity + '_post_synth_util.rpt')
@@ -79,6 +136,12 @@ class Vivado(synthesiser.Synthesiser):
             # and timing estimates:
             self.write_tcl('opt_design')
             self.write_tcl('power_opt_design')
+            if incremental and os.path.exists(route_checkpoint):
+                log.info(
+                    'Using incremental implementation checkpoint: ' +
+                    route_checkpoint
+                )
+                self.read_incremental_checkpoint(route_checkpoint)
             self.write_tcl('place_design')
             self.write_tcl('phys_opt_design -retime')
             self.write_checkpoint(synthesis_name + '_post_place.dcp')
@@ -119,8 +182,22 @@ class Vivado(synthesiser.Synthesiser):
                 log.error(
                     'Synthesis error, storing output in error directory...'
                 )
-                self.storeOutputs(working_directory, 'ERROR_' + archive_name)
+                self.storeOutputs(
+                    working_directory,
+                    'ERROR_' + archive_name,
+                    failed=True
+                )
                 raise
+            if incremental:
+                self.store_checkpoints(
+                    checkpoint_dir,
+                    inputs_key,
+                    os.path.join(synthesis_dir, entity + '_post_synth.dcp'),
+                    os.path.join(
+                        synthesis_dir,
+                        synthesis_name + '_post_route.dcp'
+                    ),
+                )
             log.info(
                 'Build successful, checking reports for unacceptable ' +
                 'messages...'
@@ -140,6 +217,126 @@ class Vivado(synthesiser.Synthesiser):
             self.storeOutputs(working_directory, archive_name)
             log.info('...done')
 
+    def get_checkpoint_directory(self, entity, fpga_part, generics):
+        """
+        Return the path to the directory in the synthesis directory where
+        the checkpoints of the last good build of the *entity* for the given
+        *fpga_part* and *generics* are kept. Each Vivado version uses its own
+        directory, so checkpoints written by another version are not read.
+        """
+        return os.path.join(
+            self.project.get_synthesis_directory(),
+            'checkpoints',
+            self.name,
+            entity + '_' + artifacts.get_key(
+                self.get_version(),
+                entity,
+                fpga_part,
+                sorted((str(k), str(v)) for k, v in generics.items())
+            )[:16]
+        )
+
+    def get_inputs_key(self, entity, fpga_part, generics):
+        """
+        Return a key identifying the inputs to synthesis of the *entity*:
+        the Vivado version, the contents of the synthesis fileset and
+        constraints, the *fpga_part*, the *generics* and the synthesis tool
+        arguments.
+        """
+        fields = [
+            self.get_version(),
+            entity,
+            fpga_part,
+            sorted((str(k), str(v)) for k, v in generics.items()),
+            self.project.get_tool_arguments(self.name, 'synthesis'),
+        ]
+        fields += self.get_source_fields()
+        return artifacts.get_key(*fields)
+
+    def read_inputs_key(self, checkpoint_dir):
+        """
+        Return the inputs key stored with the checkpoints in the given
+        *checkpoint_dir*, or None if there is no stored key.
+        """
+        try:
+            with open(
+                os.path.join(checkpoint_dir, self.inputs_key_name), 'r'
+            ) as f:
+                return f.read().strip()
+        except (IOError, OSError):
+            return None
+
+    def store_checkpoints(
+        self,
+        checkpoint_dir,
+        inputs_key,
+        synth_checkpoint,
+        route_checkpoint
+    ):
+        """
+        Copy the *synth_checkpoint* and *route_checkpoint* files of a good
+        build to the *checkpoint_dir* and record the *inputs_key* of the
+        build. The key is removed while the checkpoints are replaced so that
+        an interrupted copy is never reused.
+        """
+        if not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+        key_path = os.path.join(checkpoint_dir, self.inputs_key_name)
+        if os.path.exists(key_path):
+            os.remove(key_path)
+        for source, name in [
+            (synth_checkpoint, self.synth_checkpoint),
+            (route_checkpoint, self.route_checkpoint),
+        ]:
+            if not os.path.exists(source):
+                log.warning(
+                    'Checkpoint not found, incremental build data not ' +
+                    'saved: ' + source
+                )
+                return
+            shutil.copyfile(source, os.path.join(checkpoint_dir, name))
+        with open(key_path, 'w') as f:
+            f.write(inputs_key)
+        log.info('Saved incremental build checkpoints to: ' + checkpoint_dir)
+
+    def get_report_summary(self, directory):
+        """
+        Return the worst negative slack from the post route timing summary
+        and the utilisation of the main device resources from the post route
+        utilisation report found in the given *directory*.
+        """
+        summary = super(Vivado, self).get_report_summary(directory)
+        for path in self.find_reports(directory, '*_post_route_timing.rpt'):
+            with open(path, 'r') as f:
+                lines = f.readlines()
+            for index, line in enumerate(lines):
+                if 'WNS(ns)' not in line:
+                    continue
+                # The values follow a line of dashes under the headings
+                for values in lines[index + 1:index + 4]:
+                    try:
+                        summary['slack'] = float(values.split()[0])
+                        break
+                    except (IndexError, ValueError):
+                        continue
+                break
+        for path in self.find_reports(directory, '*_post_route_util.rpt'):
+            with open(path, 'r') as f:
+                for line in f:
+                    match = re.match(
+                        r'^\|\s?(\S[^|]*?)\*?\s*\|.*\|\s*([\d.]+)\s*\|\s*$',
+                        line
+                    )
+                    if match is None:
+                        continue
+                    name = match.group(1)
+                    if (
+                        name in self.resources and
+                        name not in summary['utilisation']
+                    ):
+                        summary['utilisation'][name] = float(match.group(2))
+        return summary
+
     def report_clock_utilization(self, path):
         self.write_tcl('report_clock_utilization -file {0}'.format(path))
 
@@ -152,6 +349,9 @@ class Vivado(synthesiser.Synthesiser):
     def report_timing_summary(self, path):
         self.write_tcl('report_timing_summary -file {0}'.format(path))
 
+    def read_incremental_checkpoint(self, path):
+        self.write_tcl('read_checkpoint -incremental {0}'.format(path))
+
     def write_checkpoint(self, path):
         self.write_tcl('write_checkpoint -force {0}'.format(path))
 
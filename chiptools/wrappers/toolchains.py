@@ -6,8 +6,16 @@ toolchain is not available on the user PATH, or there are multiple versions
 of a toolchain, the .chiptoolsconfig configuration file in the user home
 directory can be updated to point directly to the toolchain installation
 directories.
+
+Toolchain locations found on the PATH are remembered for the lifetime of the
+process. If a toolchain cache file is configured in the [toolchain cache]
+section of the .chiptoolsconfig file the locations are also kept in that file
+between runs, they are discarded when the PATH or the configuration file
+change and each cached location is checked before it is used.
 """
 
+import hashlib
+import json
 import os
 import sys
 import logging
@@ -16,14 +24,22 @@ from chiptools.common.utils import execute
 
 log = logging.getLogger(__name__)
 
+# Dictionary of (PATH, executables) : toolchain path found by get_path
+path_cache = {}
+
 
 class ToolchainBase(object):
 
     executables = []
+    # Arguments passed to the version executable to print the tool version
+    version_args = None
+    # Executable that prints the tool version, the first executable if None
+    version_executable = None
 
     def __init__(self, project, executables, user_paths):
         self.installed = False
         self.project = project
+        self.version = None
         if self.name in user_paths:
             path = user_paths[self.name]
             if os.path.exists(path):
@@ -52,9 +68,47 @@ class ToolchainBase(object):
         # the location of this particular tool.
         # Search the user's PATH for the required binaries to determine if
         # the tool is available.
-        self.path = ToolchainBase.get_path(executables)
+        options = getattr(project, 'options', None)
+        if options is None:
+            self.path = ToolchainBase.get_path(executables)
+        else:
+            self.path = ToolchainBase.get_path(
+                executables,
+                options.get_toolchain_cache(),
+                options.options_md5
+            )
         self.installed = os.path.isdir(self.path)
 
+    def get_version(self):
+        """
+        Return the first line printed by the toolchain when it is asked for
+        its version, or an empty string if the version cannot be determined.
+        The version is only requested from the toolchain once.
+        """
+        if self.version is None:
+            self.version = ''
+            if self.installed and self.version_args is not None:
+                try:
+                    ret, stdout, stderr = self._call(
+                        os.path.join(
+                            self.path,
+                            self.version_executable or self.executables[0]
+                        ),
+                        self.version_args
+                    )
+                    if isinstance(stdout, bytes):
+                        stdout = stdout.decode('utf-8', 'replace')
+                    lines = stdout.strip().splitlines()
+                    if len(lines) > 0:
+                        self.version = lines[0].strip()
+                except Exception:
+                    log.debug(
+                        'Could not determine the {0} version'.format(
+                            self.name
+                        )
+                    )
+        return self.version
+
     @staticmethod
     def environ_paths():
         """
@@ -107,23 +161,95 @@ class ToolchainBase(object):
         return None
 
     @staticmethod
-    def get_path(executables):
+    def get_path(executables, cache_path=None, options_md5=None):
         """
         Return the first path in the PATH environment path list that contains
-        all of the executable names required by this toolchain.
+        all of the executable names required by this toolchain. A toolchain
+        that is found is remembered for the current PATH, and if *cache_path*
+        is given its location is also stored in that file for the current
+        PATH and system configuration file, identified by *options_md5*.
         """
         if len(executables) == 0:
             return ''
-        paths = ToolchainBase.environ_paths()
-        root = ToolchainBase.find_toolchain(executables, paths)
+        environ_path = os.environ.get('PATH', '')
+        key = (environ_path, tuple(executables))
+        if key in path_cache:
+            return path_cache[key]
+        root = None
+        if cache_path is not None:
+            cache_key = hashlib.md5(
+                (environ_path + '\0' + str(options_md5)).encode('utf-8')
+            ).hexdigest()
+            root = ToolchainBase.read_path_cache(
+                cache_path,
+                cache_key,
+                executables
+            )
         if root is None:
-            return ''
-        if os.path.isdir(root):
-            return root
-        return ''
+            paths = ToolchainBase.environ_paths()
+            root = ToolchainBase.find_toolchain(executables, paths)
+            if root is None or not os.path.isdir(root):
+                # Failed lookups are not cached so that a toolchain that is
+                # installed later in the same process is found.
+                return ''
+            if cache_path is not None:
+                ToolchainBase.write_path_cache(
+                    cache_path,
+                    cache_key,
+                    executables,
+                    root
+                )
+        path_cache[key] = root
+        return root
 
     @staticmethod
-    def _call(executable, args=[], cwd=None, quiet=True):
+    def read_path_cache(cache_path, cache_key, executables):
+        """
+        Return the toolchain path stored in the *cache_path* file for the
+        *executables* under *cache_key*, or None if no path is stored or the
+        stored path no longer contains the executables.
+        """
+        try:
+            with open(cache_path, 'r') as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(cache, dict) or cache.get('key') != cache_key:
+            return None
+        root = cache.get('paths', {}).get(os.pathsep.join(executables), None)
+        if root is None:
+            return None
+        if ToolchainBase.find_toolchain(executables, [root]) != root:
+            return None
+        return root
+
+    @staticmethod
+    def write_path_cache(cache_path, cache_key, executables, root):
+        """
+        Store the toolchain path *root* for the *executables* in the
+        *cache_path* file under *cache_key*, replacing paths stored under a
+        different key.
+        """
+        cache = {}
+        try:
+            with open(cache_path, 'r') as f:
+                cache = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+        if not isinstance(cache, dict) or cache.get('key') != cache_key:
+            cache = {'key': cache_key, 'paths': {}}
+        cache['paths'][os.pathsep.join(executables)] = root
+        try:
+            # Replace the file in one step as other processes may read it
+            temp_path = cache_path + '.{0}.tmp'.format(os.getpid())
+            with open(temp_path, 'w') as f:
+                json.dump(cache, f)
+            os.replace(temp_path, cache_path)
+        except (IOError, OSError):
+            log.debug('Could not write the toolchain cache ' + cache_path)
+
+    @staticmethod
+    def _call(executable, args=[], cwd=None, quiet=True, monitor=None):
         log.debug('executing {0} in dir {1} with args {2}'.format(
             executable,
             cwd,
@@ -131,11 +257,22 @@ class ToolchainBase(object):
         ))
         command = [executable]
         command += args
-        ret, stdout, stderr = execute(command, path=cwd, quiet=quiet)
+        ret, stdout, stderr = execute(
+            command,
+            path=cwd,
+            quiet=quiet,
+            monitor=monitor
+        )
         return (ret, stdout, stderr)
 
     @staticmethod
-    def _call_str_args(executable, args='', cwd=None, quiet=True):
+    def _call_str_args(
+        executable,
+        args='',
+        cwd=None,
+        quiet=True,
+        monitor=None
+    ):
         log.debug('executing {0} in dir {1} with args {2}'.format(
             executable,
             cwd,
@@ -143,5 +280,10 @@ class ToolchainBase(object):
         ))
         command = executable
         command += (' ' + args)
-        ret, stdout, stderr = execute(command, path=cwd, quiet=quiet)
+        ret, stdout, stderr = execute(
+            command,
+            path=cwd,
+            quiet=quiet,
+            monitor=monitor
+        )
         return (ret, stdout, stderr)
@@ -17,149 +17,270 @@ from chiptools.wrappers.toolchains import ToolchainBase
 log = logging.getLogger(__name__)
 
 
+# Dictionary of plugin module path : dictionary of tool name : tool class for
+# the plugin modules that have been loaded.
+plugin_modules = {}
+
+
+def load_plugin(
+    path,
+    plugin_subclass,
+    class_filter=['Simulator', 'Synthesiser']
+):
+    """
+    Load the plugin module at *path* and return a dictionary of tool name :
+    tool class for the classes it defines that subclass ToolchainBase and the
+    given *plugin_subclass*. Each module is only loaded once per process.
+    """
+    if path in plugin_modules:
+        return plugin_modules[path]
+    result = {}
+    plugin_modules[path] = result
+    # Load modules with support for Python 2 or 3
+    if sys.version_info < (3, 0, 0):
+        try:
+            module = imp.load_source(
+                'chiptools_wrappers_' + plugin_subclass.__name__ + '_' +
+                os.path.basename(path).split('.')[0],
+                path,
+            )
+        except:
+            log.error(
+                'Plugin module ' +
+                '{0} contains errors and will be disabled:'.format(
+                    os.path.basename(path)
+                )
+            )
+            log.error(traceback.format_exc())
+            return result
+    else:
+        # Use importlib to import the Python file. Plugins that contain syntax
+        # errors or cause other exceptions when imported will be skipped.
+        loader = importlib.machinery.SourceFileLoader(
+            'chiptools_wrappers_' + plugin_subclass.__name__ + '_' +
+            os.path.basename(path).split('.')[0],
+            path,
+        )
+        try:
+            module = loader.load_module()
+        except:
+            log.error(
+                'Plugin module ' +
+                '{0} contains errors and will be disabled:'.format(
+                    os.path.basename(path)
+                )
+            )
+            log.error(traceback.format_exc())
+            return result
+    # Search all members of the loaded module, add any member that
+    # which subclasses ToolchainBase and the given plugin_subclass to
+    # the result dictionary.
+    for name, obj in inspect.getmembers(module):
+        if inspect.isclass(obj):
+            if (
+                issubclass(obj, ToolchainBase) and
+                obj.__name__ not in class_filter
+            ):
+                if issubclass(obj, plugin_subclass):
+                    log.debug(
+                        'Added {0} to plugin library.'.format(
+                            obj
+                        )
+                    )
+                    result[obj.__name__.lower()] = obj
+    return result
+
+
 def plugin_discovery(
     plugin_directory,
     plugin_subclass,
     class_filter=['Simulator', 'Synthesiser']
 ):
     result = {}
-    for path in os.listdir(plugin_directory):
+    for path in sorted(os.listdir(plugin_directory)):
         if path.endswith('.py'):
-            # Load modules with support for Python 2 or 3
-            if sys.version_info < (3, 0, 0):
-                try:
-                    module = imp.load_source(
-                        'chiptools_wrappers_' + plugin_subclass.__name__ + '_' +
-                        os.path.basename(path).split('.')[0],
-                        os.path.join(plugin_directory, path),
-                    )
-                except:
-                    log.error(
-                        'Plugin module ' +
-                        '{0} contains errors and will be disabled:'.format(
-                            os.path.basename(path)
-                        )
-                    )
-                    log.error(traceback.format_exc())
-                    continue
-            else:
-                # Use importlib to import any Python file discovered in the
-                # given plugin directory. Plugins that contain syntax errors or
-                # cause other exceptions when imported will be skipped.
-                loader = importlib.machinery.SourceFileLoader(
-                    'chiptools_wrappers_' + plugin_subclass.__name__ + '_' +
-                    os.path.basename(path).split('.')[0],
+            result.update(
+                load_plugin(
                     os.path.join(plugin_directory, path),
+                    plugin_subclass,
+                    class_filter
                 )
-                try:
-                    module = loader.load_module()
-                except:
-                    log.error(
-                        'Plugin module ' +
-                        '{0} contains errors and will be disabled:'.format(
-                            os.path.basename(path)
-                        )
-                    )
-                    log.error(traceback.format_exc())
-                    continue
-            # Search all members of the loaded module, add any member that
-            # which subclasses ToolchainBase and the given plugin_subclass to
-            # the result dictionary.
-            for name, obj in inspect.getmembers(module):
-                if inspect.isclass(obj):
-                    if (
-                        issubclass(obj, ToolchainBase) and
-                        obj.__name__ not in class_filter
-                    ):
-                        if issubclass(obj, plugin_subclass):
-                            log.debug(
-                                'Added {0} to plugin library.'.format(
-                                    obj
-                                )
-                            )
-                            result[obj.__name__.lower()] = obj
+            )
     return result
 
-synthesis_tool_class_registry = plugin_discovery(
-    os.path.join(os.path.dirname(__file__), 'synthesisers'),
-    Synthesiser,
-)
-simulation_tool_class_registry = plugin_discovery(
-    os.path.join(os.path.dirname(__file__), 'simulators'),
-    Simulator,
-)
+# Plugin directory and base class for each tool type
+plugin_types = {
+    'synthesis': (
+        os.path.join(os.path.dirname(__file__), 'synthesisers'),
+        Synthesiser,
+    ),
+    'simulation': (
+        os.path.join(os.path.dirname(__file__), 'simulators'),
+        Simulator,
+    ),
+}
+# Dictionary of tool type : tool class registry, each registry is discovered
+# when it is first requested.
+tool_class_registries = {}
 
 
-def get_all_tools(project, user_paths, tool_type='synthesis'):
-    """Return all tools of the given type, this could be used for reporting
-    available tools."""
-    if tool_type == 'synthesis':
-        registry = synthesis_tool_class_registry
-    elif tool_type == 'simulation':
-        registry = simulation_tool_class_registry
-    else:
+def get_tool_class_registry(tool_type):
+    """
+    Return a dictionary of tool name : tool class for all of the plugins of
+    the given *tool_type*, or None if the tool type is invalid.
+    """
+    if tool_type not in plugin_types:
         log.error(
             'Invalid tool type specified: {0}'.format(tool_type) +
             ' Use one of [simulation, synthesis]'
         )
         return None
+    if tool_type not in tool_class_registries:
+        plugin_directory, plugin_subclass = plugin_types[tool_type]
+        tool_class_registries[tool_type] = plugin_discovery(
+            plugin_directory,
+            plugin_subclass
+        )
+    return tool_class_registries[tool_type]
+
+
+def get_tool_class(tool_type, tool_name):
+    """
+    Return the tool class for the tool *tool_name* of the given *tool_type*,
+    or None if there is no plugin for the tool. Plugins are usually named
+    after their tool, so the plugin module with the name of the tool is
+    loaded first and the other plugins are only loaded if it does not
+    provide the tool.
+    """
+    if tool_type in plugin_types and tool_type not in tool_class_registries:
+        plugin_directory, plugin_subclass = plugin_types[tool_type]
+        path = os.path.join(plugin_directory, str(tool_name) + '.py')
+        if os.path.isfile(path):
+            tool_class = load_plugin(path, plugin_subclass).get(
+                tool_name,
+                None
+            )
+            if tool_class is not None:
+                return tool_class
+    registry = get_tool_class_registry(tool_type)
+    if registry is None:
+        return None
+    return registry.get(tool_name, None)
+
+
+def load_tool(project, user_paths, tool_class, tool_type='synthesis'):
+    """
+    Return an instance of *tool_class* for the *project*, or None if the tool
+    wrapper could not be instanced.
+    """
+    try:
+        inst = tool_class(project, user_paths)
+    except:
+        # Error instancing this tool.
+        log.error(
+            'Encountered an error when loading tool wrapper: ' +
+            tool_class.__name__.lower()
+        )
+        log.error(traceback.format_exc())
+        return None
+    if not inst.installed:
+        log.warning(
+            inst.name.capitalize() +
+            ' ' + tool_type + ' tool' +
+            ' could not be found.' +
+            ' Update .chiptoolsconfig or your PATH variable'
+        )
+    return inst
+
+
+def get_all_tools(project, user_paths, tool_type='synthesis'):
+    """Return all tools of the given type, this could be used for reporting
+    available tools."""
+    registry = get_tool_class_registry(tool_type)
+    if registry is None:
+        return None
 
     tools = {}
     for toolname, inst_fn in registry.items():
-        try:
-            inst = inst_fn(project, user_paths)
-            if not inst.installed:
-                log.warning(
-                    toolname.capitalize() +
-                    ' ' + tool_type + ' tool' +
-                    ' could not be found.' +
-                    ' Update .chiptoolsconfig or your PATH variable'
-                )
+        inst = load_tool(project, user_paths, inst_fn, tool_type)
+        if inst is not None:
             tools[toolname] = inst
-        except:
-            # Error instancing this tool.
-            log.error(
-                'Encountered an error when loading tool wrapper: ' +
-                toolname
-            )
-            log.error(traceback.format_exc())
     return tools
 
 
 class ToolWrapper:
     """
-    ToolWrapper holds instances of all available toolchains and provides a
+    ToolWrapper holds instances of the available toolchains and provides a
     method of retrieving the tool currently specified in the loaded project
-    file.
+    file. Toolchains are only located and instanced when they are first
+    requested.
     """
     def __init__(self, project, user_paths={}):
         self.project = project
-        self.synthesisers = get_all_tools(
-            self.project,
-            user_paths,
-            tool_type='synthesis'
-        )
-        self.simulators = get_all_tools(
-            self.project,
-            user_paths,
-            tool_type='simulation'
-        )
+        self.user_paths = user_paths
+        # Dictionary of (tool type, tool name) : tool instance for the tools
+        # that have been requested.
+        self.tools = {}
+
+    @property
+    def synthesisers(self):
+        return self.get_all_tools('synthesis')
+
+    @property
+    def simulators(self):
+        return self.get_all_tools('simulation')
+
+    def get_all_tools(self, tool_type='synthesis'):
+        """
+        Return a dictionary of tool name : tool instance for all tools of the
+        given *tool_type*.
+        """
+        registry = get_tool_class_registry(tool_type)
+        if registry is None:
+            return None
+        tools = {}
+        for tool_name in registry:
+            tool = self.load_tool(tool_type, tool_name)
+            if tool is not None:
+                tools[tool_name] = tool
+        return tools
+
+    def load_tool(self, tool_type, tool_name):
+        """
+        Return the instance of the tool *tool_name* of the given *tool_type*,
+        the tool is instanced when it is first requested. None is returned if
+        there is no plugin for the tool.
+        """
+        key = (tool_type, tool_name)
+        if key not in self.tools:
+            tool_class = get_tool_class(tool_type, tool_name)
+            tool = None
+            if tool_class is not None:
+                tool = load_tool(
+                    self.project,
+                    self.user_paths,
+                    tool_class,
+                    tool_type
+                )
+            self.tools[key] = tool
+        return self.tools[key]
 
     def get_tool(self, tool_type='synthesis', tool_name=None):
         if tool_type == 'synthesis':
             if tool_name is None:
                 tool_name = self.project.get_synthesis_tool_name()
-            tool = self.synthesisers.get(tool_name, None)
         elif tool_type == 'simulation':
             if tool_name is None:
                 tool_name = self.project.get_simulation_tool_name()
-            tool = self.simulators.get(tool_name, None)
         else:
             raise ValueError(
                 "Unsupported tool_type: {0} specified.".format(
                     tool_type
                 )
             )
+        tool = None
+        if tool_name is not None:
+            tool = self.load_tool(tool_type, tool_name)
         if tool is None:
             log.error(
                 'No wrapper exists for the tool: ' + str(tool_name)
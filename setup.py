@@ -87,6 +87,10 @@ extras_require = {
     ':sys_platform=="win32"': [
         'colorama',
     ],
+    # zstd compression of synthesis archives
+    'zstd': [
+        'zstandard',
+    ],
 }
 
 # for sdist installation with pip-1.5.6
@@ -0,0 +1,76 @@
+"""
+The fake_tools module provides a base class for tests that run fake tool
+executables in place of the vendor tools. The fake tools are Python scripts
+written to a *bin* directory in a temporary directory that is added to the
+front of the PATH, so these tests do not require any vendor tools to be
+installed.
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import stat
+import tempfile
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.core.project import Project
+
+
+class FakeToolTestCase(unittest.TestCase):
+    """
+    A FakeToolTestCase creates a temporary *root* directory containing the
+    *bin_path* directory for fake tools and adds it to the PATH for the
+    duration of each test. The directory, the PATH and any projects loaded
+    by *load_project* are cleaned up when the test completes.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.bin_path = os.path.join(self.root, 'bin')
+        os.makedirs(self.bin_path)
+        # Worker processes inherit the environment of this process
+        self.addCleanup(os.environ.__setitem__, 'PATH', os.environ['PATH'])
+        os.environ['PATH'] = self.bin_path + os.pathsep + os.environ['PATH']
+
+    def write_tools(self, names, script, **fields):
+        """
+        Write the Python *script* as an executable fake tool for each of the
+        tool *names*. The script is formatted with the given *fields*, so
+        braces in the script must be doubled.
+        """
+        for name in names:
+            path = os.path.join(self.bin_path, name)
+            with open(path, 'w') as f:
+                f.write('#!' + sys.executable + '\n' + script.format(**fields))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+    def write_files(self, files):
+        """
+        Write each of the *files* given as a dictionary of *path* : *data*,
+        relative to the root directory.
+        """
+        for name, data in files.items():
+            path = os.path.join(self.root, name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(data)
+
+    def change_directory(self):
+        """Make the root directory the working directory for the test."""
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.root)
+
+    def load_project(self, name='project.xml'):
+        """
+        Return a new Project loaded from the project file with the given
+        *name* in the root directory.
+        """
+        project = Project()
+        self.addCleanup(project.cache.close)
+        project.load_project(os.path.join(self.root, name))
+        return project
@@ -0,0 +1,170 @@
+"""
+The tests in this module check the compiled library artifact store and its
+use by the simulator compile flow. These tests do not require any vendor tools
+to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import shutil
+import tempfile
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.core import artifacts
+from chiptools.core.artifacts import ArtifactStore
+from chiptools.core.project import Project
+from chiptools.wrappers.simulator import Simulator
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+PACKAGE_DATA = """
+package pkg_a is
+end package;
+"""
+
+ENTITY_DATA = """
+library lib_a;
+    use lib_a.pkg_a.all;
+entity ent_b is
+end entity;
+"""
+
+
+class OutputSimulator(Simulator):
+    """A simulator that writes a file into the library for each compile."""
+    name = 'output'
+    executables = []
+
+    def __init__(self, project):
+        super(OutputSimulator, self).__init__(project, self.executables, {})
+        self.version = 'output 1.0'
+        self.compiled = []
+
+    def compile(self, file_object, cwd=None):
+        name = os.path.basename(file_object.path)
+        self.compiled.append(name)
+        with open(os.path.join(cwd, file_object.library, name), 'w') as f:
+            f.write('compiled')
+
+    def add_library(self, library):
+        path = os.path.join(self.project.get_simulation_directory(), library)
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def set_working_library(self, library, cwd=None):
+        pass
+
+    def set_library_path(self, library, path, cwd=None):
+        pass
+
+
+class TestArtifactStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.root, 'store')
+        self.work = os.path.join(self.root, 'work')
+        os.makedirs(os.path.join(self.work, 'lib'))
+        with open(os.path.join(self.work, 'lib', 'unit'), 'w') as f:
+            f.write('x' * 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_parse_size(self):
+        self.assertEqual(artifacts.parse_size('100'), 100)
+        self.assertEqual(artifacts.parse_size('2K'), 2048)
+        self.assertEqual(artifacts.parse_size('1.5G'), int(1.5 * 2**30))
+        self.assertEqual(artifacts.parse_size(None), None)
+
+    def test_store_restore(self):
+        store = ArtifactStore(self.store_path)
+        self.assertFalse(store.restore('key', self.work, ['lib']))
+        store.store('key', self.work, ['lib', 'missing'])
+        self.assertTrue(store.contains('key'))
+        target = os.path.join(self.root, 'target')
+        os.makedirs(os.path.join(target, 'lib'))
+        with open(os.path.join(target, 'lib', 'stale'), 'w') as f:
+            f.write('stale')
+        self.assertTrue(store.restore('key', target, ['lib']))
+        self.assertEqual(os.listdir(os.path.join(target, 'lib')), ['unit'])
+
+    def test_eviction(self):
+        store = ArtifactStore(self.store_path, max_size=250)
+        for key in ['a', 'b', 'c']:
+            store.store(key, self.work, ['lib'])
+            # Ensure the entries have distinct last used times
+            marker = os.path.join(store.entry_path(key), store.marker_name)
+            os.utime(marker, (len(store.get_entries()),) * 2)
+            store.evict()
+        self.assertFalse(store.contains('a'))
+        self.assertTrue(store.contains('b'))
+        self.assertTrue(store.contains('c'))
+
+
+class TestLibraryRestore(unittest.TestCase):
+
+    sources = [
+        ('lib_a', 'pkg_a.vhd', PACKAGE_DATA),
+        ('lib_b', 'ent_b.vhd', ENTITY_DATA),
+    ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = ArtifactStore(os.path.join(self.root, 'store'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def create_project(self, name):
+        root = os.path.join(self.root, name)
+        os.makedirs(os.path.join(root, 'simulation'))
+        project = Project(root=root)
+        project.add_config('simulation_directory', 'simulation')
+        project.set_cache_path(os.path.join(root, '.test'))
+        project.get_artifact_store = lambda: self.store
+        for library, path, data in self.sources:
+            with open(os.path.join(root, path), 'w') as f:
+                f.write(data)
+            project.add_file(path, library=library)
+        return project
+
+    def test_restore(self):
+        simulator = OutputSimulator(self.create_project('first'))
+        simulator.compile_project()
+        self.assertEqual(simulator.compiled, ['pkg_a.vhd', 'ent_b.vhd'])
+        # An identical project in another workspace restores the libraries
+        project = self.create_project('second')
+        simulator = OutputSimulator(project)
+        simulator.compile_project()
+        self.assertEqual(simulator.compiled, [])
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(
+                    project.get_simulation_directory(),
+                    'lib_b',
+                    'ent_b.vhd'
+                )
+            )
+        )
+        # Changing a file recompiles it and invalidates its dependents
+        with open(os.path.join(project.root, 'pkg_a.vhd'), 'a') as f:
+            f.write('-- modified\n')
+        simulator.compile_project()
+        self.assertEqual(simulator.compiled, ['pkg_a.vhd', 'ent_b.vhd'])
+
+    def test_unknown_version(self):
+        simulator = OutputSimulator(self.create_project('first'))
+        simulator.version = ''
+        simulator.compile_project()
+        self.assertEqual(self.store.get_entries(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+The tests in this module check that a synthesis build is skipped when a
+successful archive built from the same inputs exists. A fake Vivado
+executable is used so these tests do not require any vendor tools to be
+installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import tarfile
+import tempfile
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from tests.fake_tools import FakeToolTestCase
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+PROJECT = """
+<project>
+    <config synthesis_directory='synthesis'/>
+    <config part='xc7a35tcpg236-1'/>
+    <library name='lib'>
+        <file path='top.vhd'{args}/>
+    </library>
+</project>
+"""
+
+# A fake Vivado executable that counts the builds it runs and reports the
+# version given by the VIVADO_VERSION environment variable.
+VIVADO = """import os
+import sys
+if '-version' in sys.argv:
+    print(os.environ.get('VIVADO_VERSION', 'Vivado v1'))
+    sys.exit(0)
+with open({log!r}, 'a') as f:
+    f.write('build\\n')
+"""
+
+
+@unittest.skipIf(sys.platform == 'win32', 'The fake tools are not executable')
+class TestBuildFingerprint(FakeToolTestCase):
+
+    def setUp(self):
+        super(TestBuildFingerprint, self).setUp()
+        self.log_path = os.path.join(self.root, 'builds.log')
+        os.makedirs(os.path.join(self.root, 'synthesis'))
+        self.write_tools(['vivado'], VIVADO, log=self.log_path)
+        self.write_files({
+            'project.xml': PROJECT.format(args=''),
+            'args.xml': PROJECT.format(args=" args_vivado_synthesis='-x'"),
+        })
+        self.write_source('entity top is\nend entity;\n')
+        self.project = self.load_project()
+
+    def tearDown(self):
+        os.environ.pop('VIVADO_VERSION', None)
+
+    def write_source(self, text):
+        with open(os.path.join(self.root, 'top.vhd'), 'w') as f:
+            f.write(text)
+
+    def get_builds(self):
+        if not os.path.exists(self.log_path):
+            return 0
+        with open(self.log_path, 'r') as f:
+            return len(f.readlines())
+
+    def synthesise(self, **kwargs):
+        return self.project.synthesise(
+            'lib',
+            'top',
+            tool_name='vivado',
+            **kwargs
+        )
+
+    def test_fingerprint(self):
+        tool = self.project._get_tool('vivado', tool_type='synthesis')
+        fingerprint = tool.get_fingerprint('lib', 'top')
+        self.assertEqual(tool.get_version(), 'Vivado v1')
+        archive_path = self.synthesise()
+        self.assertEqual(self.get_builds(), 1)
+        # The fingerprint is stored in the archive
+        with tarfile.open(archive_path, 'r') as archive:
+            name = [
+                n for n in archive.getnames()
+                if n.endswith(tool.fingerprint_name)
+            ][0]
+            self.assertEqual(
+                archive.extractfile(name).read().decode().strip(),
+                fingerprint
+            )
+        # An unchanged build returns the existing archive
+        self.assertEqual(self.synthesise(), archive_path)
+        self.assertEqual(self.get_builds(), 1)
+        self.assertEqual(tool.find_archive(fingerprint), archive_path)
+        # The build can be forced
+        self.synthesise(force=True)
+        self.assertEqual(self.get_builds(), 2)
+        # Any change to the inputs changes the fingerprint
+        for change in [
+            lambda: self.write_source('entity top is\nend entity top;\n'),
+            lambda: self.project.add_generic('width', 8),
+            lambda: self.project.add_config('args_vivado_place', '-x'),
+        ]:
+            change()
+            self.assertNotEqual(
+                tool.get_fingerprint('lib', 'top'),
+                fingerprint
+            )
+            fingerprint = tool.get_fingerprint('lib', 'top')
+        self.assertNotEqual(
+            tool.get_fingerprint('lib', 'top', 'xc7a100tcsg324-1'),
+            fingerprint
+        )
+        tool.version = 'Vivado v2'
+        self.assertNotEqual(tool.get_fingerprint('lib', 'top'), fingerprint)
+
+    def test_file_arguments(self):
+        # Tool arguments given for a file change the fingerprint
+        fingerprints = []
+        for project in [self.project, self.load_project('args.xml')]:
+            tool = project._get_tool('vivado', tool_type='synthesis')
+            fingerprints.append(tool.get_fingerprint('lib', 'top'))
+        self.assertNotEqual(fingerprints[0], fingerprints[1])
+
+    def test_failed_build(self):
+        # Archives of failed builds are never reused
+        tool = self.project._get_tool('vivado', tool_type='synthesis')
+        fingerprint = tool.get_fingerprint('lib', 'top')
+        tool.fingerprint = fingerprint
+        working_directory = tempfile.mkdtemp(
+            dir=os.path.join(self.root, 'synthesis')
+        )
+        tool.storeOutputs(working_directory, 'ERROR_top.tar', failed=True)
+        self.assertTrue(os.path.exists(tool.archive_path))
+        self.assertIsNone(tool.find_archive(fingerprint))
+
+
+if __name__ == '__main__':
+    unittest.main()
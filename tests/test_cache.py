@@ -0,0 +1,112 @@
+"""
+The tests in this module check the change detection performed by the FileCache.
+These tests do not require any vendor tools to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import shutil
+import tempfile
+import hashlib
+import pickle
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.core import cache
+from chiptools.core.cache import FileCache
+from chiptools.common.filetypes import File
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+
+class CountingHashlib(object):
+    """Stand-in for the hashlib module that counts calls to md5."""
+    def __init__(self):
+        self.count = 0
+
+    def md5(self, data):
+        self.count += 1
+        return hashlib.md5(data)
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.root, '.test')
+        self.path = os.path.join(self.root, 'source.vhd')
+        with open(self.path, 'w') as f:
+            f.write('entity source is\nend entity;\n')
+        self.file_object = File('lib', path=self.path)
+        self.hashlib = CountingHashlib()
+        cache.hashlib = self.hashlib
+
+    def tearDown(self):
+        cache.hashlib = hashlib
+        shutil.rmtree(self.root)
+
+    def test_single_hash_per_pass(self):
+        file_cache = FileCache(self.cache_path)
+        self.assertTrue(file_cache.is_file_changed(self.file_object, 'tool'))
+        file_cache.add_file(self.file_object, 'tool')
+        file_cache.add_file(self.file_object, 'tool')
+        self.assertEqual(self.hashlib.count, 1)
+
+    def test_unchanged_signature(self):
+        file_cache = FileCache(self.cache_path)
+        file_cache.add_file(self.file_object, 'tool')
+        file_cache.save_cache()
+        self.hashlib.count = 0
+        file_cache = FileCache(self.cache_path)
+        self.assertFalse(file_cache.is_file_changed(self.file_object, 'tool'))
+        self.assertEqual(self.hashlib.count, 0)
+
+    def test_touched_file(self):
+        file_cache = FileCache(self.cache_path)
+        file_cache.add_file(self.file_object, 'tool')
+        file_cache.save_cache()
+        os.utime(self.path, (0, 0))
+        self.hashlib.count = 0
+        file_cache = FileCache(self.cache_path)
+        self.assertFalse(file_cache.is_file_changed(self.file_object, 'tool'))
+        self.assertEqual(self.hashlib.count, 1)
+        # The new signature is recorded so the file is not hashed again
+        self.assertFalse(file_cache.is_file_changed(self.file_object, 'tool'))
+        self.assertEqual(self.hashlib.count, 1)
+
+    def test_modified_file(self):
+        file_cache = FileCache(self.cache_path)
+        file_cache.add_file(self.file_object, 'tool')
+        with open(self.path, 'a') as f:
+            f.write('-- modified\n')
+        self.assertTrue(file_cache.is_file_changed(self.file_object, 'tool'))
+
+    def test_shared_cache(self):
+        # Entries are committed as they are added, so a second process using
+        # the same cache file sees them immediately.
+        writer = FileCache(self.cache_path)
+        reader = FileCache(self.cache_path)
+        writer.add_library('lib', 'tool')
+        writer.add_file(self.file_object, 'tool')
+        self.assertTrue(reader.library_in_cache('lib', 'tool'))
+        self.assertFalse(reader.is_file_changed(self.file_object, 'tool'))
+        writer.remove_file(self.file_object, 'tool')
+        self.assertTrue(reader.is_file_changed(self.file_object, 'tool'))
+
+    def test_legacy_cache(self):
+        # Caches written by older versions were a Pickled dictionary
+        with open(self.cache_path + FileCache.cache_file_name, 'wb') as f:
+            pickle.dump({'tool': {'LIBRARIES': set(['lib'])}}, f)
+        file_cache = FileCache(self.cache_path)
+        self.assertEqual(file_cache.get_tool_names(), [])
+        file_cache.add_library('lib', 'tool')
+        self.assertEqual(file_cache.get_tool_names(), ['tool'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+"""
+The tests in this module check that ChipTools commands can be run from the
+system command line without starting the interactive command line, and that
+modules which are only needed by some commands are not imported at startup.
+These tests do not require any vendor tools to be installed.
+"""
+
+import unittest
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+
+testroot = os.path.dirname(__file__) or '.'
+package_root = os.path.abspath(os.path.join(testroot, os.path.pardir))
+sys.path.insert(0, package_root)
+
+from chiptools.core import cli
+from tests.fake_tools import FakeToolTestCase
+
+PROJECT = """
+<project>
+    <library name='lib'>
+        <file path='a.vhd'/>
+    </library>
+</project>
+"""
+
+TEST_PROJECT = """
+<project>
+    <config simulation_directory='simulation'/>
+    <config simulator='ghdl'/>
+    <unittest path='{tests}'/>
+    <library name='lib_tb'>
+        <file path='tb.vhd'/>
+    </library>
+</project>
+"""
+
+TESTS = """
+from chiptools.testing.testloader import ChipToolsTest
+
+class CommandTests(ChipToolsTest):
+    entity = 'tb'
+    library = 'lib_tb'
+
+    def test_pass(self):
+        self.assertTrue(True)
+"""
+
+FAILING_TESTS = TESTS + """
+    def test_fail(self):
+        self.assertTrue(False)
+"""
+
+
+def run_python(cwd, *args):
+    """
+    Run Python with the given arguments in the *cwd* directory and return a
+    tuple of (*return code*, *stdout*, *stderr*).
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = package_root + os.pathsep + env.get(
+        'PYTHONPATH', ''
+    )
+    process = subprocess.Popen(
+        [sys.executable] + list(args),
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    stdout, stderr = process.communicate()
+    return process.returncode, stdout, stderr
+
+
+class TestCommandMode(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        with open(os.path.join(self.root, 'project.xml'), 'w') as f:
+            f.write(PROJECT)
+        with open(os.path.join(self.root, 'a.vhd'), 'w') as f:
+            f.write('entity a is\nend entity;\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_python(self, *args):
+        return run_python(self.root, *args)
+
+    def run_chiptools(self, *args):
+        return self.run_python('-m', 'chiptools.chiptools_main', *args)
+
+    def test_command(self):
+        ret, stdout, stderr = self.run_chiptools(
+            '--profile-startup',
+            '-p', 'project.xml',
+            'show_synthesis_fileset'
+        )
+        self.assertEqual(ret, 0)
+        self.assertIn('a.vhd', stdout)
+        self.assertIn('Startup profile:', stderr)
+        for phase in ['import cli', 'load project', 'show_synthesis_fileset']:
+            self.assertIn(phase, stderr)
+
+    def test_errors(self):
+        ret, stdout, stderr = self.run_chiptools('unknown_command')
+        self.assertEqual(ret, 2)
+        self.assertIn('unknown command', stderr)
+        ret, stdout, stderr = self.run_chiptools('-p', 'missing.xml', 'pwd')
+        self.assertEqual(ret, 1)
+        # A command that raises an error sets the exit status
+        ret, stdout, stderr = self.run_chiptools('simulate', 'lib.a', 'x')
+        self.assertEqual(ret, 1)
+
+    def test_deferred_imports(self):
+        ret, stdout, stderr = self.run_python(
+            '-c',
+            'import sys\n' +
+            'import chiptools.core.cli\n' +
+            'print(\' \'.join(sorted(sys.modules)))'
+        )
+        self.assertEqual(ret, 0)
+        modules = stdout.split()
+        for name in [
+            'unittest',
+            'chiptools.testing.distributed',
+            'chiptools.testing.parallel',
+            'chiptools.testing.custom_runners.HTMLTestRunner',
+            'chiptools.core.preprocessor',
+            'chiptools.core.reporter',
+            'chiptools.core.package_builder',
+        ]:
+            self.assertNotIn(name, modules)
+
+
+@unittest.skipIf(sys.platform == 'win32', 'The fake tools are not executable')
+class TestRunTestsCommand(FakeToolTestCase):
+
+    def setUp(self):
+        super(TestRunTestsCommand, self).setUp()
+        # A fake ghdl that compiles and simulates successfully
+        self.write_tools(['ghdl'], '')
+        self.write_files({
+            'passing.xml': TEST_PROJECT.format(tests='passing_tests.py'),
+            'failing.xml': TEST_PROJECT.format(tests='failing_tests.py'),
+            'passing_tests.py': TESTS,
+            'failing_tests.py': FAILING_TESTS,
+            'tb.vhd': 'entity tb is\nend entity;\n',
+        })
+        os.makedirs(os.path.join(self.root, 'simulation'))
+
+    def run_tests(self, project, *args):
+        ret, stdout, stderr = run_python(
+            self.root,
+            '-m', 'chiptools.chiptools_main',
+            '-p', project,
+            'run_tests',
+            *args
+        )
+        return ret
+
+    def test_exit_status(self):
+        self.assertEqual(self.run_tests('passing.xml'), 0)
+        self.assertEqual(self.run_tests('failing.xml'), 1)
+        self.assertEqual(self.run_tests('passing.xml', 'ghdl', '-j', '2'), 0)
+        self.assertEqual(self.run_tests('failing.xml', 'ghdl', '-j', '2'), 1)
+
+    def test_load_project(self):
+        # Tests can be run in parallel in a project loaded by the command line
+        self.change_directory()
+        command_line = cli.CommandLine()
+        self.addCleanup(command_line.project.cache.close)
+        command_line.onecmd('load_project passing.xml')
+        self.assertTrue(os.path.samefile(
+            command_line.project.project_path,
+            os.path.join(self.root, 'passing.xml')
+        ))
+        command_line.onecmd('run_tests ghdl -j 2')
+        self.assertFalse(command_line.failed)
+        # The JUnit report is only written by the parallel test runner
+        self.assertTrue(
+            os.path.exists(os.path.join(self.root, 'simulation', 'report.xml'))
+        )
+
+
+class TestCommandArguments(unittest.TestCase):
+
+    def test_quoting(self):
+        elems = ['my lib.top', 'vivado', 'path with spaces/a.xdc', '']
+        self.assertEqual(cli.split_command(cli.join_command(elems)), elems)
+        self.assertEqual(
+            cli.parse_jobs('"ghdl sim" -j 4 "a b"'),
+            (4, cli.join_command(['ghdl sim', 'a b']))
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
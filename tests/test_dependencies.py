@@ -0,0 +1,415 @@
+"""
+The tests in this module check the HDL dependency scanner, the dependency graph
+and the parallel compilation scheduler. These tests do not require any vendor
+tools to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import shutil
+import tempfile
+import threading
+import time
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.common.exceptions import ExecutionError
+from chiptools.common.filetypes import File
+from chiptools.core import dependencies
+from chiptools.core.cache import FileCache
+from chiptools.core.scheduler import JobScheduler
+from chiptools.core.project import Project
+from chiptools.wrappers.simulator import Simulator
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+PACKAGE_DATA = """
+library ieee;
+    use ieee.std_logic_1164.all;
+package pkg_a is
+    constant WIDTH : integer := 8;
+end package;
+package body pkg_a is
+end package body;
+"""
+
+ENTITY_DATA = """
+library ieee;
+    use ieee.std_logic_1164.all;
+library lib_a;
+    use lib_a.pkg_a.all;
+-- entity commented_out is
+entity ent_b is
+end entity;
+architecture rtl of ent_b is
+begin
+end rtl;
+"""
+
+TOP_DATA = """
+library lib_b;
+entity top is
+end entity;
+architecture rtl of top is
+begin
+    u0 : entity lib_b.ent_b;
+    u1 : entity work.local;
+end rtl;
+"""
+
+LOCAL_DATA = """
+entity local is
+end entity;
+architecture rtl of local is
+begin
+end rtl;
+"""
+
+SV_PACKAGE_DATA = """
+package sv_pkg;
+    parameter WIDTH = 8;
+endpackage
+"""
+
+COMPONENT_DATA = """
+entity top is
+end entity;
+architecture rtl of top is
+    component ent_b is
+    end component;
+begin
+    u0 : ent_b;
+end rtl;
+"""
+
+SV_MODULE_DATA = """
+// module commented_out;
+`include "defines.vh"
+module sv_top;
+    import sv_pkg::*;
+endmodule
+"""
+
+
+class DummySimulator(Simulator):
+    """A simulator that records the order in which files are compiled."""
+    name = 'dummy'
+    executables = []
+
+    def __init__(self, project):
+        super(DummySimulator, self).__init__(project, self.executables, {})
+        self.compiled = []
+        self.active = 0
+        self.max_active = 0
+
+    def compile(self, file_object, cwd=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+            self.compiled.append(os.path.basename(file_object.path))
+
+    def add_library(self, library):
+        os.makedirs(
+            os.path.join(self.project.get_simulation_directory(), library)
+        )
+
+    def set_working_library(self, library, cwd=None):
+        pass
+
+    def set_library_path(self, library, path, cwd=None):
+        pass
+
+
+class BatchSimulator(DummySimulator):
+    """A simulator that records batches and fails to compile bad files."""
+
+    def __init__(self, project):
+        super(BatchSimulator, self).__init__(project)
+        self.batches = []
+        self.bad = None
+
+    def compile_batch(self, file_objects, cwd=None):
+        names = [os.path.basename(f.path) for f in file_objects]
+        self.batches.append(names)
+        if self.bad in names:
+            raise ExecutionError('Error: ' + self.bad + '(3): syntax error')
+
+
+class TestDependencyScanner(unittest.TestCase):
+
+    def test_vhdl_package(self):
+        units = dependencies.scan_vhdl(PACKAGE_DATA, 'lib_a')
+        self.assertEqual(units.provides, set([('lib_a', 'pkg_a')]))
+        self.assertEqual(units.requires, set([('ieee', 'std_logic_1164')]))
+
+    def test_vhdl_entity(self):
+        units = dependencies.scan_vhdl(ENTITY_DATA, 'lib_b')
+        self.assertEqual(units.provides, set([('lib_b', 'ent_b')]))
+        self.assertIn(('lib_a', 'pkg_a'), units.requires)
+        self.assertNotIn(('lib_b', 'ent_b'), units.requires)
+
+    def test_vhdl_instance(self):
+        units = dependencies.scan_vhdl(TOP_DATA, 'lib_c')
+        self.assertIn(('lib_b', 'ent_b'), units.requires)
+        # References to work resolve to the library of the file
+        self.assertIn(('lib_c', 'local'), units.requires)
+
+    def test_vhdl_component(self):
+        units = dependencies.scan_vhdl(COMPONENT_DATA, 'lib_a')
+        # Components are bound at elaboration so they are not requirements
+        self.assertEqual(units.references, set([(None, 'ent_b')]))
+        self.assertNotIn((None, 'ent_b'), units.requires)
+
+    def test_verilog(self):
+        units = dependencies.scan_verilog(SV_MODULE_DATA, 'work')
+        self.assertEqual(units.provides, set([('work', 'sv_top')]))
+        self.assertEqual(units.requires, set([(None, 'sv_pkg')]))
+        self.assertEqual(units.includes, set(['defines.vh']))
+
+
+class TestDependencyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project = Project(root=self.root)
+        self.project.set_cache_path(os.path.join(self.root, '.test'))
+        self.path = os.path.join(self.root, 'pkg_a.vhd')
+        with open(self.path, 'w') as f:
+            f.write(PACKAGE_DATA)
+        self.project.add_file(self.path, library='lib_a')
+        self.scanned = []
+        self.scan_data = dependencies.scan_data
+
+        def counting_scan_data(data, file_object):
+            self.scanned.append(file_object.path)
+            return self.scan_data(data, file_object)
+        dependencies.scan_data = counting_scan_data
+
+    def tearDown(self):
+        dependencies.scan_data = self.scan_data
+        self.project.cache.close()
+        shutil.rmtree(self.root)
+
+    def test_warm_index(self):
+        file_object = self.project.get_files()[0]
+        self.project.get_dependency_graph()
+        self.assertEqual(self.scanned, [self.path])
+        # A new index loaded from the cache file does not scan the file again
+        cache = FileCache(os.path.join(self.root, '.test'))
+        try:
+            index = dependencies.DependencyIndex(cache)
+            units = index.scan(file_object)
+        finally:
+            cache.close()
+        self.assertEqual(units.provides, set([('lib_a', 'pkg_a')]))
+        self.assertEqual(self.scanned, [self.path])
+        # The index is stored in the compilation cache rather than a file of
+        # its own
+        self.assertFalse(
+            os.path.exists(os.path.join(self.root, '.test_dependencies.cache'))
+        )
+
+    def test_changed_file(self):
+        file_object = self.project.get_files()[0]
+        index = self.project.dependency_index
+        index.scan(file_object)
+        # Touching the file without changing its contents does not rescan
+        os.utime(self.path, (0, 0))
+        index.scan(file_object)
+        self.assertEqual(len(self.scanned), 1)
+        with open(self.path, 'w') as f:
+            f.write(PACKAGE_DATA.replace('pkg_a', 'pkg_b'))
+        units = index.scan(file_object)
+        self.assertEqual(len(self.scanned), 2)
+        self.assertEqual(units.provides, set([('lib_a', 'pkg_b')]))
+
+
+class TestCompileScheduling(unittest.TestCase):
+
+    sources = [
+        ('lib_a', 'pkg_a.vhd', PACKAGE_DATA),
+        ('lib_b', 'ent_b.vhd', ENTITY_DATA),
+        ('lib_c', 'local.vhd', LOCAL_DATA),
+        ('lib_c', 'top.vhd', TOP_DATA),
+        ('lib_d', 'sv_pkg.sv', SV_PACKAGE_DATA),
+        ('lib_d', 'sv_top.sv', SV_MODULE_DATA),
+    ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project = Project(root=self.root)
+        self.project.add_config('simulation_directory', 'simulation')
+        os.makedirs(self.project.get_simulation_directory())
+        self.project.set_cache_path(os.path.join(self.root, '.test'))
+        for library, name, data in self.sources:
+            with open(os.path.join(self.root, name), 'w') as f:
+                f.write(data)
+            self.project.add_file(name, library=library)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_graph(self):
+        files = self.project.get_files()
+        graph = dependencies.build_graph(files)
+        names = [os.path.basename(f.path) for f in files]
+        edges = dict(
+            (names[k], set(names[d] for d in v)) for k, v in graph.items()
+        )
+        self.assertEqual(edges['pkg_a.vhd'], set())
+        self.assertEqual(edges['ent_b.vhd'], set(['pkg_a.vhd']))
+        self.assertEqual(edges['top.vhd'], set(['ent_b.vhd', 'local.vhd']))
+        self.assertEqual(edges['sv_top.sv'], set(['sv_pkg.sv']))
+
+    def test_scheduler_order(self):
+        graph = {1: set([0]), 2: set([0]), 3: set([1, 2])}
+        order = []
+        lock = threading.Lock()
+
+        def target(node):
+            with lock:
+                order.append(node)
+
+        JobScheduler(4).run([0, 1, 2, 3], graph, target)
+        self.assertEqual(order[0], 0)
+        self.assertEqual(order[-1], 3)
+
+    def test_scheduler_failure(self):
+        completed = []
+        failed = []
+
+        def target(node):
+            if node == 1:
+                raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            JobScheduler(2).run(
+                [0, 1, 2],
+                {1: set([0]), 2: set([1])},
+                target,
+                on_complete=completed.append,
+                on_failure=lambda node, e: failed.append(node),
+            )
+        self.assertEqual(completed, [0])
+        self.assertEqual(failed, [1])
+
+    def check_order(self, compiled):
+        for before, after in [
+            ('pkg_a.vhd', 'ent_b.vhd'),
+            ('ent_b.vhd', 'top.vhd'),
+            ('local.vhd', 'top.vhd'),
+            ('sv_pkg.sv', 'sv_top.sv'),
+        ]:
+            self.assertLess(compiled.index(before), compiled.index(after))
+
+    def test_parallel_compile(self):
+        simulator = DummySimulator(self.project)
+        simulator.compile_project(jobs=4)
+        self.assertEqual(len(simulator.compiled), len(self.sources))
+        self.check_order(simulator.compiled)
+        self.assertGreater(simulator.max_active, 1)
+        # Everything is cached so nothing is recompiled
+        simulator.compiled = []
+        simulator.compile_project(jobs=4)
+        self.assertEqual(simulator.compiled, [])
+
+    def test_transitive_recompile(self):
+        simulator = DummySimulator(self.project)
+        simulator.compile_project(jobs=1)
+        with open(os.path.join(self.root, 'pkg_a.vhd'), 'a') as f:
+            f.write('-- modified\n')
+        simulator.compiled = []
+        simulator.compile_project(jobs=1)
+        # Only the modified file and the files that depend on it, directly
+        # or indirectly, are recompiled.
+        self.assertEqual(
+            simulator.compiled,
+            ['pkg_a.vhd', 'ent_b.vhd', 'top.vhd']
+        )
+        simulator.compiled = []
+        simulator.compile_project(jobs=1)
+        self.assertEqual(simulator.compiled, [])
+
+    def test_include_recompile(self):
+        header = os.path.join(self.root, 'defines.vh')
+        with open(header, 'w') as f:
+            f.write('`define WIDTH 8\n')
+        includes = {}
+        self.project.get_dependency_graph(includes=includes)
+        self.assertEqual(includes[5], set([header]))
+        simulator = DummySimulator(self.project)
+        simulator.compile_project(jobs=1)
+        # A change to an included file recompiles the files including it
+        with open(header, 'w') as f:
+            f.write('`define WIDTH 16\n')
+        simulator.compiled = []
+        simulator.compile_project(jobs=1)
+        self.assertEqual(simulator.compiled, ['sv_top.sv'])
+        simulator.compiled = []
+        simulator.compile_project(jobs=1)
+        self.assertEqual(simulator.compiled, [])
+        # As does removing the included file
+        os.remove(header)
+        simulator.compile_project(jobs=1)
+        self.assertEqual(simulator.compiled, ['sv_top.sv'])
+
+    def test_batches(self):
+        simulator = BatchSimulator(self.project)
+        simulator.max_batch_length = 20
+        files = [
+            File('lib_a', path=path) for path in [
+                'a.vhd', 'b.vhd', 'c.vhd', 'd.vhd', 'e.sv', 'f.vhd',
+            ]
+        ]
+        files.insert(3, File('lib_b', path='g.vhd'))
+        # Consecutive files in the same library with the same file type are
+        # batched until the paths exceed the maximum batch length.
+        self.assertEqual(
+            simulator.get_batches(files),
+            [[0, 1, 2], [3], [4], [5], [6]]
+        )
+        simulator.max_batch_length = 12
+        self.assertEqual(
+            simulator.get_batches(files),
+            [[0, 1], [2], [3], [4], [5], [6]]
+        )
+
+    def test_batch_failure(self):
+        self.project.add_file('extra.sv', library='lib_d')
+        with open(os.path.join(self.root, 'extra.sv'), 'w') as f:
+            f.write('module extra;\nendmodule\n')
+        simulator = BatchSimulator(self.project)
+        simulator.bad = 'sv_top.sv'
+        with self.assertRaises(ExecutionError):
+            simulator.compile_project(jobs=1)
+        self.assertEqual(
+            simulator.batches[-1],
+            ['sv_pkg.sv', 'sv_top.sv', 'extra.sv']
+        )
+        # The file before the failure compiled, the failed file and those
+        # after it are compiled again.
+        simulator.bad = None
+        simulator.batches = []
+        simulator.compile_project(jobs=1)
+        self.assertEqual(simulator.batches, [['sv_top.sv', 'extra.sv']])
+
+    def test_serial_compile(self):
+        simulator = DummySimulator(self.project)
+        simulator.compile_project(jobs=1)
+        self.assertEqual(
+            simulator.compiled,
+            [name for library, name, data in self.sources]
+        )
+        self.assertEqual(simulator.max_active, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+"""
+The tests in this module check that the manual ISE flow resumes from the
+first stage whose inputs have changed and that the stages to run can be
+selected. Fake ISE executables are used so these tests do not require any
+vendor tools to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import tarfile
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from tests.fake_tools import FakeToolTestCase
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+PROJECT = """
+<project>
+    <config synthesis_directory='synthesis'/>
+    <config part='xc6slx9-2-tqg144'/>
+    <constraints path='top.ucf' flow='ise'/>
+    <library name='lib'>
+        <file path='top.vhd'/>
+    </library>
+    <library name='lib2'>
+        <file path='top2.vhd'/>
+    </library>
+</project>
+"""
+
+# A fake ISE executable that records the name it was called with and writes
+# the output file named in its arguments.
+ISE = """import os
+import re
+import sys
+name = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+if name == 'xwebtalk':
+    sys.exit(0)
+if '-help' in args:
+    print('Release 14.7 - ' + name)
+    sys.exit(0)
+with open({log!r}, 'a') as f:
+    f.write(name + '\\n')
+if name == 'xst':
+    script = open(args[args.index('-ifn') + 1]).read()
+    outputs = [re.search(r'-ofn (\\S+)', script).group(1)]
+elif name in ['map', 'promgen']:
+    outputs = [args[args.index('-o') + 1]]
+elif name == 'par':
+    outputs = [args[-2]]
+else:
+    outputs = [args[-1]]
+for path in outputs:
+    with open(path, 'w') as f:
+        f.write(name)
+"""
+
+
+@unittest.skipIf(sys.platform == 'win32', 'The fake tools are not executable')
+class TestIseStages(FakeToolTestCase):
+
+    def setUp(self):
+        super(TestIseStages, self).setUp()
+        self.log_path = os.path.join(self.root, 'stages.log')
+        os.makedirs(os.path.join(self.root, 'synthesis'))
+        self.write_tools(
+            [
+                'xwebtalk', 'promgen', 'xst', 'map', 'par', 'ngdbuild',
+                'bitgen', 'xflow'
+            ],
+            ISE,
+            log=self.log_path
+        )
+        self.write_files({
+            'project.xml': PROJECT,
+            'top.vhd': 'entity top is\nend entity;\n',
+            'top2.vhd': 'entity top is\nend entity top;\n',
+        })
+        self.write_constraints('NET "clk" LOC = "P1";\n')
+        self.project = self.load_project()
+
+    def write_constraints(self, text):
+        with open(os.path.join(self.root, 'top.ucf'), 'w') as f:
+            f.write(text)
+
+    def synthesise(self, library='lib', **kwargs):
+        """Synthesise the design and return the tools that were run."""
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self.archive_path = self.project.synthesise(
+            library,
+            'top',
+            tool_name='ise',
+            force=True,
+            **kwargs
+        )
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, 'r') as f:
+            return f.read().split()
+
+    def test_resume(self):
+        all_tools = ['xst', 'ngdbuild', 'map', 'par', 'bitgen', 'promgen']
+        self.assertEqual(self.synthesise(), all_tools)
+        # All stages are cached and their outputs are archived
+        self.assertEqual(self.synthesise(), [])
+        with tarfile.open(self.archive_path, 'r') as archive:
+            names = [os.path.basename(n) for n in archive.getnames()]
+        for name in ['top.ngc', 'top.ngd', 'top_map.ncd', 'top.ncd',
+                     'top.bit', 'top.mcs']:
+            self.assertIn(name, names)
+        # A change to the PAR arguments resumes from PAR
+        self.project.add_config('args_ise_par', '-ol high')
+        self.assertEqual(self.synthesise(), ['par', 'bitgen', 'promgen'])
+        # A change to the constraints resumes from NGDBUILD
+        self.write_constraints('NET "clk" LOC = "P2";\n')
+        self.assertEqual(self.synthesise(), all_tools[1:])
+        # A new PROM format runs PROMGEN for both formats
+        self.project.add_config('args_ise_promgen_bin', '-b')
+        self.assertEqual(self.synthesise(), ['promgen', 'promgen'])
+        # A change to the generics resumes from XST
+        self.project.add_generic('width', 8)
+        self.assertEqual(self.synthesise(), all_tools + ['promgen'])
+
+    def test_separate_builds(self):
+        all_tools = ['xst', 'ngdbuild', 'map', 'par', 'bitgen', 'promgen']
+        self.assertEqual(self.synthesise(), all_tools)
+        # The same entity in another library, or for other generics, does
+        # not replace the cached outputs of the first build
+        self.assertEqual(self.synthesise(library='lib2'), all_tools)
+        self.project.add_generic('width', 8)
+        self.assertEqual(self.synthesise(), all_tools)
+        self.project.generics = {}
+        self.assertEqual(self.synthesise(), [])
+        self.assertEqual(self.synthesise(library='lib2'), [])
+
+    def test_replaced_outputs(self):
+        all_tools = ['xst', 'ngdbuild', 'map', 'par', 'bitgen', 'promgen']
+        self.assertEqual(self.synthesise(), all_tools)
+        tool = self.project._get_tool('ise', tool_type='synthesis')
+        copy_stage_outputs = tool.copy_stage_outputs
+
+        def replace_outputs(stage, entity, source, destination):
+            copy_stage_outputs(stage, entity, source, destination)
+            if stage == 'map':
+                # Another build replaces the outputs while they are copied
+                with open(os.path.join(source, 'map.key'), 'w') as f:
+                    f.write('other')
+
+        tool.copy_stage_outputs = replace_outputs
+        self.assertEqual(self.synthesise(), all_tools[2:])
+
+    def test_version(self):
+        tool = self.project._get_tool('ise', tool_type='synthesis')
+        self.assertEqual(tool.get_version(), 'Release 14.7 - xst')
+        fingerprint = tool.get_fingerprint('lib', 'top')
+        tool.version = 'Release 14.8 - xst'
+        self.assertNotEqual(tool.get_fingerprint('lib', 'top'), fingerprint)
+
+    def test_version_resume(self):
+        all_tools = ['xst', 'ngdbuild', 'map', 'par', 'bitgen', 'promgen']
+        tool = self.project._get_tool('ise', tool_type='synthesis')
+        self.assertEqual(self.synthesise(), all_tools)
+        self.assertEqual(self.synthesise(), [])
+        # An ISE update runs every stage again
+        tool.version = 'Release 14.8 - xst'
+        self.assertEqual(self.synthesise(), all_tools)
+
+    def test_select_stages(self):
+        tool = self.project._get_tool('ise', tool_type='synthesis')
+        self.assertEqual(
+            self.synthesise(to_stage='ngdbuild'),
+            ['xst', 'ngdbuild']
+        )
+        # Archives of partial builds are not reused
+        self.assertIsNone(
+            tool.find_archive(tool.get_fingerprint('lib', 'top'))
+        )
+        self.assertEqual(
+            self.synthesise(to_stage='par'),
+            ['map', 'par']
+        )
+        self.assertEqual(
+            self.synthesise(from_stage='map', to_stage='map'),
+            ['map']
+        )
+        # The stages after a forced stage are run again
+        self.assertEqual(
+            self.synthesise(from_stage='par'),
+            ['par', 'bitgen', 'promgen']
+        )
+        # The archive of a complete build is reused
+        self.assertEqual(
+            self.project.synthesise('lib', 'top', tool_name='ise'),
+            self.archive_path
+        )
+        self.assertRaises(
+            ValueError,
+            self.project.synthesise,
+            'lib',
+            'top',
+            tool_name='ise',
+            from_stage='unknown'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
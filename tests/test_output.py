@@ -0,0 +1,161 @@
+"""
+The tests in this module check that the output of an executable is processed
+line by line while it is running, using a Python script in place of a
+simulator. These tests do not require any vendor tools to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import shutil
+import tempfile
+import time
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.common import exceptions
+from chiptools.common import utils
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+# Prints numbered report lines, an error on line 5 and then runs for a long
+# time unless it is stopped.
+SCRIPT = """
+import sys
+import time
+for i in range(10):
+    print('report ' + str(i))
+    if i == 5:
+        print('Error: failed at ' + str(i))
+    sys.stdout.flush()
+sys.stderr.write('done\\n')
+sys.stderr.flush()
+time.sleep(float(sys.argv[1]))
+"""
+
+# Prints simulator style messages with the simulation time on the following
+# line, starts a child process that holds the output pipes open and then
+# runs for a long time unless it is stopped.
+SIMULATION = """
+import subprocess
+import sys
+import time
+child = subprocess.Popen(
+    [sys.executable, '-c', 'import time; time.sleep(60)']
+)
+print('Note: started')
+print('Time: 10 ns')
+print('Warning: slow')
+print('Time: 20 ns')
+sys.stdout.flush()
+time.sleep(float(sys.argv[1]))
+print('Failure: mismatch')
+print('Time: 30 ns')
+sys.stdout.flush()
+time.sleep(60)
+"""
+
+
+class TestOutputMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def execute(self, monitor, sleep=0):
+        return utils.execute(
+            [sys.executable, '-c', SCRIPT, str(sleep)],
+            path=self.root,
+            monitor=monitor
+        )
+
+    def test_matchers(self):
+        reports = []
+        errors = []
+        monitor = utils.OutputMonitor()
+        monitor.add_matcher('^report', callback=reports.append)
+        monitor.add_matcher('Error:', callback=errors.append)
+        ret, stdout, stderr = self.execute(monitor)
+        self.assertEqual(ret, 0)
+        self.assertEqual(len(reports), 10)
+        self.assertEqual(errors, ['Error: failed at 5\n'])
+        self.assertIn('report 9', stdout)
+        self.assertEqual(stderr, 'done\n')
+        self.assertIsNone(monitor.fatal_line)
+
+    def test_fatal(self):
+        monitor = utils.OutputMonitor()
+        monitor.add_matcher('Error:', fatal=True)
+        start_time = time.time()
+        # The script is killed rather than running to completion
+        with self.assertRaises(exceptions.ExecutionError):
+            self.execute(monitor, sleep=60)
+        self.assertLess(time.time() - start_time, 30)
+        self.assertEqual(monitor.fatal_line, 'Error: failed at 5')
+
+    def test_spool(self):
+        path = os.path.join(self.root, 'output.log')
+        monitor = utils.OutputMonitor(spool_path=path, tail_lines=2)
+        ret, stdout, stderr = self.execute(monitor)
+        # Only the last lines are kept in memory
+        self.assertEqual(stdout, 'report 8\nreport 9\n')
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 12)
+        self.assertIn('done', lines)
+
+    def simulate(self, monitor, delay=0):
+        return utils.execute(
+            [sys.executable, '-c', SIMULATION, str(delay)],
+            path=self.root,
+            monitor=monitor
+        )
+
+    def test_abort_pattern(self):
+        monitor = utils.OutputMonitor(time_pattern=r'Time: (\d+ ns)')
+        monitor.add_abort_pattern('Warning:', 'warning')
+        monitor.add_abort_pattern('Failure:', 'failure')
+        start_time = time.time()
+        # The simulation and the child process holding the output pipe
+        # open are both stopped.
+        with self.assertRaises(exceptions.SimulationAborted) as context:
+            self.simulate(monitor)
+        self.assertLess(time.time() - start_time, 30)
+        error = context.exception
+        self.assertEqual(error.reason, 'output')
+        self.assertEqual(error.line, 'Failure: mismatch')
+        self.assertEqual(error.severity, 'failure')
+        self.assertEqual(error.simulation_time, '30 ns')
+        self.assertIn('30 ns', str(error))
+        self.assertEqual(monitor.warnings, ['Warning: slow'])
+
+    def test_invalid_severity(self):
+        monitor = utils.OutputMonitor()
+        with self.assertRaises(ValueError):
+            monitor.add_abort_pattern('Note:', 'note')
+
+    def test_timeout(self):
+        monitor = utils.OutputMonitor(
+            timeout=1,
+            time_pattern=r'Time: (\d+ ns)'
+        )
+        start_time = time.time()
+        with self.assertRaises(exceptions.SimulationAborted) as context:
+            self.simulate(monitor, delay=60)
+        self.assertLess(time.time() - start_time, 30)
+        error = context.exception
+        self.assertEqual(error.reason, 'timeout')
+        self.assertEqual(error.timeout, 1)
+        # The last simulation time printed before the timeout is reported
+        self.assertEqual(error.simulation_time, '20 ns')
+        self.assertIsNone(monitor.fatal_line)
+
+
+if __name__ == '__main__':
+    unittest.main()
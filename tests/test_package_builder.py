@@ -0,0 +1,185 @@
+"""
+The tests in this module check that synthesis archives are written without
+changing the working directory, with optional compression, include and
+exclude patterns and a manifest of file hashes.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import hashlib
+import shutil
+import subprocess
+import tempfile
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.core import package_builder
+from chiptools.core.project import Project
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+FILES = {
+    'top.bit': b'bitstream',
+    'top.ngd': b'netlist',
+    'reports/top.par': b'par report',
+    'reports/top.twr': b'timing report',
+}
+
+
+class TestPackageBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'outputs')
+        for name, data in FILES.items():
+            path = os.path.join(self.source, name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def read_archive(self, path):
+        """Return a dictionary of archive name : data for the archive."""
+        contents = {}
+        with package_builder.open_archive(path) as archive:
+            for member in archive:
+                if member.isfile():
+                    contents[member.name] = archive.extractfile(
+                        member
+                    ).read()
+        return contents
+
+    def build(self, compression=None, include=None, exclude=None):
+        path = os.path.join(self.root, 'outputs.tar')
+        path += package_builder.EXTENSIONS[
+            package_builder.get_compression(compression)
+        ]
+        cwd = os.getcwd()
+        builder = package_builder.PackageBuilder(
+            path,
+            compression=compression,
+            include=include,
+            exclude=exclude
+        )
+        # Files can be added before the remaining files are added by addAll
+        builder.add(os.path.join(self.source, 'top.bit'), 'top.bit')
+        builder.addAll(self.source)
+        builder.save()
+        self.assertEqual(os.getcwd(), cwd)
+        return self.read_archive(path)
+
+    def check_manifest(self, contents):
+        manifest = contents.pop(package_builder.MANIFEST_NAME).decode()
+        expected = sorted(
+            '{0}  {1}'.format(hashlib.sha256(data).hexdigest(), name)
+            for name, data in contents.items()
+        )
+        self.assertEqual(sorted(manifest.splitlines()), expected)
+
+    def test_compression(self):
+        for compression in [None, 'gzip', 'bz2', 'xz']:
+            contents = self.build(compression)
+            self.check_manifest(contents)
+            self.assertEqual(contents, FILES)
+        self.assertRaises(
+            ValueError,
+            package_builder.get_compression,
+            'rar'
+        )
+
+    @unittest.skipIf(
+        package_builder.zstandard is None,
+        'The zstandard package is not installed'
+    )
+    def test_zstd(self):
+        contents = self.build('zstd')
+        self.check_manifest(contents)
+        self.assertEqual(contents, FILES)
+
+    def test_patterns(self):
+        contents = self.build(exclude=['*.ngd'])
+        self.check_manifest(contents)
+        self.assertEqual(
+            sorted(contents.keys()),
+            ['reports/top.par', 'reports/top.twr', 'top.bit']
+        )
+        contents = self.build('gz', include=['reports/*'], exclude=['*.twr'])
+        self.check_manifest(contents)
+        self.assertEqual(list(contents.keys()), ['reports/top.par'])
+
+    def test_modified_file(self):
+        path = os.path.join(self.root, 'outputs.tar.gz')
+        builder = package_builder.PackageBuilder(path, compression='gz')
+        builder.add(os.path.join(self.source, 'top.bit'), 'top.bit')
+        # A later stage rewrites a file that has already been archived
+        with open(os.path.join(self.source, 'top.bit'), 'wb') as f:
+            f.write(b'new bitstream')
+        builder.addAll(self.source)
+        builder.save()
+        contents = self.read_archive(path)
+        self.check_manifest(contents)
+        self.assertEqual(contents['top.bit'], b'new bitstream')
+
+    def test_partial_archives(self):
+        # A process that has finished cannot still be writing its archive
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        stale = os.path.join(self.root, 'a.{0}.partial'.format(process.pid))
+        active = os.path.join(self.root, 'b.{0}.partial'.format(os.getpid()))
+        for path in [stale, active]:
+            with open(path, 'w') as f:
+                f.write('partial')
+            with open(path + '.fingerprint', 'w') as f:
+                f.write('fingerprint\n')
+        project = Project()
+        try:
+            project.add_config('synthesis_directory', self.root)
+            tool = project.tool_wrapper.get_tool('synthesis', 'vivado')
+            self.assertIsNone(tool.find_archive('fingerprint'))
+            tool.remove_partial_archives()
+        finally:
+            project.cache.close()
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(active))
+
+    def test_synthesiser_archive(self):
+        project = Project()
+        try:
+            project.add_config('synthesis_directory', self.root)
+            project.add_config('synthesis_archive_compression', 'GZ')
+            project.add_config('synthesis_archive_exclude', '*.ngd, *.dcp')
+            tool = project.tool_wrapper.get_tool('synthesis', 'vivado')
+            tool.begin_archive(self.source)
+            tool.archive_outputs([
+                os.path.join(self.source, 'top.bit'),
+                os.path.join(self.source, 'missing.bit'),
+            ])
+            tool.storeOutputs(self.source, 'top.tar')
+        finally:
+            project.cache.close()
+        self.assertEqual(
+            tool.archive_path,
+            os.path.join(self.root, 'top.tar.gz')
+        )
+        self.assertEqual(
+            [n for n in os.listdir(self.root) if n.endswith('.partial')],
+            []
+        )
+        contents = self.read_archive(tool.archive_path)
+        self.check_manifest(contents)
+        self.assertEqual(
+            sorted(contents.keys()),
+            ['reports/top.par', 'reports/top.twr', 'top.bit']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,348 @@
+"""
+The tests in this module check that project unit tests can be run in parallel
+worker processes and by distributed test workers using a fake ghdl executable.
+These tests do not require any vendor tools to be installed.
+"""
+
+import unittest
+import datetime
+import os
+import logging
+import logging.config
+import sys
+import multiprocessing
+from multiprocessing import connection
+from xml.etree import ElementTree
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.testing import distributed
+from chiptools.testing import parallel
+from tests.fake_tools import FakeToolTestCase
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+# A fake ghdl that copies input.txt to output.txt in its working directory
+# when a simulation is run.
+FAKE_GHDL = """import os
+import shutil
+import sys
+import time
+if '-r' in sys.argv:
+    time.sleep(0.2)
+    shutil.copy('input.txt', 'output.txt')
+"""
+
+PROJECT = """
+<project>
+    <config simulation_directory='simulation'/>
+    <config simulator='ghdl'/>
+    <unittest path='sandbox_tests.py'/>
+    <library name='lib_tb'>
+        <file path='tb.vhd'/>
+    </library>
+</project>
+"""
+
+TESTS = """
+import os
+from chiptools.testing.testloader import ChipToolsTest
+
+class SandboxTests(ChipToolsTest):
+    entity = 'tb'
+    library = 'lib_tb'
+    generics = {}
+
+    def check(self, data):
+        with open(os.path.join(self.simulation_root, 'input.txt'), 'w') as f:
+            f.write(data)
+        return_code, stdout, stderr = self.simulate()
+        self.assertEqual(return_code, 0)
+        with open(os.path.join(self.simulation_root, 'output.txt')) as f:
+            self.assertEqual(f.read(), data)
+        with open(os.path.join(self.simulation_root, data), 'w') as f:
+            f.write(str(os.getpid()))
+
+    def test_a(self):
+        self.check('a')
+
+    def test_b(self):
+        self.check('b')
+
+    def test_c(self):
+        self.check('c')
+
+    def test_d(self):
+        self.check('d')
+
+    def test_fail(self):
+        self.assertEqual(self.simulation_root, 'elsewhere')
+"""
+
+# Test classes that record each time their class fixture is run
+FIXTURE_TESTS = """
+from chiptools.testing.testloader import ChipToolsTest
+
+class FixtureTests(ChipToolsTest):
+    entity = 'tb'
+    library = 'lib_tb'
+
+    @classmethod
+    def setUpClass(cls):
+        super(FixtureTests, cls).setUpClass()
+        with open({log!r}, 'a') as f:
+            f.write(cls.__name__ + '\\n')
+
+    def test_a(self):
+        pass
+
+    def test_b(self):
+        pass
+
+    def test_c(self):
+        pass
+
+class OtherFixtureTests(FixtureTests):
+    pass
+"""
+
+
+def get_fixture_error_tests():
+    """
+    Return a tuple of test case classes with class fixtures that fail before
+    and after their tests run, they are defined here so that they are not
+    collected as tests of this module.
+    """
+    class FixtureErrorTests(unittest.TestCase):
+
+        @classmethod
+        def setUpClass(cls):
+            raise ValueError('fixture failed')
+
+        def test_a(self):
+            pass
+
+        def test_b(self):
+            pass
+
+    class TeardownErrorTests(unittest.TestCase):
+
+        @classmethod
+        def tearDownClass(cls):
+            raise ValueError('fixture failed')
+
+        def test_a(self):
+            pass
+
+        @unittest.skip('skipped')
+        def test_b(self):
+            pass
+
+        def test_c(self):
+            self.fail()
+
+    return FixtureErrorTests, TeardownErrorTests
+
+
+@unittest.skipIf(sys.platform == 'win32', 'Requires a POSIX shell')
+class ProjectTestCase(FakeToolTestCase):
+
+    def setUp(self):
+        super(ProjectTestCase, self).setUp()
+        self.write_tools(['ghdl'], FAKE_GHDL)
+        self.write_files({
+            'project.xml': PROJECT,
+            'sandbox_tests.py': TESTS,
+            'tb.vhd': 'entity tb is\nend entity;\n',
+        })
+        os.makedirs(os.path.join(self.root, 'simulation'))
+        self.change_directory()
+        self.project = self.load_project()
+
+    def get_sandbox_files(self):
+        """
+        Return a dictionary of sandbox name : files written by the tests.
+        """
+        simulation = os.path.join(self.root, 'simulation')
+        sandboxes = {}
+        for name in os.listdir(simulation):
+            if name.startswith('sandbox_'):
+                sandboxes[name] = sorted(
+                    path for path in os.listdir(os.path.join(simulation, name))
+                    if path in ['a', 'b', 'c', 'd']
+                )
+        return sandboxes
+
+
+class TestParallelTests(ProjectTestCase):
+
+    def test_parallel(self):
+        simulation = os.path.join(self.root, 'simulation')
+        self.project.run_tests(jobs=2)
+        with open(os.path.join(simulation, 'report.html')) as f:
+            report = f.read()
+        self.assertIn('Pass 4 Failure 1', report)
+        # Each test ran in a worker sandbox rather than the simulation
+        # directory, and the sandboxes were shared between the tests.
+        self.assertFalse(os.path.exists(os.path.join(simulation, 'a')))
+        sandboxes = self.get_sandbox_files()
+        self.assertLessEqual(len(sandboxes), 2)
+        self.assertEqual(
+            sorted(sum(sandboxes.values(), [])),
+            ['a', 'b', 'c', 'd']
+        )
+
+    def test_class_fixtures(self):
+        log_path = os.path.join(self.root, 'fixtures.log')
+        self.write_files({
+            'fixtures.xml': PROJECT.replace('sandbox_tests', 'fixture_tests'),
+            'fixture_tests.py': FIXTURE_TESTS.format(log=log_path),
+        })
+        project = self.load_project('fixtures.xml')
+        self.assertTrue(project.run_tests(jobs=2))
+        # The class fixture runs once for each class, not for each test
+        with open(log_path, 'r') as f:
+            self.assertEqual(
+                sorted(f.read().split()),
+                ['FixtureTests', 'OtherFixtureTests']
+            )
+
+    def test_serial(self):
+        simulation = os.path.join(self.root, 'simulation')
+        self.project.run_tests(ids=[0, 1], jobs=1)
+        with open(os.path.join(simulation, 'report.html')) as f:
+            self.assertIn('Pass 2', f.read())
+        self.assertTrue(os.path.exists(os.path.join(simulation, 'a')))
+
+    def test_order_by_duration(self):
+        tests = self.project.get_test_cases()
+        names = [test.id() for file_name, test in tests]
+        durations = {names[0]: 1.0, names[1]: 5.0, names[2]: 2.0}
+        # Tests without a duration are first, then the longest tests
+        self.assertEqual(
+            parallel.order_by_duration([0, 1, 2, 3, 4], tests, durations),
+            [3, 4, 1, 2, 0]
+        )
+
+
+class TestDistributedTests(ProjectTestCase):
+
+    def test_distributed(self):
+        self.project.compile()
+        tests = self.project.get_test_cases()
+        ids = list(range(len(tests)))
+        coordinator = distributed.TestCoordinator(
+            tests, ids, ('127.0.0.1', 0), authkey=b'test'
+        )
+        coordinator.start()
+        # A worker that disconnects while running a test hands it back
+        client = connection.Client(coordinator.address, authkey=b'test')
+        distributed.send(client, type='ready', worker='lost')
+        self.assertEqual(distributed.receive(client)['type'], 'test')
+        client.close()
+        context = multiprocessing.get_context('spawn')
+        workers = [
+            context.Process(
+                target=distributed.run_worker,
+                args=(
+                    os.path.join(self.root, 'project.xml'),
+                    coordinator.address,
+                    None,
+                    b'test'
+                )
+            ) for index in range(2)
+        ]
+        for worker in workers:
+            worker.start()
+        results = coordinator.wait()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(
+            sorted(code for code, output, error, duration in results.values()),
+            [0, 0, 0, 0, 1]
+        )
+        self.assertEqual(
+            sorted(sum(self.get_sandbox_files().values(), [])),
+            ['a', 'b', 'c', 'd']
+        )
+        # The results are merged into one report and the durations are
+        # recorded for the next run.
+        self.project.report_test_results(
+            tests, ids, results, datetime.datetime.now(), 'ghdl'
+        )
+        report = ElementTree.parse(
+            os.path.join(self.root, 'simulation', 'report.xml')
+        ).getroot()[0]
+        self.assertEqual(report.get('tests'), '5')
+        self.assertEqual(report.get('failures'), '1')
+        self.assertEqual(
+            sorted(self.project.cache.get_test_durations('ghdl').keys()),
+            sorted(test.id() for file_name, test in tests)
+        )
+
+    def test_address(self):
+        self.assertEqual(distributed.parse_address(''), ('localhost', 6174))
+        self.assertEqual(
+            distributed.parse_address('host:80'),
+            ('host', 80)
+        )
+        self.assertTrue(distributed.is_loopback('localhost'))
+        self.assertTrue(distributed.is_loopback('127.0.0.1'))
+        self.assertFalse(distributed.is_loopback('0.0.0.0'))
+        self.assertFalse(distributed.is_loopback(''))
+        # Tests are only served on other interfaces with an authkey
+        tests = self.project.get_test_cases()
+        for host in ['', '0.0.0.0']:
+            self.assertRaises(
+                ValueError,
+                distributed.TestCoordinator,
+                tests, [0], (host, 0)
+            )
+        coordinator = distributed.TestCoordinator(
+            tests, [0], ('0.0.0.0', 0), authkey=b'test'
+        )
+        coordinator.listener.close()
+
+    def test_mismatched_project(self):
+        tests = self.project.get_test_cases()
+        coordinator = distributed.TestCoordinator(
+            tests, [0], ('127.0.0.1', 0)
+        )
+        coordinator.start()
+        # A worker with different tests reports an error for each test
+        worker = distributed.TestWorker(
+            [test for file_name, test in reversed(tests)],
+            coordinator.address
+        )
+        self.assertEqual(worker.run(), 1)
+        results = coordinator.wait()
+        self.assertEqual(results[0][0], 2)
+
+
+class TestRunTestCases(unittest.TestCase):
+
+    def test_fixture_errors(self):
+        loader = unittest.TestLoader()
+        FixtureErrorTests, TeardownErrorTests = get_fixture_error_tests()
+        # Tests that are not run because the class fixture failed report the
+        # fixture error
+        results = parallel.run_test_cases(
+            list(loader.loadTestsFromTestCase(FixtureErrorTests))
+        )
+        self.assertEqual([result[0] for result in results], [2, 2])
+        self.assertIn('fixture failed', results[0][2])
+        # A fixture that fails after the tests have run is reported against
+        # the last test unless it failed, skipped tests report None
+        tests = list(loader.loadTestsFromTestCase(TeardownErrorTests))
+        results = parallel.run_test_cases(tests)
+        self.assertEqual([result[0] for result in results], [0, None, 1])
+        results = parallel.run_test_cases(tests[:2])
+        self.assertEqual([result[0] for result in results], [0, 2])
+        self.assertIn('fixture failed', results[1][2])
+
+
+if __name__ == '__main__':
+    unittest.main()
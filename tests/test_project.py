@@ -8,14 +8,19 @@ vendor tools are not available in the environment.
 import unittest
 import os
 import logging
+import logging.config
 import sys
 import re
+import shutil
+import tempfile
 
 testroot = os.path.dirname(__file__) or '.'
 sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
 
 from chiptools.core.project import Project
 from chiptools.core.cli import CommandLine
+from chiptools.parsers.xml_project import XmlProjectParser
+from chiptools.common import filetypes
 
 # Blackhole log messages from chiptools
 logging.config.dictConfig({'version': 1})
@@ -63,8 +68,10 @@ end RTL;
         synthesiser='%(synthesis_tool_name)s'
         part='%(project_part)s'
         reporter='%(reporter_path)s'
+        simulation_timeout='%(simulation_timeout)s'
     />
     %(generics)s
+    %(abort_patterns)s
     %(constraints)s
     %(libraries)s
 </project>
@@ -96,6 +103,7 @@ def process(data, path):
     synthesis_directory = 'synthesis'
     simulation_directory = 'simulation'
     project_part = 'best_fpga_ever'
+    simulation_timeout = 600
     simulation_tool_name = 'modelsim'
     synthesis_tool_name = 'ise'
 
@@ -125,6 +133,11 @@ def process(data, path):
         'MODEL_CODE': 'model_a',
     }
 
+    project_abort_patterns = [
+        ('Error:', 'error'),
+        ('Warning:', 'warning'),
+    ]
+
     def setUp(self):
         # Guarantee a clean working copy
         self.tearDown()
@@ -158,6 +171,14 @@ def process(data, path):
         generics = ''
         for k, v in self.project_generics.items():
             generics += '<generic {0}=\'{1}\'/>\n'.format(k, v)
+        abort_patterns = ''
+        for pattern, severity in self.project_abort_patterns:
+            abort_patterns += (
+                '<abort pattern=\'{0}\' severity=\'{1}\'/>\n'.format(
+                    pattern,
+                    severity
+                )
+            )
 
         with open(self.reporter_path, 'w') as f:
             f.write(self.reporter_data)
@@ -184,6 +205,8 @@ def process(data, path):
                     libraries=libraries,
                     constraints=constraints,
                     generics=generics,
+                    abort_patterns=abort_patterns,
+                    simulation_timeout=self.simulation_timeout,
                     simulation_tool_name=self.simulation_tool_name,
                     synthesis_tool_name=self.synthesis_tool_name,
                     reporter_path=os.path.basename(self.reporter_path),
@@ -310,6 +333,19 @@ class TestXmlProjectLoading(TestProjectInterface):
             project.get_generics(),
         )
 
+    def test_abort_patterns(self):
+        project = Project()
+        project.load_project(self.project_path)
+        # Check the simulation abort patterns and timeout
+        self.assertEqual(
+            self.project_abort_patterns,
+            project.get_abort_patterns(),
+        )
+        self.assertEqual(
+            self.simulation_timeout,
+            project.get_simulation_timeout()
+        )
+
     def test_reporter(self):
         project = Project()
         project.load_project(self.project_path)
@@ -546,5 +582,202 @@ dfe preprocessor(a, b, c):
                         )
                     )
 
+
+class TestProjectFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.environ = dict(os.environ)
+        os.environ['CHIPTOOLS_TEST_LIB'] = 'lib_a'
+        self.write('top.xml', """
+<project>
+    <config simulator='ghdl'/>
+    <project path='a.xml'/>
+    <project path='b.xml' synthesise='false'/>
+</project>
+""")
+        self.write('a.xml', """
+<project>
+    <library name='lib_a'>
+        <file path='$CHIPTOOLS_TEST_LIB/a.vhd'/>
+    </library>
+    <generic width='8'/>
+</project>
+""")
+        self.write('b.xml', """
+<project>
+    <library name='lib_b'>
+        <file path='b.vhd'/>
+    </library>
+</project>
+""")
+        # Record the project files that are parsed
+        self.parsed = []
+        read_project = XmlProjectParser.read_project
+
+        def record(filepath, synthesise=None):
+            self.parsed.append(os.path.basename(filepath))
+            return read_project(filepath, synthesise)
+        XmlProjectParser.read_project = staticmethod(record)
+        self.read_project = read_project
+
+    def tearDown(self):
+        XmlProjectParser.read_project = staticmethod(self.read_project)
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.root)
+
+    def write(self, name, data):
+        with open(os.path.join(self.root, name), 'w') as f:
+            f.write(data)
+
+    def load(self):
+        """
+        Load the top level project and return a tuple of the sorted
+        project file names that were parsed and the project files.
+        """
+        project = Project()
+        try:
+            self.parsed = []
+            project.load_project(os.path.join(self.root, 'top.xml'))
+            files = [
+                (
+                    f.library,
+                    os.path.relpath(f.path, self.root),
+                    f.synthesise
+                ) for f in project.get_files()
+            ]
+            self.assertEqual(project.get_simulation_tool_name(), 'ghdl')
+            self.assertEqual(project.get_generics(), {'width': '8'})
+        finally:
+            project.cache.close()
+        return sorted(self.parsed), files
+
+    def test_cache(self):
+        parsed, files = self.load()
+        self.assertEqual(parsed, ['a.xml', 'b.xml', 'top.xml'])
+        expected = [
+            ('lib_a', os.path.join('lib_a', 'a.vhd'), True),
+            ('lib_b', 'b.vhd', False),
+        ]
+        self.assertEqual(files, expected)
+        # Unchanged project files are not parsed again
+        self.assertEqual(self.load(), ([], expected))
+        # Only a changed project file is parsed again
+        self.write('b.xml', """
+<project>
+    <library name='lib_b'>
+        <file path='c.vhd'/>
+    </library>
+</project>
+""")
+        expected[1] = ('lib_b', 'c.vhd', False)
+        self.assertEqual(self.load(), (['b.xml'], expected))
+        # A change to an environment variable used by a project file
+        os.environ['CHIPTOOLS_TEST_LIB'] = 'lib_c'
+        expected[0] = ('lib_a', os.path.join('lib_c', 'a.vhd'), True)
+        self.assertEqual(self.load(), (['a.xml'], expected))
+
+
+class TestProjectParserBackends(unittest.TestCase):
+
+    project = """
+<project>
+    <!-- A comment -->
+    <config simulator='ghdl' part='xc7a35t'/>
+    <project path='sub.xml' synthesise='false'/>
+    <library name='lib_a'>
+        <file path='a.vhd' args_ghdl_compile='--std=08'/>
+        <file path='b.vhd' synthesise='false'/>
+        <file/>
+    </library>
+    <library name='lib_b' synthesise='false'>
+        <file path='c.vhd'/>
+    </library>
+    <library>
+        <file path='ignored.vhd'/>
+    </library>
+    <file path='work.vhd'/>
+    <constraints path='top.xdc' flow='vivado'/>
+    <unittest path='test.py'/>
+    <generic width='8' depth='16'/>
+    <abort pattern='Error:' severity='failure'/>
+    <abort severity='warning'/>
+</project>
+"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'project.xml')
+        with open(self.path, 'w') as f:
+            f.write(self.project)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_backends(self):
+        """The iterparse and minidom backends read the same operations."""
+        operations = XmlProjectParser.read_project_iterparse(self.path)
+        self.assertEqual(
+            operations,
+            XmlProjectParser.read_project_minidom(self.path)
+        )
+        self.assertEqual(
+            [operation[0] for operation in operations],
+            [
+                'config', 'project', 'file', 'file', 'warning', 'file',
+                'warning', 'warning', 'file', 'constraints', 'unittest',
+                'generic', 'generic', 'abort', 'error',
+            ]
+        )
+        self.assertEqual(operations[1][1:], [
+            os.path.join(os.path.realpath(self.root), 'sub.xml'), False
+        ])
+        self.assertFalse(operations[3][3]['synthesise'])
+        self.assertEqual(operations[5][2], 'lib_b')
+        self.assertFalse(operations[5][3]['synthesise'])
+        self.assertEqual(operations[8][2], 'work')
+
+
+class TestFileModel(unittest.TestCase):
+
+    def test_file_identity(self):
+        a = filetypes.File(library='lib', path='a.vhd')
+        b = filetypes.File(library='lib', path='a.vhd')
+        b.md5 = '0123'
+        # Files without tool arguments share the same empty arguments
+        self.assertIs(a.optionalToolArgs, filetypes.NO_TOOL_ARGS)
+        self.assertFalse(hasattr(a, '__dict__'))
+        # The md5 set by compilation is not part of the identity
+        self.assertEqual(a, b)
+        self.assertEqual(len(set([a, b])), 1)
+        c = filetypes.File(
+            library='lib',
+            path='a.vhd',
+            args_modelsim_compile='-2008'
+        )
+        self.assertNotEqual(a, c)
+        self.assertEqual(c.get_tool_arguments('modelsim', 'compile'), '-2008')
+        self.assertEqual(a.get_tool_arguments('modelsim', 'compile'), '')
+        self.assertEqual(filetypes.NO_TOOL_ARGS, {})
+
+    def test_project_indexes(self):
+        project = Project()
+        try:
+            project.add_file('a.vhd', library='lib_a')
+            project.add_file('a.vhd', library='lib_a')
+            project.add_file('b.vhd', library='lib_a', synthesise=False)
+            project.add_file('c.vhd', library='lib_b', synthesise=False)
+            self.assertEqual(len(project.get_files()), 3)
+            fileset = project.get_synthesis_fileset()
+            self.assertEqual(sorted(fileset.keys()), ['lib_a', 'lib_b'])
+            self.assertEqual(
+                [os.path.basename(f.path) for f in fileset['lib_a']],
+                ['a.vhd']
+            )
+            self.assertEqual(fileset['lib_b'], [])
+        finally:
+            project.cache.close()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,84 @@
+"""
+The tests in this module check the persistent ModelSim session using a fake
+vsim executable that understands the commands sent by the session. These
+tests do not require any vendor tools to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import shutil
+import stat
+import tempfile
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.common import exceptions
+from chiptools.wrappers.simulators.modelsim import ModelsimSession
+from chiptools.wrappers.simulators.modelsim import tcl_quote
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+# A fake vsim that fails any command containing 'bad' and records the
+# commands it receives.
+FAKE_VSIM = """#!{python}
+import re
+import sys
+status = 0
+with open('commands.log', 'a') as log:
+    for line in sys.stdin:
+        match = re.match(r'set chiptools_status \\[catch \\{{(.*)\\}} ', line)
+        if match:
+            log.write(match.group(1) + '\\n')
+            log.flush()
+            print('# ' + match.group(1))
+            status = 1 if 'bad' in match.group(1) else 0
+        elif line.startswith('puts'):
+            print(line.split('"')[1].replace('$chiptools_status', str(status)))
+        elif line.startswith('quit'):
+            break
+        sys.stdout.flush()
+"""
+
+
+class TestModelsimSession(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.vsim = os.path.join(self.root, 'vsim')
+        with open(self.vsim, 'w') as f:
+            f.write(FAKE_VSIM.format(python=sys.executable))
+        os.chmod(self.vsim, os.stat(self.vsim).st_mode | stat.S_IEXEC)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_tcl_quote(self):
+        self.assertEqual(tcl_quote('a b'), '{a b}')
+        self.assertEqual(tcl_quote(''), '""')
+        self.assertEqual(tcl_quote('a{b'), '"a\\{b"')
+        self.assertEqual(tcl_quote('C:\\lib\\'), '"C:\\\\lib\\\\"')
+
+    @unittest.skipIf(sys.platform == 'win32', 'Requires a POSIX shell')
+    def test_session(self):
+        session = ModelsimSession(self.vsim, self.root)
+        try:
+            output = session.call('vlib', ['lib_a'])
+            self.assertIn('vlib {lib_a}', output)
+            session.call('vcom', ['-work', 'lib_a', 'good.vhd'])
+            with self.assertRaises(exceptions.ExecutionError):
+                session.call('vcom', ['-work', 'lib_a', 'bad.vhd'])
+            # The session continues to work after a failed command
+            session.call('vmap', ['lib_a', 'lib_a'])
+        finally:
+            session.close()
+        with open(os.path.join(self.root, 'commands.log'), 'r') as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
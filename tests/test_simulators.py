@@ -2,6 +2,7 @@ import unittest
 import os
 import re
 import logging
+import logging.config
 import sys
 import shutil
 import hashlib
@@ -0,0 +1,327 @@
+"""
+The tests in this module check that elaborated simulation snapshots are
+reused between simulations while the compiled design is unchanged, using
+fake simulator executables. These tests do not require any vendor tools to be
+installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.testing import parallel
+from chiptools.testing.testloader import ChipToolsTest
+from chiptools.testing.testloader import with_generics
+from tests.fake_tools import FakeToolTestCase
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+# A fake simulator executable that records its arguments and creates the
+# libraries and snapshots that GHDL or Vivado would create.
+FAKE_TOOL = """import os
+import sys
+name = os.path.basename(sys.argv[0])
+with open({log!r}, 'a') as f:
+    f.write(' '.join([name] + sys.argv[1:]) + '\\n')
+if name == 'ghdl' and '-a' in sys.argv:
+    open(sys.argv[2].split('=')[1] + '-obj93.cf', 'w').close()
+elif name == 'ghdl' and '-e' in sys.argv:
+    open(sys.argv[-1], 'w').close()
+elif name == 'iverilog':
+    open(sys.argv[sys.argv.index('-o') + 1], 'w').close()
+elif name in ['xvhdl', 'xvlog']:
+    # The library must be mapped before the file is compiled
+    with open('xsim.ini', 'r') as f:
+        libraries = [line.split('=')[0] for line in f if '=' in line]
+    if sys.argv[sys.argv.index('-work') + 1] not in libraries:
+        sys.exit(1)
+elif name == 'xelab':
+    os.makedirs(
+        os.path.join('xsim.dir', sys.argv[sys.argv.index('-s') + 1]),
+        exist_ok=True
+    )
+"""
+
+PROJECT = """
+<project>
+    <config simulation_directory='simulation'/>
+    <library name='lib_tb'>
+        <file path='tb.vhd'/>
+        <file path='tb.v'/>
+    </library>
+</project>
+"""
+
+
+@unittest.skipIf(sys.platform == 'win32', 'Requires a POSIX shell')
+class TestSnapshotCache(FakeToolTestCase):
+
+    def setUp(self):
+        super(TestSnapshotCache, self).setUp()
+        self.log_path = os.path.join(self.root, 'calls.log')
+        self.write_tools(
+            ['ghdl', 'xvhdl', 'xvlog', 'xelab', 'xsim', 'iverilog', 'vvp'],
+            FAKE_TOOL,
+            log=self.log_path
+        )
+        self.write_files({
+            'project.xml': PROJECT,
+            'tb.v': 'module tb;\nendmodule\n',
+        })
+        self.write_source('entity tb is\nend entity;\n')
+        self.simulation = os.path.join(self.root, 'simulation')
+        os.makedirs(self.simulation)
+        self.change_directory()
+        self.project = self.load_project()
+
+    def write_source(self, data):
+        with open(os.path.join(self.root, 'tb.vhd'), 'w') as f:
+            f.write(data)
+
+    def get_calls(self, tool=None):
+        """
+        Return the arguments of each call made to the fake *tool*, or a list
+        of (*tool*, *arguments*) tuples for every call if no tool is given,
+        and clear the log.
+        """
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, 'r') as f:
+            calls = [
+                (line.split()[0], line.split()[1:])
+                for line in f.read().splitlines()
+            ]
+        os.remove(self.log_path)
+        if tool is None:
+            return calls
+        return [args for name, args in calls if name == tool]
+
+    def test_ghdl(self):
+        self.project.simulate('lib_tb', 'tb', 'ghdl', generics={'a': 1})
+        calls = self.get_calls('ghdl')
+        self.assertEqual([call[0] for call in calls], ['-a', '-e', '-r'])
+        # The executable is reused, generics are bound when it is run
+        self.project.simulate('lib_tb', 'tb', 'ghdl', generics={'a': 2})
+        calls = self.get_calls('ghdl')
+        self.assertEqual([call[0] for call in calls], ['-r'])
+        self.assertIn('-ga=2', calls[0])
+        # A change to the design is elaborated again
+        self.write_source('entity tb is\nend entity tb;\n')
+        self.project.simulate('lib_tb', 'tb', 'ghdl')
+        calls = self.get_calls('ghdl')
+        self.assertEqual([call[0] for call in calls], ['-a', '-e', '-r'])
+        # A deleted executable is elaborated again
+        os.remove(os.path.join(self.simulation, 'tb'))
+        self.project.simulate('lib_tb', 'tb', 'ghdl')
+        calls = self.get_calls('ghdl')
+        self.assertEqual([call[0] for call in calls], ['-e', '-r'])
+
+    def simulate_vivado(self, **generics):
+        """
+        Run a Vivado simulation with the given *generics* and return the
+        number of times xelab was called and the snapshot run by xsim.
+        """
+        self.project.simulate('lib_tb', 'tb', 'vivado', generics=generics)
+        calls = self.get_calls()
+        return (
+            len([args for tool, args in calls if tool == 'xelab']),
+            [args[-1] for tool, args in calls if tool == 'xsim'][0]
+        )
+
+    def test_vivado(self):
+        elaborations, snapshot_a = self.simulate_vivado(a=1)
+        self.assertEqual(elaborations, 1)
+        elaborations, snapshot_b = self.simulate_vivado(a=2)
+        self.assertEqual(elaborations, 1)
+        # Each generic set is elaborated into its own snapshot
+        self.assertNotEqual(snapshot_a, snapshot_b)
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.simulation, 'xsim.dir'))),
+            sorted([snapshot_a, snapshot_b])
+        )
+        # Both snapshots are reused by later simulations
+        self.assertEqual(self.simulate_vivado(a=1), (0, snapshot_a))
+        self.assertEqual(self.simulate_vivado(a=2), (0, snapshot_b))
+        # A change to the design is elaborated again
+        self.write_source('entity tb is\nend entity tb;\n')
+        self.assertEqual(self.simulate_vivado(a=1), (1, snapshot_a))
+
+    def test_vivado_libraries(self):
+        self.write_files({'other.vhd': 'entity other is\nend entity;\n'})
+        self.project.add_file(
+            os.path.join(self.root, 'other.vhd'),
+            library='lib_other'
+        )
+        simulator = self.project.tool_wrapper.get_tool(
+            tool_type='simulation',
+            tool_name='vivado'
+        )
+        writes = []
+        write_includes = simulator.write_includes
+
+        def record_write(*args, **kwargs):
+            writes.append(args)
+            write_includes(*args, **kwargs)
+
+        simulator.write_includes = record_write
+        simulator.compile_project(jobs=2)
+        # The xsim.ini is written once with every library before the files
+        # are compiled in parallel.
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(len(self.get_calls('xvhdl')), 2)
+        with open(os.path.join(self.simulation, 'xsim.ini'), 'r') as f:
+            data = f.read()
+        self.assertIn('lib_tb=lib_tb', data)
+        self.assertIn('lib_other=lib_other', data)
+
+    def simulate_iverilog(self, project, *values):
+        """
+        Run an Icarus simulation with each of the generic *values* and return
+        the number of times iverilog was called and the images run by vvp.
+        """
+        simulator = project.tool_wrapper.get_tool(
+            tool_type='simulation',
+            tool_name='iverilog'
+        )
+        simulator.compile_project()
+        for value in values:
+            simulator.simulate('lib_tb', 'tb', generics={'a': value})
+        calls = self.get_calls()
+        return (
+            len([args for tool, args in calls if tool == 'iverilog']),
+            [args[-1] for tool, args in calls if tool == 'vvp']
+        )
+
+    def test_iverilog(self):
+        # An image is compiled once for each generic set
+        compilations, images = self.simulate_iverilog(self.project, 1, 2, 1)
+        self.assertEqual(compilations, 2)
+        self.assertEqual(images[0], images[2])
+        self.assertNotEqual(images[0], images[1])
+        # The images are reused by a later run
+        self.assertEqual(
+            self.simulate_iverilog(self.load_project(), 1, 2),
+            (0, images[:2])
+        )
+        # A change to the design is compiled again
+        with open(os.path.join(self.root, 'tb.v'), 'w') as f:
+            f.write('module tb;\n\nendmodule\n')
+        self.assertEqual(
+            self.simulate_iverilog(self.project, 1),
+            (1, images[:1])
+        )
+        # Arguments that are not passed to iverilog do not recompile the image
+        self.project.add_config('args_iverilog_compile', '-Wall')
+        self.assertEqual(
+            self.simulate_iverilog(self.project, 1),
+            (0, images[:1])
+        )
+        # A change to an included file compiles the image again
+        self.write_files({
+            'tb.v': '`include "defs.vh"\nmodule tb;\nendmodule\n',
+            'defs.vh': '`define A 1\n',
+        })
+        self.assertEqual(
+            self.simulate_iverilog(self.project, 1),
+            (1, images[:1])
+        )
+        self.write_files({'defs.vh': '`define A 2\n'})
+        self.assertEqual(
+            self.simulate_iverilog(self.project, 1),
+            (1, images[:1])
+        )
+
+
+def get_generic_tests():
+    """
+    Return a test case class with tests that declare generic sets, it is
+    defined in a function so that it is not collected by the test runner.
+    """
+    class GenericTests(ChipToolsTest):
+        generics = {'a': 1}
+
+        def test_default(self):
+            pass
+
+        @with_generics(a=2)
+        def test_a2(self):
+            self.assertEqual(self.generics, {'a': 2})
+
+        @with_generics(a=1)
+        def test_a1(self):
+            pass
+
+        @with_generics(a=2)
+        def test_a2_b(self):
+            pass
+
+    return GenericTests
+
+
+class TestGenericSets(unittest.TestCase):
+
+    def test_with_generics(self):
+        GenericTests = get_generic_tests()
+        test = GenericTests('test_a2')
+        self.assertEqual(test.get_generic_set(), (('a', '2'),))
+        result = unittest.TestResult()
+        test.run(result)
+        self.assertTrue(result.wasSuccessful())
+        # The generics of the test case class are not modified
+        self.assertEqual(GenericTests.generics, {'a': 1})
+
+    def test_order_by_generics(self):
+        GenericTests = get_generic_tests()
+        tests = [
+            ('file', GenericTests(name)) for name in [
+                'test_default', 'test_a2', 'test_a1', 'test_a2_b'
+            ]
+        ]
+        self.assertEqual(
+            parallel.order_by_generics([0, 1, 2, 3], tests),
+            [0, 2, 1, 3]
+        )
+
+    def test_order_by_class(self):
+        GenericTests = get_generic_tests()
+
+        class OtherTests(GenericTests):
+            pass
+
+        tests = [
+            ('file', GenericTests('test_a2')),
+            ('file', OtherTests('test_a2')),
+            ('file', GenericTests('test_a1')),
+            ('file', OtherTests('test_default')),
+            ('file', GenericTests('test_a2_b')),
+        ]
+        # The tests of each class are kept together even when they share a
+        # generic set with the tests of another class
+        self.assertEqual(
+            parallel.order_by_generics([0, 1, 2, 3, 4], tests),
+            [0, 4, 2, 1, 3]
+        )
+        # The classes that took longest are run first by the parallel and
+        # distributed runners, keeping the generic sets of each together
+        durations = dict((test.id(), 1.0) for name, test in tests)
+        durations[tests[1][1].id()] = 5.0
+        self.assertEqual(
+            parallel.order_by_duration([0, 1, 2, 3, 4], tests, durations),
+            [1, 3, 0, 4, 2]
+        )
+        # Classes with a test that has not been run before are first
+        del durations[tests[2][1].id()]
+        self.assertEqual(
+            parallel.order_by_duration([0, 1, 2, 3, 4], tests, durations),
+            [0, 4, 2, 1, 3]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
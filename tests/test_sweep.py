@@ -0,0 +1,226 @@
+"""
+The tests in this module check that synthesis sweeps run a job for each
+combination of parts and generics in its own directory and summarise the
+reports of each job. A fake Vivado executable is used so these tests do not
+require any vendor tools to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import shutil
+import tarfile
+import tempfile
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.common import utils
+from chiptools.core.project import Project
+from chiptools.core import sweep
+from tests.fake_tools import FakeToolTestCase
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+PROJECT = """
+<project>
+    <config synthesis_directory='synthesis'/>
+    <config part='part_a'/>
+    <library name='lib'>
+        <file path='top.vhd'/>
+    </library>
+</project>
+"""
+
+# A fake Vivado executable that writes post route reports for the part and
+# generics found in the TCL script it is given.
+VIVADO = """import re
+import sys
+if '-version' in sys.argv:
+    sys.exit(0)
+script = open(sys.argv[sys.argv.index('-source') + 1]).read()
+part = re.search(r'-part (\\S+)', script).group(1)
+width = re.search(r'-generic width=(\\d+)', script).group(1)
+slack = '-0.250' if part == 'part_b' else '1.500'
+with open('top_post_route_timing.rpt', 'w') as f:
+    f.write(
+        '    WNS(ns)      TNS(ns)  TNS Failing Endpoints\\n' +
+        '    -------      -------  ---------------------\\n' +
+        '    ' + slack + '        0.000                      0\\n'
+    )
+with open('top_post_route_util.rpt', 'w') as f:
+    f.write(
+        '| Site Type | Used | Fixed | Available | Util% |\\n' +
+        '| Slice LUTs | 10 | 0 | 100 | ' + width + '.00 |\\n' +
+        '| DSPs | 1 | 0 | 10 | 10.00 |\\n'
+    )
+"""
+
+QUARTUS_STA = """
+Type  : Slow 1200mV 85C Model Setup 'clk'
+Slack : 2.125
+TNS   : 0.000
+
+Type  : Slow 1200mV 85C Model Hold 'clk'
+Slack : -0.500
+TNS   : 0.000
+
+Type  : Fast 1200mV 0C Model Setup 'clk'
+Slack : 1.750
+TNS   : 0.000
+"""
+
+QUARTUS_FIT = """
+Fitter Status : Successful
+Total logic elements : 1,024 / 10,320 ( 10 % )
+Total registers : 512
+Total memory bits : 0 / 423,936 ( 0 % )
+"""
+
+ISE_PAR = """
+  Constraint                                |    Check    | Worst Case |
+  ------------------------------------------+-------------+------------+
+  TS_clk = PERIOD TIMEGRP "clk" 10 ns HIGH  | SETUP       |     3.250ns|
+  50%                                       | HOLD        |     0.100ns|
+"""
+
+ISE_MAP = """
+Slice Logic Utilization:
+  Number of Slice Registers:                   100 out of  126,576    1%
+  Number of Slice LUTs:                     12,500 out of   63,288   19%
+"""
+
+
+@unittest.skipIf(sys.platform == 'win32', 'The fake tools are not executable')
+class TestSynthesisSweep(FakeToolTestCase):
+
+    def setUp(self):
+        super(TestSynthesisSweep, self).setUp()
+        os.makedirs(os.path.join(self.root, 'synthesis'))
+        self.write_tools(['vivado'], VIVADO)
+        self.write_files({
+            'project.xml': PROJECT,
+            'top.vhd': 'entity top is\nend entity;\n',
+        })
+
+    def test_jobs(self):
+        jobs = sweep.get_sweep_jobs(
+            ['a', 'b'],
+            [{'width': '8'}, {'width': '16'}],
+        )
+        self.assertEqual(len(jobs), 4)
+        self.assertEqual(
+            [(job['part'], job['generics']['width']) for job in jobs],
+            [('a', '8'), ('a', '16'), ('b', '8'), ('b', '16')]
+        )
+        self.assertEqual(len(set(job['name'] for job in jobs)), 4)
+        self.assertEqual(
+            sweep.get_sweep_jobs(),
+            [{'name': 'job_0', 'part': None, 'generics': {}, 'arguments': {}}]
+        )
+        self.assertEqual(sweep.get_job_limit(8, 3), 3)
+        self.assertEqual(sweep.get_job_limit(2, 3), 2)
+        # A memory budget larger than the available memory allows one job
+        self.assertEqual(sweep.get_job_limit(8, 3, 2**40), 1)
+
+    def test_available_memory(self):
+        # The available memory includes the page cache on Linux
+        self.write_files({
+            'meminfo': 'MemTotal: 16384 kB\n' +
+            'MemFree: 1024 kB\n' +
+            'MemAvailable: 8192 kB\n'
+        })
+        self.assertEqual(
+            utils.get_available_memory(os.path.join(self.root, 'meminfo')),
+            8192 * 1024
+        )
+
+    def test_sweep(self):
+        results = self.load_project().synthesise_sweep(
+            'lib',
+            'top',
+            tool_name='vivado',
+            parts=['part_a', 'part_b'],
+            generic_sets=[{'width': '8'}, {'width': '16'}],
+            jobs=2
+        )
+        self.assertEqual(len(results), 4)
+        for result in results:
+            self.assertEqual(result['status'], 'passed', msg=result['error'])
+            self.assertEqual(
+                result['slack'],
+                -0.25 if result['part'] == 'part_b' else 1.5
+            )
+            self.assertEqual(
+                result['utilisation'],
+                {
+                    'Slice LUTs': float(result['generics']['width']),
+                    'DSPs': 10.0
+                }
+            )
+            self.assertTrue(os.path.exists(result['archive']))
+            with tarfile.open(result['archive'], 'r') as archive:
+                self.assertTrue(any(
+                    name.endswith('top_post_route_util.rpt')
+                    for name in archive.getnames()
+                ))
+        # Each job stores its archive in its own directory
+        self.assertEqual(
+            len(set(os.path.dirname(r['archive']) for r in results)),
+            4
+        )
+        sweep_directory = os.path.dirname(
+            os.path.dirname(results[0]['archive'])
+        )
+        with open(os.path.join(sweep_directory, 'summary.txt'), 'r') as f:
+            summary = f.read()
+        self.assertIn('part_b', summary)
+        self.assertIn('-0.250', summary)
+        self.assertIn('Slice LUTs 16', summary)
+
+
+class TestReportSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.project = Project()
+
+    def tearDown(self):
+        self.project.cache.close()
+        shutil.rmtree(self.root)
+
+    def get_summary(self, tool_name, reports):
+        for name, text in reports.items():
+            with open(os.path.join(self.root, name), 'w') as f:
+                f.write(text)
+        tool = self.project.tool_wrapper.get_tool('synthesis', tool_name)
+        return tool.get_report_summary(self.root)
+
+    def test_quartus(self):
+        summary = self.get_summary(
+            'quartus',
+            {'top.sta.summary': QUARTUS_STA, 'top.fit.summary': QUARTUS_FIT}
+        )
+        self.assertEqual(summary['slack'], 1.75)
+        self.assertEqual(
+            summary['utilisation'],
+            {'Total logic elements': 10.0, 'Total memory bits': 0.0}
+        )
+
+    def test_ise(self):
+        summary = self.get_summary(
+            'ise',
+            {'top.par': ISE_PAR, 'top_map.mrp': ISE_MAP}
+        )
+        self.assertEqual(summary['slack'], 3.25)
+        self.assertEqual(
+            summary['utilisation'],
+            {'Slice Registers': 1.0, 'Slice LUTs': 19.0}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
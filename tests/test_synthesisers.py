@@ -1,6 +1,7 @@
 import unittest
 import os
 import logging
+import logging.config
 import sys
 import tarfile
 
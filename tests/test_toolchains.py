@@ -0,0 +1,105 @@
+"""
+The tests in this module check that toolchains are only located when they
+are requested and that their locations are cached. These tests do not require
+any vendor tools to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+import json
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from chiptools.core.project import Project
+from chiptools.wrappers import toolchains
+from chiptools.wrappers.toolchains import ToolchainBase
+from tests.fake_tools import FakeToolTestCase
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+
+class TestToolchainDiscovery(FakeToolTestCase):
+
+    def setUp(self):
+        super(TestToolchainDiscovery, self).setUp()
+        self.write_tools(['tool_a', 'tool_b'], '')
+        self.cache_path = os.path.join(self.root, 'toolchains.cache')
+
+    def test_lazy_tools(self):
+        project = Project()
+        try:
+            # No toolchains are located until they are requested
+            self.assertEqual(project.tool_wrapper.tools, {})
+            project.tool_wrapper.get_tool('simulation', 'ghdl')
+            self.assertEqual(
+                list(project.tool_wrapper.tools.keys()),
+                [('simulation', 'ghdl')]
+            )
+            self.assertIsNone(
+                project.tool_wrapper.get_tool('simulation', 'unknown')
+            )
+            self.assertIn('ghdl', project.get_available_simulators())
+        finally:
+            project.cache.close()
+
+    def test_path_cache(self):
+        executables = ['tool_a', 'tool_b']
+        self.assertEqual(
+            ToolchainBase.get_path(executables, self.cache_path, 'config'),
+            self.bin_path
+        )
+        key = (os.environ['PATH'], tuple(executables))
+        self.assertEqual(toolchains.path_cache[key], self.bin_path)
+        with open(self.cache_path, 'r') as f:
+            cache = json.load(f)
+        self.assertEqual(list(cache['paths'].values()), [self.bin_path])
+        # The stored path is used by a later run with the same PATH and
+        # system configuration file.
+        cache_key = cache['key']
+        self.assertEqual(
+            ToolchainBase.read_path_cache(
+                self.cache_path,
+                cache_key,
+                executables
+            ),
+            self.bin_path
+        )
+        # A stored path that no longer contains the toolchain is not used
+        os.remove(os.path.join(self.bin_path, 'tool_b'))
+        self.assertIsNone(
+            ToolchainBase.read_path_cache(
+                self.cache_path,
+                cache_key,
+                executables
+            )
+        )
+        del toolchains.path_cache[key]
+        self.assertEqual(
+            ToolchainBase.get_path(executables, self.cache_path, 'config'),
+            ''
+        )
+        # A toolchain that was not found is found once it is installed
+        self.assertNotIn(key, toolchains.path_cache)
+        self.write_tools(['tool_b'], '')
+        self.assertEqual(
+            ToolchainBase.get_path(executables, self.cache_path, 'config'),
+            self.bin_path
+        )
+        # A change to the system configuration file discards the paths
+        self.assertEqual(
+            ToolchainBase.get_path(['tool_a'], self.cache_path, 'changed'),
+            self.bin_path
+        )
+        with open(self.cache_path, 'r') as f:
+            cache = json.load(f)
+        self.assertNotEqual(cache['key'], cache_key)
+        self.assertEqual(list(cache['paths'].keys()), ['tool_a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
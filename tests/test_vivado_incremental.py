@@ -0,0 +1,156 @@
+"""
+The tests in this module check that incremental Vivado builds reuse the
+checkpoints of the last good build. A fake Vivado executable is used so these
+tests do not require any vendor tools to be installed.
+"""
+
+import unittest
+import os
+import logging
+import logging.config
+import sys
+
+testroot = os.path.dirname(__file__) or '.'
+sys.path.insert(0, os.path.abspath(os.path.join(testroot, os.path.pardir)))
+
+from tests.fake_tools import FakeToolTestCase
+
+# Blackhole log messages from chiptools
+logging.config.dictConfig({'version': 1})
+
+PROJECT = """
+<project>
+    <config synthesis_directory='synthesis'/>
+    <config part='xc7a35tcpg236-1'/>
+    <config synthesis_incremental='true'/>
+    <library name='lib'>
+        <file path='top.vhd'/>
+    </library>
+</project>
+"""
+
+# A fake Vivado executable that saves a copy of the TCL script it is given
+# and writes each checkpoint requested by the script.
+VIVADO = """import re
+import sys
+if '-version' in sys.argv:
+    print('Vivado v1')
+    sys.exit(0)
+script = open(sys.argv[sys.argv.index('-source') + 1]).read()
+with open({log!r}, 'w') as f:
+    f.write(script)
+for path in re.findall(r'write_checkpoint -force ([^\\s}}]+)', script):
+    with open(path, 'w') as f:
+        f.write(path)
+"""
+
+
+@unittest.skipIf(sys.platform == 'win32', 'The fake tools are not executable')
+class TestVivadoIncremental(FakeToolTestCase):
+
+    def setUp(self):
+        super(TestVivadoIncremental, self).setUp()
+        self.log_path = os.path.join(self.root, 'vivado.tcl')
+        os.makedirs(os.path.join(self.root, 'synthesis'))
+        self.write_tools(['vivado'], VIVADO, log=self.log_path)
+        self.write_files({'project.xml': PROJECT})
+        self.write_source('entity top is\nend entity;\n')
+        self.project = self.load_project()
+
+    def write_source(self, text):
+        with open(os.path.join(self.root, 'top.vhd'), 'w') as f:
+            f.write(text)
+
+    def synthesise(self):
+        # Builds are forced so that unchanged inputs are not skipped
+        self.project.synthesise('lib', 'top', tool_name='vivado', force=True)
+        with open(self.log_path, 'r') as f:
+            return f.read()
+
+    def test_incremental(self):
+        tool = self.project._get_tool('vivado', tool_type='synthesis')
+        checkpoint_dir = tool.get_checkpoint_directory(
+            'top',
+            'xc7a35tcpg236-1',
+            {}
+        )
+        # The first build is a full build that saves its checkpoints
+        script = self.synthesise()
+        self.assertIn('synth_design', script)
+        self.assertNotIn('-incremental', script)
+        self.assertEqual(
+            sorted(os.listdir(checkpoint_dir)),
+            ['inputs.key', 'post_route.dcp', 'post_synth.dcp']
+        )
+        # Synthesis is skipped when the inputs are unchanged
+        script = self.synthesise()
+        self.assertNotIn('synth_design', script)
+        self.assertNotIn('read_vhdl', script)
+        self.assertIn('open_checkpoint ' + checkpoint_dir, script)
+        self.assertIn(
+            'read_checkpoint -incremental ' +
+            os.path.join(checkpoint_dir, 'post_route.dcp'),
+            script
+        )
+        # A changed source is synthesised incrementally
+        self.write_source('entity top is\nend entity top;\n')
+        script = self.synthesise()
+        self.assertIn('synth_design', script)
+        self.assertIn(
+            'read_checkpoint -incremental ' +
+            os.path.join(checkpoint_dir, 'post_synth.dcp'),
+            script
+        )
+        # Different generics use their own checkpoints
+        self.project.add_generic('width', 8)
+        self.assertNotEqual(
+            tool.get_checkpoint_directory(
+                'top',
+                'xc7a35tcpg236-1',
+                {'width': 8}
+            ),
+            checkpoint_dir
+        )
+        script = self.synthesise()
+        self.assertIn('synth_design', script)
+        self.assertNotIn('-incremental', script)
+
+    def test_version(self):
+        tool = self.project._get_tool('vivado', tool_type='synthesis')
+        self.synthesise()
+        self.assertIn('open_checkpoint', self.synthesise())
+        # The checkpoints of another Vivado version are not reused
+        inputs_key = tool.get_inputs_key('top', 'xc7a35tcpg236-1', {})
+        checkpoint_dir = tool.get_checkpoint_directory(
+            'top',
+            'xc7a35tcpg236-1',
+            {}
+        )
+        tool.version = 'Vivado v2'
+        self.assertNotEqual(
+            tool.get_inputs_key('top', 'xc7a35tcpg236-1', {}),
+            inputs_key
+        )
+        self.assertNotEqual(
+            tool.get_checkpoint_directory('top', 'xc7a35tcpg236-1', {}),
+            checkpoint_dir
+        )
+        script = self.synthesise()
+        self.assertIn('synth_design', script)
+        self.assertNotIn('-incremental', script)
+
+    def test_disabled(self):
+        self.project.add_config('synthesis_incremental', 'false', force=True)
+        self.synthesise()
+        script = self.synthesise()
+        self.assertIn('synth_design', script)
+        self.assertNotIn('-incremental', script)
+        self.assertFalse(
+            os.path.exists(
+                os.path.join(self.root, 'synthesis', 'checkpoints')
+            )
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()